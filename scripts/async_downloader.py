@@ -0,0 +1,147 @@
+import os
+import asyncio
+import hashlib
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+from tceq_http import USER_AGENT
+from metrics import METRICS
+
+# Constants
+PDF_HEADER = b'%PDF'
+PDF_TRAILER = b'%%EOF'
+# Readers accept the header anywhere in the first 1KB and the trailer in the last 1KB
+HEADER_WINDOW = 1024
+TRAILER_WINDOW = 1024
+CHUNK_SIZE = 64 * 1024
+DEFAULT_CONCURRENCY = 8
+DEFAULT_HOST_RATE = 2.0
+
+
+class PdfStreamCheck:
+    """Checks the %PDF header and %%EOF trailer and hashes the content as bytes go by."""
+
+    def __init__(self):
+        self.head = b''
+        self.tail = b''
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def feed(self, chunk):
+        self.digest.update(chunk)
+        if len(self.head) < HEADER_WINDOW:
+            self.head += chunk[:HEADER_WINDOW - len(self.head)]
+        self.tail = (self.tail + chunk[-TRAILER_WINDOW:])[-TRAILER_WINDOW:]
+        self.size += len(chunk)
+
+    @property
+    def ok(self):
+        return PDF_HEADER in self.head and PDF_TRAILER in self.tail
+
+
+def check_pdf_file(file_path):
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        head = f.read(HEADER_WINDOW)
+        f.seek(max(0, size - TRAILER_WINDOW))
+        tail = f.read()
+    return PDF_HEADER in head and PDF_TRAILER in tail
+
+
+def parse_pdf_file(file_path):
+    from PyPDF2 import PdfReader
+
+    with open(file_path, 'rb') as f:
+        PdfReader(f)
+
+
+class HostRateLimiter:
+    """Async counterpart of RateLimiter with one request slot schedule per host."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.next_slot = {}
+        self.lock = asyncio.Lock()
+
+    async def wait(self, host):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            slot = max(self.next_slot.get(host, 0.0), loop.time())
+            self.next_slot[host] = slot + self.interval
+        delay = slot - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AsyncPdfDownloader:
+    """Streams PDFs to disk with a cap on in-flight downloads and a per-host request rate.
+
+    `limiter` is the run's shared RateLimiter, so downloads and searches
+    together stay under its rate and pause while its circuit breaker is open.
+    Use as `async with AsyncPdfDownloader(...) as downloader:` and call `fetch`.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, per_host_rate=DEFAULT_HOST_RATE, timeout=60, full_validate=False,
+                 limiter=None):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.host_limiter = HostRateLimiter(per_host_rate)
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.full_validate = full_validate
+        self.client = None
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={'User-Agent': USER_AGENT},
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    async def fetch(self, url, final_path):
+        """Download `url` to `final_path`. Returns the SHA-256 of the saved PDF, or None if it was invalid.
+
+        Bytes go to a `.part` file next to the final path and are renamed into
+        place only once the header/trailer check (and full parse, if enabled) passes.
+        """
+        part_path = final_path + '.part'
+        check = PdfStreamCheck()
+        async with self.semaphore:
+            if self.limiter is not None:
+                await self.limiter.wait_async()
+            await self.host_limiter.wait(urlsplit(url).netloc)
+            try:
+                async with self.client.stream('GET', url) as response:
+                    response.raise_for_status()
+                    with open(part_path, 'wb') as f:
+                        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                            check.feed(chunk)
+                            f.write(chunk)
+            except Exception:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                raise
+
+        if not check.ok:
+            logging.warning(f"Invalid PDF from {url}: missing %PDF header or %%EOF trailer ({check.size} bytes)")
+            os.remove(part_path)
+            return None
+        if self.full_validate:
+            try:
+                with METRICS.span('pdf validate'):
+                    await asyncio.to_thread(parse_pdf_file, part_path)
+            except Exception as e:
+                logging.warning(f"Invalid PDF from {url}. Error: {e}")
+                os.remove(part_path)
+                return None
+        os.replace(part_path, final_path)
+        return check.digest.hexdigest()
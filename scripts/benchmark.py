@@ -0,0 +1,212 @@
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from stub_tceq import Fixtures, StubServer
+from maert_query import print_rows
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_PATH = os.path.join(BASE_DIR, '..', 'data', 'metrics', 'benchmark.json')
+STAGES = ('download', 'extract', 'discover', 'download-selenium')
+DEFAULT_LEVELS = '1,4,8'
+CHROME_BINARIES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome')
+
+
+def chrome_available():
+    return any(shutil.which(name) for name in CHROME_BINARIES)
+
+
+def make_tree(root, fixtures):
+    """Copy the scripts into a scratch tree so every run starts from an empty data/ and state store."""
+    scripts = os.path.join(root, 'scripts')
+    os.makedirs(scripts)
+    os.makedirs(os.path.join(root, 'data', 'metrics'))
+    for path in glob.glob(os.path.join(BASE_DIR, '*.py')):
+        shutil.copy(path, scripts)
+    with open(os.path.join(root, 'data', 'all_scraped_rns.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['RN Number'])
+        writer.writerows([rn] for rn in fixtures.rn_numbers)
+    return scripts
+
+
+def run_stage(name, command, env, log_path):
+    """Run one stage as a child process. Returns (exit code, wall seconds, peak RSS in MB)."""
+    with open(log_path, 'w') as log:
+        start = time.monotonic()
+        process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        except KeyboardInterrupt:
+            process.kill()
+            process.wait()
+            raise
+        seconds = time.monotonic() - start
+    # wait4() reaped the child behind Popen's back; record it so Popen does not wait for it again
+    code = process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in KB on Linux
+    if code:
+        logging.warning(f"{name} exited with {code}; see {log_path}")
+    return code, seconds, usage.ru_maxrss / 1024
+
+
+def read_metrics(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def stage_result(stage, level, code, seconds, peak_mb, items, metrics=None, span=None):
+    result = {
+        'stage': stage,
+        'level': level,
+        'exit_code': code,
+        'seconds': round(seconds, 2),
+        'items': items,
+        'items_per_second': round(items / seconds, 2) if seconds else 0,
+        'peak_rss_mb': round(peak_mb, 1),
+        'p50': None,
+        'p95': None,
+    }
+    if metrics and span in metrics['spans']:
+        result['p50'] = round(metrics['spans'][span]['p50'], 3)
+        result['p95'] = round(metrics['spans'][span]['p95'], 3)
+    return result
+
+
+def stage_env(root, server):
+    scripts = os.path.join(root, 'scripts')
+    data = os.path.join(root, 'data')
+    return dict(
+        os.environ,
+        TCEQ_RECORDS_URL=server.records_url,
+        TCEQ_CR_URL=server.cr_url,
+        MAERT_STATE_DB=os.path.join(scripts, 'maert_state.sqlite'),
+        MAERT_EXTRACT_CACHE=os.path.join(data, 'extract_cache'),
+        MAERT_METRICS_DIR=os.path.join(data, 'metrics'),
+    )
+
+
+def run_download(stage, engine, level, scripts, data, env, span):
+    metrics_path = os.path.join(data, 'metrics', f'{stage}.json')
+    code, seconds, peak = run_stage(stage, [
+        sys.executable, os.path.join(scripts, 'download_maert_pdfs.py'),
+        '--engine', engine, '--workers', str(level), '--download-concurrency', str(level),
+        '--rate', '0', '--host-rate', '0', '--keep-order',
+        '--rns-csv', os.path.join(data, 'all_scraped_rns.csv'), '--metrics-json', metrics_path,
+    ], env, os.path.join(data, f'{stage}.log'))
+    metrics = read_metrics(metrics_path)
+    items = metrics['counters'].get('rns processed', 0) if metrics else 0
+    return stage_result(stage, level, code, seconds, peak, items, metrics, span)
+
+
+def benchmark_level(level, fixtures, server, stages):
+    results = []
+    with tempfile.TemporaryDirectory(prefix=f'maert_bench_{level}_') as root:
+        scripts = make_tree(root, fixtures)
+        data = os.path.join(root, 'data')
+        env = stage_env(root, server)
+
+        if 'download' in stages:
+            results.append(run_download('download', 'http', level, scripts, data, env, 'http search'))
+
+        if 'extract' in stages:
+            code, seconds, peak = run_stage('extract', [
+                sys.executable, os.path.join(scripts, 'extract_maerts.py'), '--workers', str(level),
+            ], env, os.path.join(data, 'extract.log'))
+            items = len(glob.glob(os.path.join(env['MAERT_EXTRACT_CACHE'], 'v*', '**', '*.csv'), recursive=True))
+            results.append(stage_result('extract', level, code, seconds, peak, items))
+
+        if 'discover' in stages:
+            if not chrome_available():
+                logging.warning("Chrome not found; skipping the discover stage")
+            else:
+                metrics_path = os.path.join(data, 'metrics', 'discover.json')
+                code, seconds, peak = run_stage('discover', [
+                    sys.executable, os.path.join(scripts, 'discover_entities.py'),
+                    '--workers', str(level), '--rate', '0', '--max-results', str(fixtures.result_cap),
+                    '--metrics-json', metrics_path,
+                ], env, os.path.join(data, 'discover.log'))
+                metrics = read_metrics(metrics_path)
+                items = sum(v for k, v in metrics['counters'].items() if k.endswith('searches done')) if metrics else 0
+                results.append(stage_result('discover', level, code, seconds, peak, items, metrics, 'county search'))
+
+    if 'download-selenium' in stages:
+        if not chrome_available():
+            logging.warning("Chrome not found; skipping the download-selenium stage")
+        else:
+            # A tree of its own, so the HTTP run's state store does not mark every RN as already done
+            with tempfile.TemporaryDirectory(prefix=f'maert_bench_{level}_selenium_') as root:
+                scripts = make_tree(root, fixtures)
+                results.append(run_download('download-selenium', 'selenium', level, scripts, os.path.join(root, 'data'),
+                                            stage_env(root, server), 'rn (selenium)'))
+    return results
+
+
+def benchmark(levels, stages, rns, latency, seed, out, error_rate=0.0):
+    fixtures = Fixtures(rns=rns, seed=seed)
+    logging.info(f"Fixtures: {len(fixtures.rn_numbers)} RNs, {len(fixtures.pdfs)} MAERT PDFs, "
+                 f"{len(fixtures.counties)} counties; {latency * 1000:.0f} ms latency per request")
+    results = []
+    with StubServer(fixtures, latency, error_rate=error_rate, seed=seed) as server:
+        for level in levels:
+            logging.info(f"Concurrency {level}")
+            results += benchmark_level(level, fixtures, server, stages)
+
+    print_rows([{
+        'stage': r['stage'], 'level': r['level'], 'seconds': r['seconds'], 'items': r['items'],
+        'items/s': r['items_per_second'], 'p50 s': r['p50'] or '', 'p95 s': r['p95'] or '',
+        'peak RSS MB': r['peak_rss_mb'], 'exit': r['exit_code'],
+    } for r in results])
+    report = {
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'rns': rns,
+        'latency_seconds': latency,
+        'error_rate': error_rate,
+        'seed': seed,
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Wrote benchmark report to {out}")
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against a local stub of the TCEQ sites")
+    parser.add_argument('--levels', default=DEFAULT_LEVELS,
+                        help="Comma-separated worker counts to run each stage at (default: %(default)s)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--rns', type=int, default=200, help="Number of RNs in the fixtures (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help="Seconds the stub adds to every response (default: %(default)s)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Share of stub responses that are a 503, to measure retry overhead (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=REPORT_PATH)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    benchmark([int(level) for level in args.levels.split(',')], args.stages, args.rns, args.latency, args.seed, args.out,
+              args.error_rate)
+
+
+# Main entry
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,209 @@
+import os
+import logging
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import WebDriverException
+
+from waits import Waits, enable_browser_events, driver_alive, DEFAULT_TIMEOUT
+from metrics import METRICS
+
+# Constants
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120 Safari/537.36'
+# A driver is replaced after this many items, or sooner when its processes use more than DEFAULT_MAX_RSS_MB
+DEFAULT_MAX_USES = int(os.getenv("MAERT_DRIVER_MAX_USES", 200))
+DEFAULT_MAX_RSS_MB = int(os.getenv("MAERT_DRIVER_MAX_RSS_MB", 1500))
+# Reading the memory of the process tree is not free, so only check it every few uses
+RSS_CHECK_EVERY = 10
+# None of the scrapers need images, stylesheets or fonts to find, click or read elements
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.ico', '*.webp',
+    '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+]
+
+
+def browser_options(headless=True, download_dir=None, browser_events=False):
+    options = webdriver.ChromeOptions()
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--window-size=1920x1080')
+    options.add_argument(f'user-agent={USER_AGENT}')
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    if headless:
+        options.add_argument('--headless')
+    prefs = {
+        "plugins.always_open_pdf_externally": True,
+        "profile.managed_default_content_settings.images": 2,
+    }
+    if download_dir:
+        prefs["download.default_directory"] = download_dir
+    options.add_experimental_option("prefs", prefs)
+    # Chrome buffers the performance log until it is read, so only sessions whose waits read it turn it on
+    return enable_browser_events(options) if browser_events else options
+
+
+def _process_tree_rss_mb(pid):
+    """Resident memory of a process and all its descendants in MB, or None where it cannot be read."""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [root, *root.children(recursive=True)]) / 2 ** 20
+        except psutil.Error:
+            return None
+    # Linux without psutil: walk /proc for the children of the driver process
+    if not os.path.isdir('/proc'):
+        return None
+    children = {}
+    rss = {}
+    page_kb = os.sysconf('SC_PAGE_SIZE') / 1024
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{entry}/statm') as f:
+                rss[int(entry)] = int(f.read().split()[1]) * page_kb
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+    total_kb = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total_kb += rss.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total_kb / 1024
+
+
+class BrowserSession:
+    """A headless Chrome that is reused across many searches and replaced when it wears out.
+
+    Call driver() before each item: it starts Chrome on first use and swaps
+    in a fresh one after `max_uses` items, when Chrome's processes grow past
+    `max_rss_mb`, or after reset() following a failure. Images, stylesheets
+    and fonts are never loaded. Downloads go to the directory set with
+    set_download_dir(), which changes it in the running browser.
+
+    With `browser_events`, Chrome logs the DevTools events that
+    Waits.network_idle() and Waits.download() listen to; the log is drained
+    at every driver() call so it cannot pile up between items.
+    """
+
+    def __init__(self, headless=True, download_dir=None, max_uses=DEFAULT_MAX_USES, max_rss_mb=DEFAULT_MAX_RSS_MB,
+                 timeout=DEFAULT_TIMEOUT, block_resources=True, browser_events=False):
+        self.headless = headless
+        self.download_dir = download_dir
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.timeout = timeout
+        self.block_resources = block_resources
+        self.browser_events = browser_events
+        self.uses = 0
+        self.waits = None
+        self._driver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self):
+        with METRICS.span('driver startup'):
+            options = browser_options(self.headless, self.download_dir, self.browser_events)
+            driver = webdriver.Chrome(service=Service(), options=options)
+        self._driver = driver
+        self.uses = 0
+        self.waits = Waits(driver, self.timeout, events=self.browser_events)
+        try:
+            if self.block_resources:
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+            if self.download_dir:
+                self._apply_download_dir()
+        except WebDriverException as e:
+            logging.warning(f"Could not apply browser settings over DevTools: {e.msg}")
+        return driver
+
+    def _apply_download_dir(self):
+        params = {'behavior': 'allow', 'downloadPath': os.path.abspath(self.download_dir)}
+        try:
+            self._driver.execute_cdp_cmd('Page.setDownloadBehavior', params)
+        except WebDriverException:
+            # Newer Chrome builds only honor the browser-wide variant
+            self._driver.execute_cdp_cmd('Browser.setDownloadBehavior', {**params, 'eventsEnabled': True})
+
+    def set_download_dir(self, path):
+        """Send downloads to `path` from now on, without restarting the browser."""
+        os.makedirs(path, exist_ok=True)
+        self.download_dir = path
+        if self._driver is not None:
+            self._apply_download_dir()
+
+    def rss_mb(self):
+        if self._driver is None:
+            return None
+        try:
+            return _process_tree_rss_mb(self._driver.service.process.pid)
+        except (AttributeError, OSError):
+            return None
+
+    def _worn_out(self):
+        if self.uses >= self.max_uses:
+            return f"{self.uses} uses"
+        if self.max_rss_mb and self.uses and self.uses % RSS_CHECK_EVERY == 0:
+            rss = self.rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                return f"{rss:.0f} MB resident"
+        return None
+
+    def driver(self):
+        """The driver to use for the next item."""
+        if self._driver is not None:
+            reason = self._worn_out()
+            if reason:
+                logging.info(f"Recycling browser after {reason}")
+                METRICS.count('driver recycles')
+                self.close()
+        if self._driver is None:
+            self._start()
+        else:
+            self.waits.drain_events()
+        self.uses += 1
+        return self._driver
+
+    def reset(self, error=None):
+        """Drop the driver if the browser died, so the next driver() call starts a new one.
+
+        Returns whether it was dropped.
+        """
+        if self._driver is None or driver_alive(self._driver):
+            return False
+        logging.error(f"Browser is not responding, restarting it: {error}")
+        METRICS.count('driver restarts')
+        self.close()
+        return True
+
+    def run(self, fn, *args):
+        """Call fn(driver, *args), dropping a browser that died on the way so a retry gets a new one."""
+        try:
+            return fn(self.driver(), *args)
+        except Exception as e:
+            self.reset(e)
+            raise
+
+    def close(self):
+        if self._driver is not None:
+            try:
+                self._driver.quit()
+            except Exception:
+                pass
+        self._driver = None
+        self.waits = None
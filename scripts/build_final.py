@@ -0,0 +1,159 @@
+import io
+import os
+import csv
+import logging
+import zipfile
+import argparse
+from itertools import islice
+
+from extract_maerts import CACHE_PATH, PDF_PATH, cache_file, read_rows, documents_from_store, documents_from_manifest
+from pdf_store import file_sha256
+from state_store import parse_pdf_name
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BASE_DIR, '..')
+DATA_DIR = os.path.join(REPO_DIR, 'data')
+FINAL_CSV_PATH = os.path.join(DATA_DIR, 'final.csv.zip')
+LOOKUP_CSV_PATH = os.path.join(DATA_DIR, 'MAERT_lookup.csv')
+PARQUET_DIR = os.path.join(DATA_DIR, 'parquet')
+# Name of the CSV inside final.csv.zip
+FINAL_MEMBER = 'final.csv'
+# Rows held in memory at once; each chunk is written out before the next is read
+CHUNK_ROWS = 100_000
+
+FINAL_COLUMNS = [
+    'Emission Source', 'Source Name', 'Air Contaminant Name',
+    'Emission Rate lbs/hr', 'Emission Rate tons/year',
+    'rn_number', 'permit_number', 'publish_date', 'file_location',
+]
+
+
+def load_lookup(lookup_path=LOOKUP_CSV_PATH):
+    """MAERT_lookup.csv as {pdf file name: (rn_number, permit_number, publish_date, file_location)}."""
+    lookup = {}
+    if not os.path.exists(lookup_path):
+        return lookup
+    with open(lookup_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            location = row['relative_file_location']
+            lookup[os.path.basename(location)] = (row['rn_number'], row['permit_number'], row['publish_date'], location)
+    logging.info(f"Loaded {len(lookup)} documents from {lookup_path}")
+    return lookup
+
+
+def document_metadata(file_name, lookup, pdf_path=PDF_PATH):
+    if file_name in lookup:
+        return lookup[file_name]
+    # Documents downloaded since the lookup was written carry the same fields in their name
+    rn, permit_number, publish_date = parse_pdf_name(file_name)
+    location = os.path.relpath(os.path.join(pdf_path, file_name), REPO_DIR)
+    return rn, permit_number, publish_date, location.replace(os.sep, '/')
+
+
+def final_rows(documents, lookup, pdf_path=PDF_PATH, cache_path=CACHE_PATH, stats=None):
+    """Yield one final table row per cached MAERT row of every (file name, sha256) document."""
+    stats = stats if stats is not None else {}
+    for key in ('documents', 'rows', 'not extracted', 'unnamed'):
+        stats.setdefault(key, 0)
+    for file_name, sha256 in documents:
+        try:
+            metadata = document_metadata(file_name, lookup, pdf_path)
+        except ValueError as e:
+            stats['unnamed'] += 1
+            logging.warning(f"Skipping {file_name}: {e}")
+            continue
+        if sha256 is None:
+            path = os.path.join(pdf_path, file_name)
+            sha256 = file_sha256(path) if os.path.exists(path) else None
+        if sha256 is None or not os.path.exists(cache_file(sha256, cache_path)):
+            stats['not extracted'] += 1
+            continue
+        stats['documents'] += 1
+        for row in read_rows(sha256, cache_path):
+            stats['rows'] += 1
+            yield [*row[:5], *metadata]
+
+
+def chunked(rows, size=CHUNK_ROWS):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def parquet_batches(chunks):
+    from export_parquet import type_final_chunk
+    import pandas as pd
+
+    for chunk in chunks:
+        yield from type_final_chunk(pd.DataFrame(chunk, columns=FINAL_COLUMNS)).to_batches()
+
+
+def build_final(documents, out_path=FINAL_CSV_PATH, parquet_dir=None, lookup_path=LOOKUP_CSV_PATH,
+                pdf_path=PDF_PATH, cache_path=CACHE_PATH, chunk_rows=CHUNK_ROWS):
+    """Stream every extracted MAERT row into final.csv.zip, and optionally the Parquet dataset, in one pass.
+
+    Rows are read from the extraction cache document by document and written
+    in chunks of `chunk_rows`, so memory does not grow with the corpus. The
+    zip is written next to `out_path` and only replaces it once complete.
+    """
+    lookup = load_lookup(lookup_path)
+    stats = {}
+    tmp_path = f"{out_path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            with io.TextIOWrapper(zf.open(FINAL_MEMBER, 'w', force_zip64=True), encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(FINAL_COLUMNS)
+
+                def written(chunks):
+                    for chunk in chunks:
+                        writer.writerows(chunk)
+                        logging.info(f"Wrote {stats['rows']} rows from {stats['documents']} documents")
+                        yield chunk
+
+                chunks = written(chunked(final_rows(documents, lookup, pdf_path, cache_path, stats), chunk_rows))
+                if parquet_dir:
+                    from export_parquet import FINAL_DATASET, FINAL_SCHEMA, write_dataset
+
+                    write_dataset(parquet_batches(chunks), FINAL_SCHEMA, os.path.join(parquet_dir, FINAL_DATASET),
+                                  'publish_year')
+                else:
+                    for _ in chunks:
+                        pass
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        # Interrupted or failed: the old file stays as it was, without a partial one next to it
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logging.info(f"Wrote {out_path}: {stats['rows']} rows from {stats['documents']} documents, "
+                 f"{stats['not extracted']} not extracted, {stats['unnamed']} with unrecognized names")
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Combine the extracted MAERT tables into final.csv.zip")
+    parser.add_argument('--manifest', help="Read documents from a download_logs.csv instead of the state store")
+    parser.add_argument('--lookup', default=LOOKUP_CSV_PATH,
+                        help="MAERT_lookup.csv giving RN, permit, date and location per PDF (default: %(default)s)")
+    parser.add_argument('--out', default=FINAL_CSV_PATH)
+    parser.add_argument('--parquet', nargs='?', const=PARQUET_DIR, metavar='DIR',
+                        help="Also write the Parquet dataset in the same pass (default DIR: %(const)s)")
+    parser.add_argument('--pdf-dir', default=PDF_PATH)
+    parser.add_argument('--cache-dir', default=CACHE_PATH)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    documents = documents_from_manifest(args.manifest) if args.manifest else documents_from_store()
+    build_final(documents, args.out, args.parquet, args.lookup, args.pdf_dir, args.cache_dir, args.chunk_rows)
+
+
+# Main entry
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,193 @@
+import os
+import logging
+import argparse
+import importlib
+import threading
+
+from state_store import open_store, DONE, FAILED
+from rate_limit import RateLimiter
+from discovery_plan import DiscoveryPlan, MAX_RESULTS, verify_coverage
+from metrics import METRICS, default_json_path
+from resilience import RetryQueue, classify, BREAKER
+
+# Constants
+DEFAULT_WORKERS = 4
+DEFAULT_QUERIES_PER_SECOND = 1.0
+KINDS = ('county', 'zip')
+# kind: (Selenium scraper module, its search function). A module is only imported once a search of its kind is needed.
+SCRAPERS = {
+    'county': ('extract_regulated_entities_by_county', 'scrape_county'),
+    'zip': ('extract_regulated_entities_by_zipcode', 'scrape_zip'),
+}
+
+
+def scraper_module(kind):
+    return importlib.import_module(SCRAPERS[kind][0])
+
+
+def list_counties_http(url=None):
+    # The county dropdown is plain HTML, so no browser is needed to read it
+    import httpx
+    from lxml import html as lxml_html
+
+    url = url or scraper_module('county').URL
+    response = httpx.get(url, timeout=30, follow_redirects=True)
+    response.raise_for_status()
+    doc = lxml_html.fromstring(response.text)
+    options = doc.xpath('//select[@name="cnty_name"]/option')
+    return [o.text_content().strip() for o in options if (o.get('value') or '').strip()]
+
+
+def list_counties():
+    try:
+        return list_counties_http()
+    except Exception as e:
+        logging.warning(f"Could not read the county list over HTTP, using a browser: {e}")
+        from browser import BrowserSession
+
+        with BrowserSession() as session:
+            return scraper_module('county').list_counties(session.driver())
+
+
+def exhaustive_items(store, kinds=KINDS):
+    """Every county and ZIP search that has not completed yet, without planning."""
+    items = []
+    for kind in kinds:
+        done = store.queries_with_status(kind, DONE)
+        queries = list_counties() if kind == 'county' else scraper_module('zip').tx_zip_codes()
+        remaining = [q for q in queries if q not in done]
+        logging.info(f"{kind}: {len(remaining)} of {len(queries)} searches remaining")
+        items.extend((kind, query) for query in remaining)
+    return items
+
+
+def run_search(driver, store, kind, query, plan=None):
+    """Run one search and record it. Returns the searches it makes necessary.
+
+    A failed search is recorded and its error re-raised for the caller to retry.
+    """
+    store.start_query(kind, query)
+    try:
+        with METRICS.span(f"{kind} search"):
+            saved, expected = getattr(scraper_module(kind), SCRAPERS[kind][1])(driver, query)
+    except Exception as e:
+        error_class = classify(e)
+        logging.error(f"Failed on {kind} {query} ({error_class.label}): {e}")
+        store.finish_query(kind, query, FAILED, error=f"{error_class.label}: {e}")
+        raise
+    BREAKER.record(None)
+    store.finish_query(kind, query, DONE, record_count=saved, expected_count=expected)
+    METRICS.count(f"{kind} searches done")
+    METRICS.count('entity rows saved', saved)
+    return plan.follow_up(kind, query, saved, expected) if plan else []
+
+
+def run_worker(work, store, limiter, plan=None, headless=True):
+    """Take searches off the shared queue until a stop marker, on one reused browser.
+
+    Failed searches go back on the queue with a backoff delay while their error class allows.
+    """
+    from browser import BrowserSession
+
+    with BrowserSession(headless=headless) as session:
+        while True:
+            entry = work.take()
+            if entry is None:
+                work.task_done()
+                return
+            (kind, query), attempt = entry
+            try:
+                driver = session.driver()
+                limiter.wait()
+                # Follow-up searches go on the queue before this one is marked done, so join() waits for them
+                for follow_up in run_search(driver, store, kind, query, plan):
+                    work.add(follow_up)
+            except Exception as e:
+                session.reset(e)
+                if not work.requeue((kind, query), attempt, e):
+                    logging.error(f"Giving up on {kind} {query} for this run ({classify(e).label}): {e}")
+            finally:
+                work.task_done()
+
+
+def discover(kinds=KINDS, workers=DEFAULT_WORKERS, queries_per_second=DEFAULT_QUERIES_PER_SECOND, headless=True,
+             exhaustive=False, max_results=MAX_RESULTS, metrics_json=None, metrics_prom=None):
+    """Run county and ZIP entity searches across `workers` browsers sharing one work queue.
+
+    By default the searches come from a DiscoveryPlan, which only searches
+    ZIP codes where a county search cannot cover them; `exhaustive` runs
+    every county and ZIP search of `kinds` instead. Completion of every
+    search is recorded in the state store, so a restarted run only queues
+    what is left.
+    """
+    for kind in KINDS:
+        os.makedirs(scraper_module(kind).DATA_PATH, exist_ok=True)
+    store = open_store()
+    if exhaustive:
+        plan = None
+        items = exhaustive_items(store, kinds)
+    else:
+        plan = DiscoveryPlan(list_counties(), store, max_results)
+        items = plan.initial()
+    if not items:
+        logging.info("Nothing to discover.")
+        verify_coverage(store)
+        return
+
+    work = RetryQueue()
+    for item in items:
+        work.add(item)
+    limiter = RateLimiter(queries_per_second)
+    workers = max(1, min(workers, len(items)))
+    logging.info(f"Running {len(items)} searches on {workers} worker(s)")
+    METRICS.reset()
+    threads = [
+        threading.Thread(target=run_worker, args=(work, store, limiter, plan, headless), name=f"worker_{i}")
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    work.join()
+    work.stop(len(threads))
+    for thread in threads:
+        thread.join()
+    for kind in KINDS:
+        failed = store.queries_with_status(kind, FAILED)
+        if failed:
+            logging.warning(f"{len(failed)} {kind} searches failed and will be retried on the next run")
+    METRICS.log_summary()
+    METRICS.export('discover', metrics_json, metrics_prom)
+    verify_coverage(store)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Discover regulated entities by county and ZIP code in parallel")
+    parser.add_argument('--exhaustive', action='store_true',
+                        help="Run every county and ZIP search instead of only the ones the plan needs")
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS),
+                        help="Search kinds to run with --exhaustive")
+    parser.add_argument('--max-results', type=int, default=MAX_RESULTS,
+                        help="Search counties larger than this by ZIP code instead (default: no cap)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Number of parallel browsers (default: %(default)s)")
+    parser.add_argument('--rate', type=float, default=DEFAULT_QUERIES_PER_SECOND,
+                        help="Maximum searches started per second across all workers, 0 to disable (default: %(default)s)")
+    parser.add_argument('--show-browser', action='store_true', help="Run Chrome with a visible window")
+    parser.add_argument('--metrics-json', default=default_json_path('discover'),
+                        help="Write run timings and counters as JSON (default: data/metrics/discover_<time>.json)")
+    parser.add_argument('--metrics-prom', help="Also write them as a Prometheus textfile, e.g. for node_exporter")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    discover(args.kinds, args.workers, args.rate, headless=not args.show_browser,
+             exhaustive=args.exhaustive, max_results=args.max_results,
+             metrics_json=args.metrics_json, metrics_prom=args.metrics_prom)
+
+
+# Main entry
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    main()
@@ -0,0 +1,181 @@
+import os
+import glob
+import logging
+import threading
+
+from state_store import DONE
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
+COUNTY_DATA_PATH = os.path.join(DATA_DIR, 'regulated_entities_county')
+ZIP_DATA_PATH = os.path.join(DATA_DIR, 'regulated_entities_zipcode')
+KNOWN_RNS_PATH = os.path.join(DATA_DIR, 'all_scraped_rns.csv')
+MISSING_RNS_PATH = os.path.join(DATA_DIR, 'discovery_missing_rns.csv')
+# Largest result set one search is trusted to return in full; unset means no cap,
+# in which case counties are only split after a search comes back short
+MAX_RESULTS = int(os.getenv("TCEQ_MAX_RESULTS", "0")) or None
+
+
+def county_key(name):
+    # Dropdown options and the zipcodes data spell counties differently ("HARRIS" vs "Harris County")
+    name = ' '.join(str(name).upper().split())
+    return name[:-len(' COUNTY')] if name.endswith(' COUNTY') else name
+
+
+def tx_zips_by_county():
+    import zipcodes
+
+    by_county = {}
+    for z in zipcodes.filter_by(state="TX"):
+        by_county.setdefault(county_key(z.get('county') or ''), []).append(z['zip_code'].strip())
+    return by_county
+
+
+def previous_county_counts(data_path=COUNTY_DATA_PATH):
+    # record_counts.csv from earlier county runs, used when the state store has no count yet
+    path = os.path.join(data_path, 'record_counts.csv')
+    if not os.path.exists(path):
+        return {}
+    import pandas as pd
+
+    df = pd.read_csv(path, dtype=str)
+    counts = pd.to_numeric(df['number of records'], errors='coerce')
+    return {county_key(c): int(n) for c, n in zip(df['county'], counts) if n > 0}
+
+
+def is_complete(result):
+    # A search is complete when it saved every record the site said it matched
+    return (
+        result is not None
+        and result['status'] == DONE
+        and (result['expected_count'] is None or (result['record_count'] or 0) >= result['expected_count'])
+    )
+
+
+class DiscoveryPlan:
+    """Decides which county and ZIP searches are needed to see every AIRNSR entity once.
+
+    Every entity is returned by both its county search and its ZIP search, so
+    counties are searched first and a county's ZIP codes are only queued when
+    the county cannot be covered by one search: its estimated size is over
+    `max_results`, or a finished search saved fewer rows than it reported.
+    ZIP codes whose county is not in the county list are always searched.
+    """
+
+    def __init__(self, counties, store, max_results=MAX_RESULTS, zips_by_county=None):
+        self.counties = list(counties)
+        self.store = store
+        self.max_results = max_results
+        self.zips_by_county = zips_by_county if zips_by_county is not None else tx_zips_by_county()
+        self.county_results = store.query_counts('county')
+        self.zip_results = store.query_counts('zip')
+        self.estimates = previous_county_counts()
+        for county, result in self.county_results.items():
+            estimate = result['expected_count'] or result['record_count']
+            if estimate:
+                self.estimates[county_key(county)] = estimate
+        self.split_counties = set()
+        self._lock = threading.Lock()
+
+    def naive_size(self):
+        return len(self.counties) + sum(len(zips) for zips in self.zips_by_county.values())
+
+    def _zip_items(self, county):
+        with self._lock:
+            if county in self.split_counties:
+                return []
+            self.split_counties.add(county)
+        zips = self.zips_by_county.get(county_key(county), [])
+        return [('zip', z) for z in zips if not is_complete(self.zip_results.get(z))]
+
+    def initial(self):
+        """Searches to queue at the start of a run."""
+        items = []
+        for county in self.counties:
+            result = self.county_results.get(county)
+            estimate = self.estimates.get(county_key(county))
+            if self.max_results and estimate and estimate > self.max_results:
+                logging.info(f"{county}: about {estimate} records, searching by ZIP code instead")
+                items.extend(self._zip_items(county))
+            elif is_complete(result):
+                continue
+            elif result is not None and result['status'] == DONE:
+                logging.info(f"{county}: last search saved {result['record_count']} of {result['expected_count']}, "
+                             "searching by ZIP code instead")
+                items.extend(self._zip_items(county))
+            else:
+                items.append(('county', county))
+
+        listed = {county_key(c) for c in self.counties}
+        orphans = [z for county, zips in self.zips_by_county.items() if county not in listed for z in zips]
+        items.extend(('zip', z) for z in orphans if not is_complete(self.zip_results.get(z)))
+        logging.info(f"Planned {len(items)} searches instead of {self.naive_size()} "
+                     f"({len(orphans)} ZIP codes outside the county list)")
+        return items
+
+    def follow_up(self, kind, query, saved, expected):
+        """Searches made necessary by a finished one: the ZIP codes of a county that came back short."""
+        if kind != 'county':
+            return []
+        if saved < expected or (self.max_results and expected > self.max_results):
+            items = self._zip_items(query)
+            if items:
+                logging.warning(f"{query}: saved {saved} of {expected} records, queueing {len(items)} ZIP codes")
+            return items
+        return []
+
+
+def rns_in_file(path):
+    # Same header mapping and RN normalization as the merge, so both count the same RNs as found
+    import pandas as pd
+    from get_all_rns import canonical_column, normalize_rns
+
+    df = pd.read_csv(path, dtype=str, on_bad_lines='skip', usecols=lambda c: canonical_column(c) == 'rn_number')
+    if df.columns.empty:
+        return set()
+    return set(normalize_rns(df.iloc[:, 0]).dropna())
+
+
+def discovered_rns(data_paths=(COUNTY_DATA_PATH, ZIP_DATA_PATH)):
+    found = set()
+    for data_path in data_paths:
+        for path in glob.glob(os.path.join(data_path, '*.csv')):
+            if os.path.basename(path) == 'record_counts.csv':
+                continue
+            try:
+                found |= rns_in_file(path)
+            except Exception as e:
+                logging.warning(f"Could not read {path}: {e}")
+    return found
+
+
+def verify_coverage(store, known_rns_path=KNOWN_RNS_PATH, missing_path=MISSING_RNS_PATH):
+    """Check a finished discovery against the searches' own counts and earlier runs.
+
+    Logs every search that saved fewer rows than the site reported and writes
+    RNs from the last all_scraped_rns.csv that no current search returned to
+    `missing_path`. Returns the set of missing RNs.
+    """
+    for kind in ('county', 'zip'):
+        short = [
+            f"{q} ({r['record_count']}/{r['expected_count']})"
+            for q, r in store.query_counts(kind).items()
+            if r['status'] == DONE and not is_complete(r)
+        ]
+        if short:
+            logging.warning(f"{len(short)} {kind} searches saved fewer rows than reported: {', '.join(short[:20])}")
+
+    if not os.path.exists(known_rns_path):
+        logging.info(f"No {known_rns_path} from an earlier run to compare against")
+        return set()
+    known = rns_in_file(known_rns_path)
+    missing = known - discovered_rns()
+    if missing:
+        import pandas as pd
+
+        pd.DataFrame({'RN Number': sorted(missing)}).to_csv(missing_path, index=False)
+        logging.warning(f"{len(missing)} of {len(known)} previously known RNs were not found, listed in {missing_path}")
+    else:
+        logging.info(f"All {len(known)} previously known RNs were found again")
+    return missing
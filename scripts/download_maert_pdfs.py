@@ -3,234 +3,531 @@ import time
 import shutil
 import glob
 import logging
+import asyncio
+import argparse
 import tempfile
-from io import StringIO
-
-import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import Select
-from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException
-from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-
-# Load environment variables
-load_dotenv()
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from tceq_http import TceqRecordsClient, RECORDS_URL, parse_results
+from async_downloader import AsyncPdfDownloader, check_pdf_file, parse_pdf_file, DEFAULT_CONCURRENCY, DEFAULT_HOST_RATE
+from state_store import open_store, document_ref, DONE, FAILED
+from pdf_store import PdfStore
+from rate_limit import RateLimiter
+from rn_scheduler import schedule, DEFAULT_EMPTY_SAMPLE
+from metrics import METRICS, default_json_path
+from resilience import (RetryQueue, ScrapeError, TransientError, ThrottledError, LayoutError, classify,
+                        backoff_delay, retry_call, retry_async, BREAKER)
 
 # Constants
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(BASE_DIR, '..', 'data', 'pdfs')
 RNS_CSV_PATH = os.path.join(BASE_DIR, '..', 'data', "all_scraped_rns.csv")
-DOWNLOAD_COUNTS_PATH = os.path.join(BASE_DIR, 'download_counts.csv')
-
-os.makedirs(DATA_PATH, exist_ok=True)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+SEARCH_URL = f"{RECORDS_URL}?IdcService=TCEQ_SEARCH"
+RESULTS_TABLE_XPATH = '/html/body/table[1]/tbody/tr[5]/td/table/tbody/tr/td/div/table[3]/tbody/tr/td[2]/table'
+EMPTY_RESULTS_XPATH = '//span[contains(text(), "Found 0 potential items")]'
+DEFAULT_WORKERS = 1
+DEFAULT_REQUESTS_PER_SECOND = 2.0
+ENGINES = ('http', 'selenium')
+# Base of the jittered backoff between click attempts
+CLICK_RETRY_DELAY = 0.5
+
+_unique_id_lock = threading.Lock()
+_last_unique_id = 0
 
 # Helpers
 def read_rn_numbers(csv_path):
+    import pandas as pd
+
     df = pd.read_csv(csv_path)
     return df['RN Number'].unique()
 
-def wait_for_download(directory, timeout=30):
-    seconds = 0
-    while seconds < timeout:
-        files = glob.glob(f"{directory}/*")
-        if files:
-            return max(files, key=os.path.getctime)
-        time.sleep(1)
-        seconds += 1
-    return None
+def next_unique_id():
+    # Microsecond timestamp, bumped when two workers land on the same microsecond
+    global _last_unique_id
+    with _unique_id_lock:
+        _last_unique_id = max(int(time.time() * 1e6), _last_unique_id + 1)
+        return _last_unique_id
+
+def clear_directory(directory):
+    for path in glob.glob(f"{directory}/*"):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
-def validate_pdf(file_path):
+def validate_pdf(file_path, full=False):
+    # Cheap header/trailer check; the full PyPDF2 parse only runs when asked for
     try:
-        with open(file_path, 'rb') as f:
-            PdfReader(f)
+        with METRICS.span('pdf validate'):
+            if not check_pdf_file(file_path):
+                raise ValueError("missing %PDF header or %%EOF trailer")
+            if full:
+                parse_pdf_file(file_path)
         return True
     except Exception as e:
         logging.warning(f"Invalid PDF detected: {file_path}. Error: {e}")
         return False
 
-def init_driver(download_dir):
-    options = webdriver.ChromeOptions()
-    prefs = {"download.default_directory": download_dir, "plugins.always_open_pdf_externally": True}
-    options.add_experimental_option("prefs", prefs)
-    options.add_argument('--headless')
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    driver = webdriver.Chrome(options=options)
-    driver.implicitly_wait(5)
-    return driver
-
-def load_download_counts():
-    if os.path.exists(DOWNLOAD_COUNTS_PATH):
-        return pd.read_csv(DOWNLOAD_COUNTS_PATH)
-    return pd.DataFrame(columns=['rn_number', 'download_counts'])
-
-def update_download_counts(rn_number, count, df):
-    if rn_number in df['rn_number'].values:
-        df.loc[df['rn_number'] == rn_number, 'download_counts'] = count
-    else:
-        df = pd.concat([df, pd.DataFrame([{'rn_number': rn_number, 'download_counts': count}])], ignore_index=True)
-    df.to_csv(DOWNLOAD_COUNTS_PATH, index=False)
-    return df
-
-def safe_click(driver, by, value, retries=3, description=None):
+def safe_click(waits, by, value, retries=3, description=None, timeout=5):
     for attempt in range(retries):
         try:
-            el = driver.find_element(by, value)
+            el = waits.clickable(description or 'click', (by, value), timeout)
             logging.info(f"Clicking: {description or value}")
             el.click()
             return True
         except Exception as e:
             logging.warning(f"Attempt {attempt + 1} failed to click [{description or value}]: {e}")
-            time.sleep(1)
+            METRICS.count('click retries')
+            if attempt + 1 < retries:
+                time.sleep(backoff_delay(attempt, base=CLICK_RETRY_DELAY))
     logging.error(f"Failed to click element after {retries} attempts: [{description or value}]")
     return False
 
-def wait_for_results_or_empty(driver, timeout=10):
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        try:
-            if driver.find_element(By.XPATH, '//span[contains(text(), "Found 0 potential items")]'):
-                logging.info("No results found for this RN.")
-                return False
-        except NoSuchElementException:
-            pass
-
-        try:
-            driver.find_element(By.XPATH, '/html/body/table[1]/tbody/tr[5]/td/table/tbody/tr/td/div/table[3]/tbody/tr/td[2]/table')
-            logging.info("Results table found.")
-            return True
-        except NoSuchElementException:
-            pass
+def wait_for_results_or_empty(waits, timeout=10):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
 
-        time.sleep(0.5)
+    found = waits.first_of('search results', {
+        'empty': EC.presence_of_element_located((By.XPATH, EMPTY_RESULTS_XPATH)),
+        'results': EC.presence_of_element_located((By.XPATH, RESULTS_TABLE_XPATH)),
+    }, timeout)
+    if found == 'empty':
+        logging.info("No results found for this RN.")
+        return False
+    if found == 'results':
+        logging.info("Results table found.")
+        return True
     logging.warning("Timeout while waiting for results or empty message.")
-    return False
+    return None
 
-# ... [keep the rest of your imports and setup unchanged] ...
+def format_date(date):
+    return date.split()[0].replace('/', '-')
 
-DOWNLOAD_LOGS_PATH = os.path.join(BASE_DIR, 'download_logs.csv')
+def parse_publish_date(date):
+    return datetime.strptime(date.split()[0], '%m/%d/%Y').date()
 
-def log_downloaded_file(rn_number, file_name):
-    row = pd.DataFrame([{'RN Number': rn_number, 'File Name': file_name}])
-    if not os.path.exists(DOWNLOAD_LOGS_PATH):
-        row.to_csv(DOWNLOAD_LOGS_PATH, index=False)
-    else:
-        row.to_csv(DOWNLOAD_LOGS_PATH, mode='a', header=False, index=False)
+def published_since(date, since):
+    if since is None:
+        return True
+    try:
+        return parse_publish_date(date) >= since
+    except ValueError:
+        # Keep rows with an unreadable date rather than silently missing them
+        return True
 
+def make_final_name(rn, permit_number, date):
+    unique_id = next_unique_id()
+    return f"{rn}_{permit_number}_{format_date(date)}_{unique_id}.pdf"
+
+def save_pdf(rn, permit_number, date, src_path, pdf_store):
+    final_name = make_final_name(rn, permit_number, date)
+    final_path = os.path.join(DATA_PATH, final_name)
+    shutil.move(src_path, final_path)
+    sha256, is_duplicate = pdf_store.add(final_path)
+    logging.info(f"Saved to {final_path}" + (" (duplicate content, linked)" if is_duplicate else ""))
+    return final_name, sha256
+
+def maert_rows(table_html, page_url):
+    # Same parser as the HTTP engine, so both keep permit numbers as text and see the same links
+    rows, _ = parse_results(table_html, page_url)
+    return [row for row in rows if row['document_type'] == 'MAERT']
+
+def scrape_rn(driver, download_dir, rn, limiter, store, pdf_store, full_validate=False, since=None, waits=None):
+    """Search one RN and download its MAERTs. Returns the number of new documents saved.
+
+    Failures are recorded on the RN and raised as a ScrapeError subclass, so
+    the caller can decide whether to try the RN again.
+    """
+    # Selenium is only loaded for the browser path; the HTTP engine never needs it
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import Select
+    from waits import Waits
+
+    waits = waits or Waits(driver)
+
+    def fail(error_class, message, saved=0):
+        store.finish_rn(rn, FAILED, error=f"{error_class.label}: {message}", new_documents=saved)
+        raise error_class(message)
+
+    logging.info(f"Processing RN: {rn}")
+    store.start_rn(rn)
+    limiter.wait()
+    driver.get(SEARCH_URL)
 
-def load_logged_rns():
-    if os.path.exists(DOWNLOAD_LOGS_PATH):
-        df = pd.read_csv(DOWNLOAD_LOGS_PATH)
-        return set(df['RN Number'].unique())
-    return set()
+    try:
+        logging.info("Selecting dropdowns...")
+        Select(driver.find_element(By.ID, 'xRecordSeries')).select_by_value('1081')
+        Select(driver.find_element(By.ID, 'xInsightDocumentType')).select_by_value('27')
+        Select(driver.find_element(By.XPATH, '/html/body/table[1]/tbody/tr[5]/td/table/tbody/tr/td/div/form/table/tbody/tr[4]/td/table/tbody/tr[1]/td[1]/select')).select_by_value('xRefNumTxt')
+        logging.info("Dropdowns selected.")
+    except Exception as e:
+        logging.error(f"Failed to select dropdowns: {e}")
+        fail(classify(e), f"Failed to select dropdowns: {e}")
+
+    try:
+        logging.info("Entering RN number and initiating search...")
+        with METRICS.span('search submit'):
+            driver.find_element(By.XPATH, '/html/body/table[1]/tbody/tr[5]/td/table/tbody/tr/td/div/form/table/tbody/tr[4]/td/table/tbody/tr[1]/td[2]/input').send_keys(rn)
+            limiter.wait()
+            clicked = safe_click(waits, By.XPATH, '/html/body/table[1]/tbody/tr[5]/td/table/tbody/tr/td/div/form/table/tbody/tr[4]/td/table/tbody/tr[5]/td[3]/div/button[1]', description='Search button')
+        found = wait_for_results_or_empty(waits) if clicked else None
+    except Exception as e:
+        logging.error(f"Failed to enter RN or click Search: {e}")
+        fail(classify(e), f"Failed to enter RN or click Search: {e}")
+    if not clicked:
+        fail(LayoutError, "Search button not clickable")
+    if found is None:
+        fail(TransientError, "Timeout while waiting for results")
+    if not found:
+        store.finish_rn(rn, DONE, new_documents=0)
+        return 0
+
+    try:
+        select_element = driver.find_element(By.XPATH, "//select[contains(@name, 'pageSelectList')]")
+        select = Select(select_element)
+        total_pages = len(select.options)
+    except Exception as e:
+        logging.info("Pagination not found, assuming one page of results.")
+        total_pages = 1
+
+    saved = 0
+    errors = []
+    for page_index in range(total_pages):
+        # The first page is already showing; later pages are selected and waited for until the table is replaced
+        if page_index > 0:
+            try:
+                select_element = driver.find_element(By.XPATH, "//select[contains(@name, 'pageSelectList')]")
+                select = Select(select_element)
+                old_table = driver.find_element(By.XPATH, RESULTS_TABLE_XPATH)
+                limiter.wait()
+                select.select_by_index(page_index)
+                waits.replaced('page select', old_table, (By.XPATH, RESULTS_TABLE_XPATH))
+            except Exception as e:
+                logging.warning(f"Failed to select page {page_index+1}: {e}")
+                errors.append(f"Failed to select page {page_index+1}: {e}")
+                break
 
-def scrape_maert_for_rns(rn_numbers):
-    downloaded_rns = load_logged_rns()
+        try:
+            with METRICS.span('table parse'):
+                table_el = driver.find_element(By.XPATH, RESULTS_TABLE_XPATH)
+                table_html = table_el.get_attribute('outerHTML')
+                maerts = maert_rows(table_html, driver.current_url)
+            logging.info(f"[Page {page_index+1}] Found {len(maerts)} MAERT entries.")
+        except Exception as e:
+            logging.warning(f"[Page {page_index+1}] Table parsing failed: {e}")
+            errors.append(f"Table parsing failed on page {page_index+1}: {e}")
+            break
+
+        for doc in maerts:
+            hyperlink, permit_number, date = doc['link_text'], doc['permit_number'], doc['publish_date']
+            if not published_since(date, since):
+                continue
+            doc_id = store.start_document(rn, permit_number, format_date(date), document_ref(doc['url'], hyperlink))
+            if doc_id is None:
+                logging.info(f"Skipping already downloaded permit {permit_number} for RN {rn}")
+                continue
+            try:
+                logging.info(f"Downloading permit {permit_number} for RN {rn}")
+                # Drop leftovers from earlier clicks for this RN
+                clear_directory(download_dir)
+                limiter.wait()
+                with METRICS.span('pdf download'):
+                    safe_click(waits, By.LINK_TEXT, hyperlink, description=f"MAERT link: {hyperlink}")
+                    downloaded = waits.download(download_dir)
+                if downloaded and validate_pdf(downloaded, full=full_validate):
+                    METRICS.count('bytes downloaded', os.path.getsize(downloaded))
+                    final_name, sha256 = save_pdf(rn, permit_number, date, downloaded, pdf_store)
+                    store.finish_document(doc_id, DONE, file_name=final_name, sha256=sha256)
+                    METRICS.count('documents saved')
+                    saved += 1
+                else:
+                    logging.warning(f"Invalid or missing PDF for {permit_number}")
+                    store.finish_document(doc_id, FAILED, error="Invalid or missing PDF")
+                    errors.append(f"Invalid or missing PDF for {permit_number}")
+            except Exception as err:
+                logging.warning(f"Error downloading {permit_number}: {err}")
+                store.finish_document(doc_id, FAILED, error=str(err))
+                errors.append(f"Error downloading {permit_number}: {err}")
+
+    # Only a clean pass marks the RN done; anything else is tried again
+    if errors:
+        fail(TransientError, '; '.join(errors), saved)
+    store.finish_rn(rn, DONE, new_documents=saved)
+    return saved
+
+async def download_document(downloader, store, pdf_store, rn, doc, doc_id):
+    permit_number = doc['permit_number']
+    final_name = make_final_name(rn, permit_number, doc['publish_date'])
+    final_path = os.path.join(DATA_PATH, final_name)
+    try:
+        logging.info(f"Downloading permit {permit_number} for RN {rn}")
+        with METRICS.span('pdf download'):
+            sha256 = await retry_async(lambda: downloader.fetch(doc['url'], final_path),
+                                       f"Download of permit {permit_number} for RN {rn}")
+        if not sha256:
+            logging.warning(f"Invalid or missing PDF for {permit_number}")
+            store.finish_document(doc_id, FAILED, error="Invalid or missing PDF")
+            return False
+        _, is_duplicate = pdf_store.add(final_path, sha256)
+    except Exception as err:
+        logging.warning(f"Error downloading {permit_number}: {err}")
+        store.finish_document(doc_id, FAILED, error=str(err))
+        return False
+    logging.info(f"Saved to {final_path}" + (" (duplicate content, linked)" if is_duplicate else ""))
+    store.finish_document(doc_id, DONE, file_name=final_name, sha256=sha256)
+    METRICS.count('bytes downloaded', os.path.getsize(final_path))
+    METRICS.count('documents saved')
+    return True
+
+async def run_http_pipeline(rn_numbers, workers, limiter, store, download_concurrency, host_rate, full_validate, since=None,
+                            base_url=RECORDS_URL):
+    """Search RNs over HTTP on `workers` threads and stream their MAERTs on an async download stage.
+
+    RNs are taken off one RetryQueue; throttled searches go back on it with
+    the shared backoff and only fail once their attempts run out. Returns
+    the RNs whose search failed otherwise, for the Selenium fallback.
+    """
+    workers = max(1, min(workers, len(rn_numbers)))
+    work = RetryQueue()
+    for rn in rn_numbers:
+        work.add(rn)
+    fallback = []
+    pdf_store = PdfStore(store)
+    queue = asyncio.Queue(maxsize=download_concurrency * 4)
+    # Per RN: [documents still downloading, new documents saved, failures]
+    progress = {}
+
+    def document_finished(rn, ok):
+        # ok is None when releasing the slot held while documents are being queued
+        entry = progress[rn]
+        entry[0] -= 1
+        if ok:
+            entry[1] += 1
+        elif ok is not None:
+            entry[2] += 1
+        if entry[0] == 0:
+            del progress[rn]
+            METRICS.count('rns processed')
+            if entry[2]:
+                store.finish_rn(rn, FAILED, error=f"{entry[2]} document(s) failed", new_documents=entry[1])
+            else:
+                store.finish_rn(rn, DONE, new_documents=entry[1])
+
+    def search(client, rn):
+        with METRICS.span('http search'):
+            # Throttled searches are retried by requeueing the RN, behind the rest of the queue
+            return retry_call(lambda: client.find_maerts(rn), f"HTTP search for RN {rn}", deferred=(ThrottledError,))
+
+    async def discover_rn(client, rn, attempt):
+        logging.info(f"Processing RN: {rn}")
+        store.start_rn(rn)
+        try:
+            docs = await loop.run_in_executor(threads, search, client, rn)
+            docs = [doc for doc in docs if published_since(doc['publish_date'], since)]
+        except Exception as e:
+            error_class = classify(e)
+            if error_class is ThrottledError:
+                # A browser would only add to the load; try the RN again once the site has had time to recover
+                if work.requeue(rn, attempt, e):
+                    return
+                store.finish_rn(rn, FAILED, error=f"HTTP search failed ({error_class.label}): {e}")
+                logging.error(f"Giving up on RN {rn} for this run, HTTP search still throttled: {e}")
+                METRICS.count('rns failed')
+                return
+            store.finish_rn(rn, FAILED, error=f"HTTP search failed ({error_class.label}): {e}")
+            logging.warning(f"HTTP search failed for RN {rn} ({error_class.label}), queueing for Selenium: {e}")
+            METRICS.count('selenium fallbacks')
+            fallback.append(rn)
+            return
+        # One extra slot keeps the RN open until every document is queued
+        progress[rn] = [len(docs) + 1, 0, 0]
+        for doc in docs:
+            permit_number = doc['permit_number']
+            if not doc['url']:
+                logging.warning(f"No download link for permit {permit_number} of RN {rn}")
+                document_finished(rn, False)
+                continue
+            doc_id = store.start_document(rn, permit_number, format_date(doc['publish_date']), document_ref(doc['url']))
+            if doc_id is None:
+                logging.info(f"Skipping already downloaded permit {permit_number} for RN {rn}")
+                document_finished(rn, None)
+                continue
+            await queue.put((rn, doc, doc_id))
+        document_finished(rn, None)
+
+    async def discover(client):
+        while True:
+            # take() blocks, and sleeps out the backoff of requeued RNs, on the worker's own thread
+            entry = await loop.run_in_executor(threads, work.take)
+            if entry is None:
+                work.task_done()
+                return
+            try:
+                await discover_rn(client, *entry)
+            finally:
+                work.task_done()
+
+    async def consume(downloader):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            rn, doc, doc_id = item
+            ok = await download_document(downloader, store, pdf_store, rn, doc, doc_id)
+            document_finished(rn, ok)
+
+    loop = asyncio.get_running_loop()
+    # Each worker holds at most one thread, waiting on the queue or searching, so the default pool cannot starve
+    with TceqRecordsClient(base_url, limiter=limiter, max_connections=workers) as client, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix='search') as threads:
+        async with AsyncPdfDownloader(download_concurrency, host_rate, full_validate=full_validate, limiter=limiter) as downloader:
+            consumers = [asyncio.create_task(consume(downloader)) for _ in range(download_concurrency)]
+            discoverers = [asyncio.create_task(discover(client)) for _ in range(workers)]
+            await asyncio.to_thread(work.join)
+            work.stop(workers)
+            await asyncio.gather(*discoverers)
+            for _ in consumers:
+                await queue.put(None)
+            await asyncio.gather(*consumers)
+    return fallback
+
+def run_worker(worker_id, work, limiter, store, full_validate=False, since=None):
+    """Take RNs off the shared queue until a stop marker; failed RNs go back on it while attempts remain."""
+    from browser import BrowserSession
+
+    pdf_store = PdfStore(store)
+    # One reused browser per worker; each RN downloads into its own directory, switched without a restart
+    # DevTools events let the download wait end on Chrome's progress events instead of polling only
+    with tempfile.TemporaryDirectory(prefix=f"maert_worker{worker_id}_") as tmp_dir, \
+            BrowserSession(browser_events=True) as session:
+        while True:
+            entry = work.take()
+            if entry is None:
+                work.task_done()
+                return
+            rn, attempt = entry
+            rn_dir = os.path.join(tmp_dir, rn)
+            try:
+                driver = session.driver()
+                session.set_download_dir(rn_dir)
+                with METRICS.span('rn (selenium)'):
+                    scrape_rn(driver, rn_dir, rn, limiter, store, pdf_store, full_validate, since, session.waits)
+                METRICS.count('rns processed')
+                BREAKER.record(None)
+            except Exception as e:
+                session.reset(e)
+                if not isinstance(e, ScrapeError):
+                    # scrape_rn records its own failures; anything else escaped it
+                    store.finish_rn(rn, FAILED, error=f"{classify(e).label}: {e}")
+                if not work.requeue(rn, attempt, e):
+                    logging.error(f"Giving up on RN {rn} for this run ({classify(e).label}): {e}")
+                    METRICS.count('rns failed')
+            finally:
+                shutil.rmtree(rn_dir, ignore_errors=True)
+                work.task_done()
+
+def run_selenium_workers(rn_numbers, workers, limiter, store, full_validate=False, since=None):
+    workers = max(1, min(workers, len(rn_numbers)))
+    work = RetryQueue()
+    for rn in rn_numbers:
+        work.add(rn)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='worker') as executor:
+        futures = [executor.submit(run_worker, i, work, limiter, store, full_validate, since) for i in range(workers)]
+        work.join()
+        work.stop(workers)
+        for future in futures:
+            future.result()
+
+def scrape_maert_for_rns(rn_numbers, workers=DEFAULT_WORKERS, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, engine='http',
+                         download_concurrency=DEFAULT_CONCURRENCY, host_rate=DEFAULT_HOST_RATE, full_validate=False,
+                         refresh=False, since=None, prioritize=True, empty_sample=DEFAULT_EMPTY_SAMPLE,
+                         metrics_json=None, metrics_prom=None):
+    os.makedirs(DATA_PATH, exist_ok=True)
+    store = open_store()
+    if refresh or since:
+        # Revisit finished RNs once their refresh interval has passed; only unseen documents are fetched
+        skip_rns = store.rns_not_due()
+        logging.info(f"Refresh mode: {len(skip_rns)} RNs are not due for a revisit"
+                     + (f", only documents published since {since}" if since else ""))
+    else:
+        # Only RNs that finished cleanly are skipped; in-progress and failed ones are retried
+        skip_rns = store.rns_with_status(DONE)
 
+    pending = []
     for rn in rn_numbers:
-        if rn in downloaded_rns:
-            logging.info(f"Skipping already logged RN: {rn}")
+        if rn in skip_rns:
+            logging.info(f"Skipping already downloaded RN: {rn}")
             continue
+        pending.append(rn)
 
-        logging.info(f"Processing RN: {rn}")
+    if prioritize:
+        # Likely hits first, so most new documents arrive early in a long run
+        pending = schedule(pending, store, empty_sample)
 
-        try:
-            with tempfile.TemporaryDirectory() as tmp_dir:
-                driver = init_driver(tmp_dir)
-                driver.get("https://records.tceq.texas.gov/cs/idcplg?IdcService=TCEQ_SEARCH")
-
-                try:
-                    logging.info("Selecting dropdowns...")
-                    Select(driver.find_element(By.ID, 'xRecordSeries')).select_by_value('1081')
-                    Select(driver.find_element(By.ID, 'xInsightDocumentType')).select_by_value('27')
-                    Select(driver.find_element(By.XPATH, '/html/body/table[1]/tbody/tr[5]/td/table/tbody/tr/td/div/form/table/tbody/tr[4]/td/table/tbody/tr[1]/td[1]/select')).select_by_value('xRefNumTxt')
-                    logging.info("Dropdowns selected.")
-                except Exception as e:
-                    logging.error(f"Failed to select dropdowns: {e}")
-                    driver.quit()
-                    continue
-
-                try:
-                    logging.info("Entering RN number and initiating search...")
-                    driver.find_element(By.XPATH, '/html/body/table[1]/tbody/tr[5]/td/table/tbody/tr/td/div/form/table/tbody/tr[4]/td/table/tbody/tr[1]/td[2]/input').send_keys(rn)
-                    safe_click(driver, By.XPATH, '/html/body/table[1]/tbody/tr[5]/td/table/tbody/tr/td/div/form/table/tbody/tr[4]/td/table/tbody/tr[5]/td[3]/div/button[1]', description='Search button')
-
-                    if not wait_for_results_or_empty(driver):
-                        driver.quit()
-                        continue
-                except Exception as e:
-                    logging.error(f"Failed to enter RN or click Search: {e}")
-                    driver.quit()
-                    continue
-
-                try:
-                    select_element = driver.find_element(By.XPATH, "//select[contains(@name, 'pageSelectList')]")
-                    select = Select(select_element)
-                    total_pages = len(select.options)
-                except Exception as e:
-                    logging.info("Pagination not found, assuming one page of results.")
-                    total_pages = 1
-
-                for page_index in range(total_pages):
-                    if total_pages > 1:
-                        # Select the page by visible text (e.g., "1", "2", etc.)
-                        try:
-                            select_element = driver.find_element(By.XPATH, "//select[contains(@name, 'pageSelectList')]")
-                            select = Select(select_element)
-                            select.select_by_index(page_index)
-                            time.sleep(2)
-                        except Exception as e:
-                            logging.warning(f"Failed to select page {page_index+1}: {e}")
-                            break
-
-                    try:
-                        table_el = driver.find_element(
-                            By.XPATH,
-                            '/html/body/table[1]/tbody/tr[5]/td/table/tbody/tr/td/div/table[3]/tbody/tr/td[2]/table'
-                        )
-                        table_html = table_el.get_attribute('outerHTML')
-                        df = pd.read_html(StringIO(table_html))[0]
-
-                        if not df.empty and df.shape[1] > 12:
-                            first_val = df.iloc[0, 12]
-                            logging.info(f"[Page {page_index+1}] First item in column 12: {first_val}")
-                        else:
-                            logging.warning(f"[Page {page_index+1}] Table empty or missing column 12")
-
-                        maerts = df[df.iloc[:, 12] == 'MAERT']
-                        logging.info(f"[Page {page_index+1}] Found {len(maerts)} MAERT entries.")
-                    except Exception as e:
-                        logging.warning(f"[Page {page_index+1}] Table parsing failed: {e}")
-                        break
-
-                    for hyperlink, permit_number, date in zip(maerts.iloc[:, 2], maerts.iloc[:, 6], maerts.iloc[:, 16]):
-                        try:
-                            logging.info(f"Downloading permit {permit_number} for RN {rn}")
-                            safe_click(driver, By.LINK_TEXT, hyperlink, description=f"MAERT link: {hyperlink}")
-                            downloaded = wait_for_download(tmp_dir)
-                            if downloaded and validate_pdf(downloaded):
-                                unique_id = int(time.time() * 1e6)
-                                formatted_date = date.split()[0].replace('/', '-')
-                                final_name = f"{rn}_{permit_number}_{formatted_date}_{unique_id}.pdf"
-                                final_path = os.path.join(DATA_PATH, final_name)
-                                shutil.move(downloaded, final_path)
-                                logging.info(f"Saved to {final_path}")
-                                log_downloaded_file(rn, final_name)
-                            else:
-                                logging.warning(f"Invalid or missing PDF for {permit_number}")
-                        except Exception as err:
-                            logging.warning(f"Error downloading {permit_number}: {err}")
-
-                driver.quit()
+    if not pending:
+        logging.info("Nothing to download.")
+        return
 
-        except Exception as e:
-            logging.error(f"Error processing RN {rn}: {e}")
+    limiter = RateLimiter(requests_per_second)
+    logging.info(f"Processing {len(pending)} RNs with the {engine} engine, {workers} worker(s) at <= {requests_per_second} requests/s")
+
+    METRICS.reset()
+    try:
+        if engine == 'http':
+            pending = asyncio.run(run_http_pipeline(pending, workers, limiter, store, download_concurrency, host_rate, full_validate, since))
+            if pending:
+                logging.info(f"Falling back to Selenium for {len(pending)} RNs")
+        if pending:
+            run_selenium_workers(pending, workers, limiter, store, full_validate, since)
+    finally:
+        METRICS.log_summary()
+        METRICS.export('download', metrics_json, metrics_prom)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download MAERT PDFs for every RN in all_scraped_rns.csv")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Number of parallel workers (default: %(default)s)")
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help="Maximum requests per second to TCEQ across all workers, searches and downloads together, "
+                             "0 to disable (default: %(default)s)")
+    parser.add_argument('--engine', choices=ENGINES, default='http',
+                        help="Search over plain HTTP with Selenium as fallback, or Selenium only (default: %(default)s)")
+    parser.add_argument('--download-concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum PDF downloads in flight with the http engine (default: %(default)s)")
+    parser.add_argument('--host-rate', type=float, default=DEFAULT_HOST_RATE,
+                        help="Maximum PDF download requests per second per host, within --rate, 0 to disable (default: %(default)s)")
+    parser.add_argument('--full-validate', action='store_true',
+                        help="Fully parse each PDF with PyPDF2 instead of only checking its header and trailer")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Revisit already downloaded RNs that are due and fetch only documents not seen before")
+    parser.add_argument('--since', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(), metavar='YYYY-MM-DD',
+                        help="Refresh mode, limited to documents published on or after this date")
+    parser.add_argument('--rns-csv', default=RNS_CSV_PATH, help="CSV with an 'RN Number' column")
+    parser.add_argument('--metrics-json', default=default_json_path('download'),
+                        help="Write run timings and counters as JSON (default: data/metrics/download_<time>.json)")
+    parser.add_argument('--metrics-prom', help="Also write them as a Prometheus textfile, e.g. for node_exporter")
+    parser.add_argument('--keep-order', action='store_true',
+                        help="Process RNs in file order instead of by expected yield from past runs")
+    parser.add_argument('--empty-sample', type=float, default=DEFAULT_EMPTY_SAMPLE,
+                        help="Share of RNs that never had a MAERT to search again on a refresh (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rns = read_rn_numbers(args.rns_csv)
+    scrape_maert_for_rns(rns, workers=args.workers, requests_per_second=args.rate, engine=args.engine,
+                         download_concurrency=args.download_concurrency, host_rate=args.host_rate,
+                         full_validate=args.full_validate, refresh=args.refresh, since=args.since,
+                         prioritize=not args.keep_order, empty_sample=args.empty_sample,
+                         metrics_json=args.metrics_json, metrics_prom=args.metrics_prom)
 
 
 # Main entry
 if __name__ == '__main__':
-    rns = read_rn_numbers(RNS_CSV_PATH)
-    scrape_maert_for_rns(rns)
-
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    main()
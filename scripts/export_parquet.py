@@ -0,0 +1,158 @@
+import os
+import glob
+import shutil
+import logging
+import argparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from normalize import parse_rates, normalize_pollutants
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
+FINAL_CSV_PATH = os.path.join(DATA_DIR, 'final.csv.zip')
+ENTITIES_CSV_PATH = os.path.join(DATA_DIR, 'combined_entities.csv')
+COUNTY_DIR = os.path.join(DATA_DIR, 'regulated_entities_county')
+PARQUET_DIR = os.path.join(DATA_DIR, 'parquet')
+FINAL_DATASET = 'final_maerts'
+ENTITIES_DATASET = 'entities'
+CHUNK_ROWS = 250_000
+# Keep row groups small enough that a filter on one pollutant or county skips most of them
+ROW_GROUP_ROWS = 64_000
+
+RATE_COLUMNS = ['Emission Rate lbs/hr', 'Emission Rate tons/year']
+FINAL_CATEGORICALS = ['pollutant', 'Air Contaminant Name', 'Emission Source', 'Source Name', 'rn_number', 'permit_number']
+
+FINAL_SCHEMA = pa.schema([
+    ('Emission Source', pa.dictionary(pa.int32(), pa.string())),
+    ('Source Name', pa.dictionary(pa.int32(), pa.string())),
+    ('Air Contaminant Name', pa.dictionary(pa.int32(), pa.string())),
+    ('pollutant', pa.dictionary(pa.int32(), pa.string())),
+    ('Emission Rate lbs/hr', pa.float64()),
+    ('Emission Rate tons/year', pa.float64()),
+    ('Emission Rate lbs/hr raw', pa.string()),
+    ('Emission Rate tons/year raw', pa.string()),
+    ('rn_number', pa.dictionary(pa.int32(), pa.string())),
+    ('permit_number', pa.dictionary(pa.int32(), pa.string())),
+    ('publish_date', pa.date32()),
+    ('file_location', pa.string()),
+    ('publish_year', pa.int16()),
+])
+ENTITY_SCHEMA = pa.schema([
+    ('rn_number', pa.string()),
+    ('regulated_entity_name', pa.string()),
+    ('location', pa.string()),
+    ('county', pa.string()),
+])
+
+
+def type_final_chunk(df):
+    for col in RATE_COLUMNS:
+        df[f"{col} raw"] = df[col].astype('string')
+        df[col] = parse_rates(df[col])
+    df['pollutant'] = normalize_pollutants(df['Air Contaminant Name'])
+    publish_date = pd.to_datetime(df['publish_date'], format='%m-%d-%Y', errors='coerce')
+    df['publish_date'] = publish_date.dt.date
+    df['publish_year'] = publish_date.dt.year.fillna(0).astype('int16')
+    for col in FINAL_CATEGORICALS:
+        df[col] = df[col].astype('string').astype('category')
+    # Clustering by pollutant gives row groups tight min/max statistics to skip on
+    df = df.sort_values(['pollutant', 'rn_number'])
+    return pa.Table.from_pandas(df[FINAL_SCHEMA.names], schema=FINAL_SCHEMA, preserve_index=False)
+
+
+def final_batches(csv_path=FINAL_CSV_PATH, chunk_rows=CHUNK_ROWS):
+    for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunk_rows):
+        yield from type_final_chunk(chunk).to_batches()
+
+
+def write_dataset(batches, schema, out_dir, partition_col):
+    """Write a hive-partitioned dataset that replaces `out_dir` as a whole.
+
+    The new dataset is written next to the old one and swapped in at the end,
+    so partitions missing from this run do not survive from an earlier one,
+    and readers never see a half-written dataset.
+    """
+    tmp_dir = f"{out_dir}.tmp"
+    old_dir = f"{out_dir}.old"
+    for path in (tmp_dir, old_dir):
+        shutil.rmtree(path, ignore_errors=True)
+    try:
+        ds.write_dataset(
+            batches,
+            tmp_dir,
+            schema=schema,
+            format='parquet',
+            partitioning=ds.partitioning(pa.schema([schema.field(partition_col)]), flavor='hive'),
+            existing_data_behavior='error',
+            max_rows_per_group=ROW_GROUP_ROWS,
+            min_rows_per_group=min(ROW_GROUP_ROWS, 16_000),
+        )
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logging.info(f"Wrote {out_dir}")
+
+
+def export_final(csv_path=FINAL_CSV_PATH, parquet_dir=PARQUET_DIR):
+    """final.csv.zip -> parquet/final_maerts/publish_year=YYYY/, read in chunks."""
+    write_dataset(final_batches(csv_path), FINAL_SCHEMA, os.path.join(parquet_dir, FINAL_DATASET), 'publish_year')
+
+
+def load_entities(entities_path=ENTITIES_CSV_PATH, county_dir=COUNTY_DIR):
+    if os.path.exists(entities_path):
+        df = pd.read_csv(entities_path, dtype=str, usecols=lambda c: c in ENTITY_SCHEMA.names)
+    else:
+        # No combined file yet: fall back to the per-county scrapes, county taken from the file name
+        frames = []
+        for path in glob.glob(os.path.join(county_dir, '*.csv')):
+            if os.path.basename(path) == 'record_counts.csv':
+                continue
+            frame = pd.read_csv(path, dtype=str, on_bad_lines='skip')
+            frame.columns = [c.strip().lower().replace(' ', '_') for c in frame.columns]
+            frame = frame.rename(columns={'rn': 'rn_number'})
+            frame['county'] = os.path.splitext(os.path.basename(path))[0]
+            frames.append(frame)
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    for col in ENTITY_SCHEMA.names:
+        if col not in df.columns:
+            df[col] = None
+    df['county'] = df['county'].fillna('UNKNOWN').str.strip().str.upper()
+    return df[ENTITY_SCHEMA.names]
+
+
+def export_entities(entities_path=ENTITIES_CSV_PATH, county_dir=COUNTY_DIR, parquet_dir=PARQUET_DIR):
+    """Entity list -> parquet/entities/county=NAME/."""
+    df = load_entities(entities_path, county_dir)
+    table = pa.Table.from_pandas(df, schema=ENTITY_SCHEMA, preserve_index=False)
+    write_dataset(table.to_batches(), ENTITY_SCHEMA, os.path.join(parquet_dir, ENTITIES_DATASET), 'county')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write partitioned Parquet datasets of the final MAERT table and entity list")
+    parser.add_argument('--only', choices=['final', 'entities'], help="Write just one of the datasets")
+    parser.add_argument('--final-csv', default=FINAL_CSV_PATH)
+    parser.add_argument('--entities-csv', default=ENTITIES_CSV_PATH)
+    parser.add_argument('--out', default=PARQUET_DIR)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.only in (None, 'final'):
+        export_final(args.final_csv, args.out)
+    if args.only in (None, 'entities'):
+        export_entities(args.entities_csv, COUNTY_DIR, args.out)
+
+
+# Main entry
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
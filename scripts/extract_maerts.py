@@ -0,0 +1,299 @@
+import os
+import re
+import csv
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pdf_store import file_sha256
+from page_triage import load_or_triage, UNKNOWN
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PDF_PATH = os.path.join(BASE_DIR, '..', 'data', 'pdfs')
+CACHE_PATH = os.getenv("MAERT_EXTRACT_CACHE", os.path.join(BASE_DIR, '..', 'data', 'extract_cache'))
+# Bump whenever extraction output changes so cached results are recomputed
+EXTRACTOR_VERSION = '3'
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+ROW_COLUMNS = [
+    'Emission Source', 'Source Name', 'Air Contaminant Name',
+    'Emission Rate lbs/hr', 'Emission Rate tons/year', 'page', 'method', 'table_type',
+]
+HEADER_KEYWORDS = {
+    'Emission Source': ('emission point', 'epn', 'point no'),
+    'Source Name': ('source name',),
+    'Air Contaminant Name': ('contaminant', 'pollutant'),
+    'Emission Rate lbs/hr': ('lbs/hour', 'lb/hr', 'lbs/hr', 'lb/hour', 'pounds'),
+    'Emission Rate tons/year': ('tons/year', 'tpy', 'ton/yr', 'tons/yr'),
+}
+RATE_RE = r'(?:<\s*)?[\d.,]+|-+|N/?A'
+TEXT_ROW_RE = re.compile(rf'^(?P<source>\S+)\s+(?P<name>.+?)\s+(?P<pollutant>\S+)\s+(?P<lbs>{RATE_RE})\s+(?P<tons>{RATE_RE})$')
+
+
+def cache_file(sha256, cache_path=CACHE_PATH):
+    return os.path.join(cache_path, f"v{EXTRACTOR_VERSION}", sha256[:2], f"{sha256}.csv")
+
+
+def skip_file(sha256, cache_path=CACHE_PATH):
+    # Present next to a cached document with no rows, saying why nothing was extracted
+    return os.path.join(cache_path, f"v{EXTRACTOR_VERSION}", sha256[:2], f"{sha256}.skip")
+
+
+def _clean(cell):
+    return ' '.join(str(cell).split()) if cell is not None else ''
+
+
+def map_header(rows):
+    """Find MAERT column positions from the first few (possibly wrapped) header rows.
+
+    Returns (column index by field, number of header rows), or (None, 0) when
+    the table is not a MAERT.
+    """
+    for header_rows in (1, 2, 3):
+        if len(rows) < header_rows:
+            break
+        width = max(len(r) for r in rows[:header_rows])
+        labels = [
+            ' '.join(_clean(r[i]) for r in rows[:header_rows] if i < len(r)).lower()
+            for i in range(width)
+        ]
+        positions = {}
+        for field, keywords in HEADER_KEYWORDS.items():
+            for i, label in enumerate(labels):
+                if i not in positions.values() and any(k in label for k in keywords):
+                    positions[field] = i
+                    break
+        if 'Air Contaminant Name' in positions and (
+                'Emission Rate lbs/hr' in positions or 'Emission Rate tons/year' in positions):
+            return positions, header_rows
+    return None, 0
+
+
+def rows_from_table(table, page_number):
+    positions, header_rows = map_header(table)
+    if positions is None:
+        return []
+    rows = []
+    source = name = ''
+    for raw in table[header_rows:]:
+        cells = [_clean(c) for c in raw]
+        values = {field: cells[i] if i < len(cells) else '' for field, i in positions.items()}
+        if values.get('Emission Source'):
+            source = values['Emission Source']
+            name = values.get('Source Name', '')
+        elif values.get('Source Name'):
+            name = values['Source Name']
+        pollutant = values.get('Air Contaminant Name', '')
+        lbs = values.get('Emission Rate lbs/hr', '')
+        tons = values.get('Emission Rate tons/year', '')
+        if not pollutant or not (lbs or tons):
+            continue
+        # Header rows repeat at the top of continuation pages
+        if map_header([raw])[0] is not None:
+            continue
+        rows.append([source, name, pollutant, lbs, tons, page_number, 'table'])
+    return rows
+
+
+def rows_from_text(text, page_number):
+    rows = []
+    for line in (text or '').splitlines():
+        match = TEXT_ROW_RE.match(' '.join(line.split()))
+        if match:
+            rows.append([
+                match['source'], match['name'], match['pollutant'],
+                match['lbs'], match['tons'], page_number, 'text',
+            ])
+    return rows
+
+
+def extract_rows(pdf_path, pages=None):
+    """Extract MAERT rows from a PDF, optionally only from the given 1-based pages."""
+    import pdfplumber
+
+    rows = []
+    with pdfplumber.open(pdf_path) as pdf:
+        page_numbers = pages or range(1, len(pdf.pages) + 1)
+        for page_number in page_numbers:
+            page = pdf.pages[page_number - 1]
+            page_rows = []
+            for table in page.extract_tables():
+                page_rows.extend(rows_from_table(table, page_number))
+            if not page_rows:
+                text = page.extract_text() or ''
+                if 'contaminant' in text.lower():
+                    page_rows = rows_from_text(text, page_number)
+            rows.extend(page_rows)
+    return rows
+
+
+def write_rows(path, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(ROW_COLUMNS)
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def write_skip(sha256, cache_path, reason):
+    path = skip_file(sha256, cache_path)
+    if reason is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(reason)
+
+
+def read_skip(sha256, cache_path=CACHE_PATH):
+    """Why a cached document has no rows, or None if it has rows or was never extracted."""
+    path = skip_file(sha256, cache_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def pages_to_parse(triage):
+    """Pages to hand to the table parser (None for every page), or [] when there is nothing to parse."""
+    if triage['classification'] == UNKNOWN:
+        # Pages with any MAERT signal are still worth a look; a document without any is skipped
+        return triage['ranked_pages'] if triage.get('has_text', True) else []
+    # No page scored as a candidate, e.g. only the title matched: try every page with a signal, else all
+    return triage['candidate_pages'] or triage['ranked_pages'] or None
+
+
+def read_rows(sha256, cache_path=CACHE_PATH):
+    with open(cache_file(sha256, cache_path), newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)
+        yield from reader
+
+
+def extract_document(pdf_path, sha256=None, cache_path=CACHE_PATH, force=False, all_pages=False):
+    """Worker entry point: extract one PDF into the cache. Returns (sha256, row count or None if cached).
+
+    The cheap text-layer triage picks the candidate pages; only those go
+    through the table parser, or the pages with any MAERT signal when none
+    qualified. A document that yields no rows is cached empty together with
+    the reason (see read_skip()), so it can be told apart and parsed again
+    in full with `all_pages`.
+    """
+    sha256 = sha256 or file_sha256(pdf_path)
+    path = cache_file(sha256, cache_path)
+    if os.path.exists(path) and not force:
+        return sha256, None
+    triage = load_or_triage(pdf_path, sha256, cache_path)
+    pages = None if all_pages else pages_to_parse(triage)
+    rows = []
+    if not triage.get('has_text', True):
+        reason = 'no text layer'
+    elif pages == []:
+        reason = 'no MAERT signals'
+    else:
+        rows = extract_rows(pdf_path, pages)
+        for row in rows:
+            row.append(triage['classification'])
+        reason = None if rows else f"no rows found on {'all pages' if pages is None else f'pages {pages}'}"
+    write_skip(sha256, cache_path, reason)
+    write_rows(path, rows)
+    return sha256, len(rows)
+
+
+def documents_from_store():
+    from state_store import open_store
+
+    store = open_store()
+    for row in store.done_documents():
+        if row['file_name']:
+            yield row['file_name'], row['sha256']
+
+
+def documents_from_manifest(manifest_path):
+    with open(manifest_path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield row['File Name'], None
+
+
+def run_extraction(documents, pdf_path=PDF_PATH, workers=DEFAULT_WORKERS, cache_path=CACHE_PATH, force=False,
+                   retry_skipped=False):
+    """Extract every (file name, sha256) document on a process pool, skipping cached hashes.
+
+    Documents without a sha256 (from a manifest) are hashed first, so they
+    are cached, deduplicated and retried like any other. With
+    `retry_skipped`, cached documents that yielded no rows are parsed again
+    on every page.
+    """
+    submitted = set()
+    tasks = []
+    missing = 0
+    cached = 0
+    for file_name, sha256 in documents:
+        if sha256 is not None and sha256 in submitted:
+            continue
+        path = os.path.join(pdf_path, file_name)
+        if not os.path.exists(path):
+            missing += 1
+            continue
+        if sha256 is None:
+            sha256 = file_sha256(path)
+            if sha256 in submitted:
+                continue
+        submitted.add(sha256)
+        retry = retry_skipped and read_skip(sha256, cache_path) is not None
+        if not force and not retry and os.path.exists(cache_file(sha256, cache_path)):
+            cached += 1
+            continue
+        tasks.append((path, sha256, retry))
+
+    logging.info(f"{len(tasks)} PDFs to extract, {cached} already cached, {missing} missing on disk")
+    extracted = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(extract_document, path, sha256, cache_path, force or retry, retry): path
+            for path, sha256, retry in tasks
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                sha256, count = future.result()
+            except Exception as e:
+                failed += 1
+                logging.warning(f"Extraction failed for {path}: {e}")
+                continue
+            if count is None:
+                cached += 1
+            else:
+                extracted += 1
+                logging.info(f"[{i}/{len(tasks)}] {os.path.basename(path)}: {count} rows")
+    logging.info(f"Extracted {extracted} PDFs, {cached} cached, {failed} failed")
+    return extracted, cached, failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract MAERT tables from downloaded permit PDFs")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Number of extraction processes (default: %(default)s)")
+    parser.add_argument('--manifest', help="Read documents from a download_logs.csv instead of the state store")
+    parser.add_argument('--pdf-dir', default=PDF_PATH)
+    parser.add_argument('--cache-dir', default=CACHE_PATH)
+    parser.add_argument('--force', action='store_true', help="Re-extract documents that are already cached")
+    parser.add_argument('--retry-skipped', action='store_true',
+                        help="Parse every page of cached documents that yielded no rows")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    documents = documents_from_manifest(args.manifest) if args.manifest else documents_from_store()
+    run_extraction(documents, args.pdf_dir, args.workers, args.cache_dir, args.force, args.retry_skipped)
+
+
+# Main entry
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
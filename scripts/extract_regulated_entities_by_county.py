@@ -1,106 +1,128 @@
-from selenium import webdriver
 from selenium.webdriver.support.ui import Select, WebDriverWait
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.expected_conditions import presence_of_element_located
-from selenium.common.exceptions import TimeoutException
 import pandas as pd
-from io import StringIO
 import os
-import time
+import logging
+
+from state_store import open_store, DONE, FAILED
+from results_writer import ResultsWriter, results_table_html, RESULTS_TABLE_XPATH
+from waits import Waits
+from resilience import TransientError, classify, retry_call
+from browser import BrowserSession
 
 # Constants
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(BASE_DIR, '..', 'data', 'regulated_entities_county')
-URL = "https://www15.tceq.texas.gov/crpub/index.cfm?fuseaction=regent.RNSearch"
+# Point TCEQ_CR_URL at a local stub server to run against recorded pages
+URL = os.getenv("TCEQ_CR_URL", "https://www15.tceq.texas.gov/crpub/index.cfm?fuseaction=regent.RNSearch")
 WAIT_TIME = 10
 
-# Ensure output directory exists
-os.makedirs(DATA_PATH, exist_ok=True)
-
-# Setup
-driver = webdriver.Chrome()
-wait = WebDriverWait(driver, WAIT_TIME)
-
-# Track record counts for CSV
-record_counts = []
-
-# Go to the main page and collect valid county indices
-driver.get(URL)
-wait.until(presence_of_element_located((By.NAME, 'cnty_name')))
-initial_county_options = Select(driver.find_element(By.NAME, 'cnty_name')).options
-
-county_indices = [
-    i for i, option in enumerate(initial_county_options)
-    if option.get_attribute("value").strip() != ""
-]
-
-# Loop through all valid counties
-for county_index in county_indices:
-    try:
-        driver.get(URL)
-        wait.until(presence_of_element_located((By.NAME, 'cnty_name')))
-
-        # Select program type
-        select_program_type = Select(driver.find_element(By.NAME, 'pgm_area'))
-        select_program_type.select_by_value('AIRNSR    ')
-
-        # Select county
-        select_county = Select(driver.find_element(By.NAME, 'cnty_name'))
-        select_county.select_by_index(county_index)
-        selected_option_text = select_county.first_selected_option.text.strip()
-        print(f"Filtering for {selected_option_text} (index {county_index})")
-
-        # Submit the form
-        driver.find_element(By.NAME, '_fuseaction=regent.validateRE').click()
-
-        # Wait for results
-        try:
-            number_of_records = wait.until(
-                presence_of_element_located((By.XPATH, '/html/body/div/div[2]/div[2]/span'))
-            )
-            number_of_records_int = int(number_of_records.text)
-            print(f"{number_of_records_int} records found.")
-        except TimeoutException:
-            print("⚠️ Failed to load number of records for:", selected_option_text)
-            record_counts.append({"county": selected_option_text, "number of records": 0})
-            continue
-
-        total_records = []
-
-        # Paginated scraping
-        while len(total_records) < number_of_records_int:
-            df = pd.read_html(StringIO(driver.page_source))[0]
-            total_records.append(df)
+
+def list_counties(driver):
+    driver.get(URL)
+    WebDriverWait(driver, WAIT_TIME).until(presence_of_element_located((By.NAME, 'cnty_name')))
+    options = Select(driver.find_element(By.NAME, 'cnty_name')).options
+    return [option.text.strip() for option in options if option.get_attribute("value").strip() != ""]
+
+
+def scrape_county(driver, county):
+    """Scrape all AIRNSR entities of one county to DATA_PATH.
+
+    Returns (rows saved, record count reported by the site); failures are raised.
+    """
+    waits = Waits(driver, WAIT_TIME, events=False)
+    driver.get(URL)
+    waits.until('search form', presence_of_element_located((By.NAME, 'cnty_name')))
+
+    # Select program type
+    select_program_type = Select(driver.find_element(By.NAME, 'pgm_area'))
+    select_program_type.select_by_value('AIRNSR    ')
+
+    # Select county
+    select_county = Select(driver.find_element(By.NAME, 'cnty_name'))
+    select_county.select_by_visible_text(county)
+    logging.info(f"Filtering for {county}")
+
+    # Submit the form
+    driver.find_element(By.NAME, '_fuseaction=regent.validateRE').click()
+
+    # Wait for results, or the error block a county without entities gets
+    page = waits.first_of('search results', {
+        'list': presence_of_element_located((By.XPATH, '/html/body/div/div[2]/div[2]/span')),
+        'error': presence_of_element_located((By.CSS_SELECTOR, 'div.error')),
+    })
+    if page is None:
+        logging.warning(f"Failed to load number of records for {county}")
+        raise TransientError("Timed out loading number of records")
+    if page == 'error':
+        error_text = driver.find_element(By.CSS_SELECTOR, 'div.error').text
+        if "No results were found" in error_text:
+            logging.info(f"No records found for {county}")
+            return 0, 0
+        raise TransientError(f"Search error: {error_text.strip()}")
+    number_of_records_int = int(driver.find_element(By.XPATH, '/html/body/div/div[2]/div[2]/span').text)
+    logging.info(f"{number_of_records_int} records found for {county}")
+
+    safe_filename = f"{county.replace('/', '-')}.csv"
+    filepath = os.path.join(DATA_PATH, safe_filename)
+
+    # Paginated scraping, each page is appended to the CSV as it loads
+    with ResultsWriter(filepath) as writer:
+        while writer.rows < number_of_records_int:
+            logging.info(f"Scraping page {writer.pages + 1}")
+            if not writer.write_page(results_table_html(driver)):
+                break
 
             try:
                 next_button = driver.find_element(By.LINK_TEXT, ">")
                 if next_button.is_enabled():
+                    old_table = driver.find_element(By.XPATH, RESULTS_TABLE_XPATH)
                     next_button.click()
-                    time.sleep(1.5)  # Give the page time to reload
+                    # Wait for the next page's table rather than a fixed delay
+                    waits.replaced('next page', old_table, (By.XPATH, RESULTS_TABLE_XPATH))
                 else:
                     break
-            except:
+            except Exception:
                 break
 
-        # Save the data
-        df_total_records = pd.concat(total_records)
-        safe_filename = f"{selected_option_text.replace('/', '-')}.csv"
-        filepath = os.path.join(DATA_PATH, safe_filename)
-        df_total_records.to_csv(filepath, index=False)
-        print(f"✅ Saved data to: {filepath}\n")
+    logging.info(f"Saved {writer.rows} rows to {filepath}")
+    return writer.rows, number_of_records_int
 
-        # Log number of records
-        record_counts.append({"county": selected_option_text, "number of records": len(df_total_records)})
 
-    except Exception as e:
-        print(f"❌ Error processing county index {county_index}: {e}")
-        record_counts.append({"county": selected_option_text, "number of records": 0})
-        continue
+def main():
+    # Ensure output directory exists
+    os.makedirs(DATA_PATH, exist_ok=True)
 
-# Write the record counts CSV
-df_counts = pd.DataFrame(record_counts)
-df_counts.to_csv(os.path.join(DATA_PATH, "record_counts.csv"), index=False)
-print("Saved record_counts.csv")
+    # Track record counts for CSV, completed counties are recorded in the state store
+    record_counts = []
+    store = open_store()
+    done_counties = store.queries_with_status('county', DONE)
 
-driver.quit()
-print("All counties processed!")
+    with BrowserSession() as session:
+        counties = [c for c in list_counties(session.driver()) if c not in done_counties]
+
+        # Loop through all remaining counties
+        for county in counties:
+            store.start_query('county', county)
+            try:
+                count, expected = retry_call(lambda: session.run(scrape_county, county), f"County {county}")
+            except Exception as e:
+                logging.error(f"Error processing county {county}: {e}")
+                count = None
+                store.finish_query('county', county, FAILED, error=f"{classify(e).label}: {e}")
+            else:
+                store.finish_query('county', county, DONE, record_count=count, expected_count=expected)
+            # Log number of records
+            record_counts.append({"county": county, "number of records": count or 0})
+
+    # Write the record counts CSV
+    df_counts = pd.DataFrame(record_counts)
+    df_counts.to_csv(os.path.join(DATA_PATH, "record_counts.csv"), index=False)
+    logging.info("Saved record_counts.csv")
+    logging.info("All counties processed")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
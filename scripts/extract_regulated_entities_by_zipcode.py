@@ -1,39 +1,33 @@
 import os
 import glob
 import logging
-from time import sleep
-from io import StringIO
 
 import pandas as pd
 import zipcodes
 from bs4 import BeautifulSoup
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
-
-# Setup Chrome options
-options = webdriver.ChromeOptions()
-options.add_argument('--disable-gpu')
-options.add_argument('--no-sandbox')
-options.add_argument('--window-size=1920x1080')
-options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120 Safari/537.36')
+from state_store import open_store, DONE, FAILED
+from results_writer import ResultsWriter, results_table_html, RESULTS_TABLE_XPATH
+from waits import Waits
+from browser import BrowserSession
+from resilience import TransientError, LayoutError, classify, retry_call
 
 # Constants
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(BASE_DIR, '..', 'data', 'regulated_entities_zipcode')
-URL = "https://www15.tceq.texas.gov/crpub/index.cfm?fuseaction=regent.RNSearch"
+# Point TCEQ_CR_URL at a local stub server to run against recorded pages
+URL = os.getenv("TCEQ_CR_URL", "https://www15.tceq.texas.gov/crpub/index.cfm?fuseaction=regent.RNSearch")
 WAIT_TIME = 10
+RECORD_COUNT_XPATH = '/html/body/div/div[2]/div[2]/span'
 
 # Get all TX zip codes
-tx_zip_codes = [z['zip_code'] for z in zipcodes.filter_by(state="TX")]
+def tx_zip_codes():
+    return [z['zip_code'].strip() for z in zipcodes.filter_by(state="TX")]
 
 def get_processed_zip_codes(path):
     csv_files = glob.glob(os.path.join(path, "*.csv"))
@@ -89,13 +83,14 @@ def parse_single_record_page(html, zip_code):
     return pd.DataFrame([data])
 
 def scrape_zip(driver, zip_code):
+    # Returns (rows saved, record count reported by the site); failures are raised
     logging.info(f"Starting scrape for ZIP {zip_code}")
     driver.get(URL)
 
-    wait = WebDriverWait(driver, 10)
+    waits = Waits(driver, WAIT_TIME, events=False)
 
     try:
-        select_program_type = wait.until(EC.presence_of_element_located((By.NAME, 'pgm_area')))
+        select_program_type = waits.until('search form', EC.presence_of_element_located((By.NAME, 'pgm_area')))
         Select(select_program_type).select_by_value('AIRNSR    ')
 
         zip_input = driver.find_element(By.ID, 'zip_cd')
@@ -104,86 +99,99 @@ def scrape_zip(driver, zip_code):
 
         driver.find_element(By.NAME, '_fuseaction=regent.validateRE').click()
 
-        try:
-            results_text = wait.until(EC.presence_of_element_located((By.XPATH, '/html/body/div/div[2]/div[2]/span')))
-            record_line = results_text.text.strip()
+        # The search lands on a result list, a "no results" error or a single record, whichever loads first
+        page = waits.first_of('search results', {
+            'list': EC.presence_of_element_located((By.XPATH, RECORD_COUNT_XPATH)),
+            'error': EC.presence_of_element_located((By.CSS_SELECTOR, 'div.error')),
+            'single': EC.presence_of_element_located((By.ID, 'reinfo')),
+        })
+
+        if page == 'list':
+            record_line = driver.find_element(By.XPATH, RECORD_COUNT_XPATH).text.strip()
             record_numbers = [s for s in record_line.split() if s.isdigit()]
             if not record_numbers:
                 logging.warning(f"No numeric record count found in line: '{record_line}'")
-                return 0
+                return 0, 0
 
             num_records = int(record_numbers[0])
             logging.info(f"{num_records} records found for ZIP {zip_code}")
 
-        except TimeoutException:
+        elif page is None:
+            raise TransientError("Timed out waiting for search results")
+
+        else:
             # --- Check for "No results were found" error block ---
-            try:
+            if page == 'error':
                 error_div = driver.find_element(By.CSS_SELECTOR, "div.error")
                 if "No results were found for the criteria you entered" in error_div.text:
                     logging.info(f"No results for ZIP {zip_code} — skipping.")
-                    return 0
-            except:
-                pass  # error div not found, continue as single result
+                    return 0, 0
+                # Any other message is the site failing to answer the search
+                raise TransientError(f"Search error: {error_div.text.strip()}")
 
-            # --- Parse single-record page if error not present ---
-            logging.info("Only one result or different page layout — assuming single record.")
+            # --- Parse single-record page ---
+            logging.info("Only one result — parsing single record page.")
             df_single = parse_single_record_page(driver.page_source, zip_code)
             df_single.to_csv(os.path.join(DATA_PATH, f"{zip_code}.csv"), index=False)
             logging.info(f"Finished ZIP {zip_code}, saved 1 row (single record view)")
-            return 1
-
-        # --- Multi-record scraping ---
-        total_records = []
-        df_total_records = pd.DataFrame()
-
-        while len(df_total_records) < num_records:
-            logging.info(f"Scraping page {len(total_records) + 1}")
-            df = pd.read_html(StringIO(driver.page_source))[0]
-            total_records.append(df)
-            df_total_records = pd.concat(total_records)
-
-            try:
-                next_btn = driver.find_element(By.LINK_TEXT, ">")
-                next_btn.click()
-                sleep(1)
-            except Exception:
-                break
-
-        df_total_records["zipcode"] = zip_code
-        df_total_records.to_csv(os.path.join(DATA_PATH, f"{zip_code}.csv"), index=False)
-        logging.info(f"Finished ZIP {zip_code}, saved {len(df_total_records)} rows")
-        return len(df_total_records)
+            return 1, 1
+
+        # --- Multi-record scraping, each page is appended to the CSV as it loads ---
+        with ResultsWriter(os.path.join(DATA_PATH, f"{zip_code}.csv"), extra={"zipcode": zip_code}) as writer:
+            while writer.rows < num_records:
+                logging.info(f"Scraping page {writer.pages + 1}")
+                if not writer.write_page(results_table_html(driver)):
+                    break
+
+                try:
+                    next_btn = driver.find_element(By.LINK_TEXT, ">")
+                    old_table = driver.find_element(By.XPATH, RESULTS_TABLE_XPATH)
+                    next_btn.click()
+                    waits.replaced('next page', old_table, (By.XPATH, RESULTS_TABLE_XPATH))
+                except Exception:
+                    break
+
+        logging.info(f"Finished ZIP {zip_code}, saved {writer.rows} rows")
+        return writer.rows, num_records
 
     except Exception as e:
-        logging.error(f"Timeout while processing ZIP {zip_code}: {e}")
-        with open(os.path.join(DATA_PATH, f"error_{zip_code}.html"), "w", encoding="utf-8") as f:
-            f.write(driver.page_source)
-        return 0
+        error_class = classify(e)
+        logging.error(f"Failed on ZIP {zip_code} ({error_class.label}): {e}")
+        if issubclass(error_class, LayoutError):
+            # Only a layout change is worth a page dump; it shows what the markup turned into
+            with open(os.path.join(DATA_PATH, f"error_{zip_code}.html"), "w", encoding="utf-8") as f:
+                f.write(driver.page_source)
+        raise
 
 def main():
     os.makedirs(DATA_PATH, exist_ok=True)
-    processed_zips = get_processed_zip_codes(DATA_PATH)
-    remaining_zips = [z.strip() for z in tx_zip_codes if z.strip() not in processed_zips]
-
-    # Resume from ZIP code 79159
-    START_FROM = "79159"
-    remaining_zips = [z for z in remaining_zips if z > START_FROM]
+    store = open_store()
+    processed_zips = get_processed_zip_codes(DATA_PATH) | store.queries_with_status('zip', DONE)
+    # Finished ZIPs are recorded in the state store, so a restart resumes where it stopped
+    remaining_zips = [z for z in tx_zip_codes() if z not in processed_zips]
 
     record_counts_path = os.path.join(DATA_PATH, "record_counts.csv")
     record_counts = []
 
     logging.info(f"Total ZIPs to process: {len(remaining_zips)}")
 
-    with webdriver.Chrome(service=Service(), options=options) as driver:
+    with BrowserSession() as session:
         for zip_code in remaining_zips:
+            store.start_query('zip', zip_code)
+            error = None
+            count = expected = None
             try:
-                count = scrape_zip(driver, zip_code)
+                count, expected = retry_call(lambda: session.run(scrape_zip, zip_code), f"ZIP {zip_code}")
             except Exception as e:
-                logging.exception(f"Failed on ZIP {zip_code}: {e}")
-                count = 0
+                error = f"{classify(e).label}: {e}"
             finally:
-                record_counts.append({"zipcode": zip_code, "number_of_records": count})
+                if error:
+                    store.finish_query('zip', zip_code, FAILED, error=error)
+                else:
+                    store.finish_query('zip', zip_code, DONE, record_count=count, expected_count=expected)
+                record_counts.append({"zipcode": zip_code, "number_of_records": count or 0})
                 pd.DataFrame(record_counts).to_csv(record_counts_path, index=False)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
     main()
@@ -1,46 +1,206 @@
 import os
-import pandas as pd
+import re
 import glob
+import json
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from pdf_store import file_sha256
 
 # Paths to the folders
-county_dir = os.path.join("data", "regulated_entities_county")
-zipcode_dir = os.path.join("data", "regulated_entities_zipcode")
-output_path = os.path.join("data", "all_scraped_rns.csv")
-
-print("Collecting CSV file paths...")
-# Get all CSV file paths
-county_files = glob.glob(os.path.join(county_dir, "*.csv"))
-zipcode_files = glob.glob(os.path.join(zipcode_dir, "*.csv"))
-all_files = county_files + zipcode_files
-
-print(f"Found {len(county_files)} county files and {len(zipcode_files)} zipcode files.")
-print(f"Total files to process: {len(all_files)}")
-
-rn_numbers = []
-
-for i, file_path in enumerate(all_files, 1):
-    print(f"[{i}/{len(all_files)}] Processing file: {file_path}")
-    try:
-        df = pd.read_csv(file_path, dtype=str, encoding='utf-8', on_bad_lines='skip')
-        print(f"  - Read {len(df)} rows.")
-        df.columns = [col.strip() for col in df.columns]  # Clean column names
-        print(df.columns)
-        rn_col = next((col for col in df.columns if 'RN' in col), None)
-        if rn_col:
-            num_rns = df[rn_col].dropna().shape[0]
-            print(f"  - Found RN column '{rn_col}' with {num_rns} non-null values.")
-            rn_numbers.extend(df[rn_col].dropna().tolist())
-        else:
-            print("  - No RN column found.")
-    except Exception as e:
-        print(f"  - Failed to process {file_path}: {e}")
-
-# Create a DataFrame with unique RN numbers
-print("Creating DataFrame of unique RN numbers...")
-rn_series = pd.Series(rn_numbers).drop_duplicates()
-rn_df = pd.DataFrame({'RN Number': rn_series.sort_values().reset_index(drop=True)})
-
-# Save to CSV
-os.makedirs(os.path.dirname(output_path), exist_ok=True)
-rn_df.to_csv(output_path, index=False)
-print(f"Saved {len(rn_df)} unique RN numbers to {output_path}")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
+COUNTY_DIR = os.path.join(DATA_DIR, 'regulated_entities_county')
+ZIPCODE_DIR = os.path.join(DATA_DIR, 'regulated_entities_zipcode')
+RNS_OUTPUT_PATH = os.path.join(DATA_DIR, 'all_scraped_rns.csv')
+ENTITIES_OUTPUT_PATH = os.path.join(DATA_DIR, 'combined_entities.csv')
+MERGE_CACHE_PATH = os.path.join(DATA_DIR, 'merge_cache')
+# Bump whenever per-file normalization changes so cached files are re-read
+MERGE_VERSION = '1'
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+RN_RE = re.compile(r'^RN\d{9}$')
+ENTITY_COLUMNS = ['rn_number', 'regulated_entity_name', 'county', 'location']
+OUTPUT_COLUMNS = ['rn_number', 'regulated_entity_name', 'county', 'location', 'found_in']
+SKIP_FILES = {'record_counts.csv'}
+
+
+def canonical_column(name):
+    """Map a scraped header ("RN", "RN Number", "Regulated Entity Name", "Street Address", ...) to ENTITY_COLUMNS."""
+    key = re.sub(r'[^a-z0-9]+', '_', str(name).strip().lower()).strip('_')
+    if key in ('rn', 'rn_number', 'rn_no', 'regulated_entity_rn', 'regulated_entity_number'):
+        return 'rn_number'
+    if 'county' in key:
+        return 'county'
+    if 'name' in key and 'customer' not in key:
+        return 'regulated_entity_name'
+    if 'location' in key or 'address' in key:
+        return 'location'
+    return None
+
+
+def normalize_rns(values):
+    # " rn 100209287", "100209287" and "RN100209287" are the same RN; anything else becomes NA
+    rns = values.astype('string').str.upper().str.replace(r'[^0-9RN]', '', regex=True)
+    rns = rns.where(~rns.str.fullmatch(r'\d{9}', na=False), 'RN' + rns)
+    return rns.where(rns.str.fullmatch(RN_RE.pattern, na=False))
+
+
+def input_files(county_dir=COUNTY_DIR, zipcode_dir=ZIPCODE_DIR):
+    """(path, provenance label, county) for every scraped results CSV, counties first."""
+    files = []
+    for kind, data_dir in (('county', county_dir), ('zip', zipcode_dir)):
+        for path in sorted(glob.glob(os.path.join(data_dir, '*.csv'))):
+            name = os.path.basename(path)
+            if name in SKIP_FILES:
+                continue
+            query = os.path.splitext(name)[0]
+            files.append((path, f"{kind}:{query}", query if kind == 'county' else None))
+    return files
+
+
+def read_entities(path, source, county=None):
+    """Read the entity columns of one results CSV, with canonical headers and validated RNs."""
+    df = pd.read_csv(path, dtype=str, encoding='utf-8', on_bad_lines='skip',
+                     usecols=lambda c: canonical_column(c) is not None)
+    df.columns = [canonical_column(c) for c in df.columns]
+    # Keep the first of any columns that map to the same name, e.g. two address columns
+    df = df.loc[:, ~df.columns.duplicated()]
+    for col in ENTITY_COLUMNS:
+        if col not in df.columns:
+            df[col] = pd.NA
+    df = df[ENTITY_COLUMNS]
+    df['rn_number'] = normalize_rns(df['rn_number'])
+    invalid = int(df['rn_number'].isna().sum())
+    df = df.dropna(subset=['rn_number'])
+    if county is not None:
+        df['county'] = county
+    df['found_in'] = source
+    return df, invalid
+
+
+class MergeCache:
+    """Normalized entities of each input file, stored by content hash.
+
+    A manifest of (mtime, size, sha256) per path lets unchanged files skip
+    hashing as well as parsing, and a file rewritten with the same content
+    is not parsed again. The manifest also keeps how many rows of the file
+    had no valid RN, so cached files still report them.
+    """
+
+    def __init__(self, cache_path=MERGE_CACHE_PATH):
+        self.cache_path = os.path.join(cache_path, f"v{MERGE_VERSION}")
+        self.manifest_path = os.path.join(self.cache_path, 'manifest.json')
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        entry = self.manifest.get(path)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['sha256'], False
+        sha256 = file_sha256(path)
+        self.manifest[path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': sha256}
+        if entry and entry['sha256'] == sha256 and 'invalid' in entry:
+            self.manifest[path]['invalid'] = entry['invalid']
+        return sha256, entry is None or entry['sha256'] != sha256
+
+    def entities_file(self, sha256, source):
+        # The provenance label is part of the key: the same bytes can be the result of two searches
+        return os.path.join(self.cache_path, sha256[:2], f"{sha256}_{re.sub(r'[^A-Za-z0-9]+', '_', source)}.csv")
+
+    def save(self):
+        os.makedirs(self.cache_path, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def load_file(cache, path, source, county):
+    """Normalized entities of one input, from the cache when the file is unchanged. Returns (frame, changed, invalid)."""
+    sha256, changed = cache.file_hash(path)
+    cached = cache.entities_file(sha256, source)
+    entry = cache.manifest[path]
+    # Manifests written before the invalid count was kept get the file read once more
+    if os.path.exists(cached) and 'invalid' in entry:
+        return pd.read_csv(cached, dtype=str, keep_default_na=False, na_values=['']), changed, entry['invalid']
+    df, invalid = read_entities(path, source, county)
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp_path = f"{cached}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, cached)
+    entry['invalid'] = invalid
+    return df, True, invalid
+
+
+def combine(frames):
+    """One row per RN: the first non-empty name, county and location, and every search that found it."""
+    df = pd.concat(frames, ignore_index=True)
+    found_in = (
+        df[['rn_number', 'found_in']].drop_duplicates()
+        .groupby('rn_number', sort=False)['found_in'].agg(';'.join)
+    )
+    combined = df.groupby('rn_number', sort=True)[['regulated_entity_name', 'county', 'location']].first()
+    combined['found_in'] = found_in
+    return combined.reset_index()[OUTPUT_COLUMNS]
+
+
+def merge(county_dir=COUNTY_DIR, zipcode_dir=ZIPCODE_DIR, entities_path=ENTITIES_OUTPUT_PATH,
+          rns_path=RNS_OUTPUT_PATH, cache_path=MERGE_CACHE_PATH, workers=DEFAULT_WORKERS, force=False):
+    """Merge every county and ZIP results CSV into combined_entities.csv and all_scraped_rns.csv.
+
+    Returns False when no input changed since the last merge and the outputs were left as they are.
+    """
+    files = input_files(county_dir, zipcode_dir)
+    logging.info(f"Found {len(files)} county and ZIP result files")
+    cache = MergeCache(cache_path)
+    known = set(cache.manifest)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda f: load_file(cache, *f), files))
+    changed = sum(1 for _, file_changed, _ in results if file_changed)
+    removed = known - {path for path, _, _ in files}
+    for path in removed:
+        del cache.manifest[path]
+    cache.save()
+
+    invalid = sum(n for _, _, n in results)
+    if invalid:
+        logging.warning(f"Dropped {invalid} rows without a valid RN (RN followed by 9 digits)")
+    outputs_exist = os.path.exists(entities_path) and os.path.exists(rns_path)
+    if not (force or changed or removed) and outputs_exist:
+        logging.info("No input changed since the last merge, outputs are up to date")
+        return False
+    logging.info(f"{changed} changed and {len(removed)} removed input files, merging")
+
+    frames = [df for df, _, _ in results]
+    combined = combine(frames) if frames else pd.DataFrame(columns=OUTPUT_COLUMNS)
+    os.makedirs(os.path.dirname(entities_path), exist_ok=True)
+    combined.to_csv(entities_path, index=False)
+    pd.DataFrame({'RN Number': combined['rn_number']}).to_csv(rns_path, index=False)
+    logging.info(f"Saved {len(combined)} unique RNs to {entities_path} and {rns_path}")
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the county and ZIP entity scrapes into combined_entities.csv and all_scraped_rns.csv")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Number of files read in parallel (default: %(default)s)")
+    parser.add_argument('--force', action='store_true', help="Rewrite the outputs even if no input changed")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    merge(workers=args.workers, force=args.force)
+
+
+# Main entry
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
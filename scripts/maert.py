@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import importlib
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# command: (module, arguments put in front of the user's, help). A module is only imported when its command runs.
+COMMANDS = {
+    'discover': ('discover_entities', [], "Find regulated entities by county and ZIP code"),
+    'merge': ('get_all_rns', [], "Combine the entity searches into combined_entities.csv and all_scraped_rns.csv"),
+    'download': ('download_maert_pdfs', [], "Download MAERT PDFs for every scraped RN"),
+    'extract': ('extract_maerts', [], "Extract MAERT tables from the downloaded PDFs"),
+    'final': ('build_final', [], "Combine the extracted MAERT tables into final.csv.zip"),
+    'export': ('export_parquet', [], "Write the outputs as partitioned Parquet datasets"),
+    'query': ('maert_query', [], "Build or query the SQLite emissions index"),
+    'status': ('state_store', ['status'], "Print job counts by status from the state store"),
+    'export-logs': ('state_store', ['export-logs'], "Write completed downloads as download_logs.csv"),
+    'pdfs': ('pdf_store', [], "Manage the content-addressed PDF store ('pdfs migrate' converts data/pdfs)"),
+    'triage': ('page_triage', [], "Rank PDF pages by how likely they hold a MAERT table"),
+    'benchmark': ('benchmark', [], "Benchmark the pipeline offline against a stub of the TCEQ sites"),
+}
+
+
+def load_env():
+    # Settings in .env apply to every module, so load them before any is imported
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv(os.path.join(BASE_DIR, '..', '.env'))
+
+
+def run(command, argv=()):
+    """Run one command as if from the command line, e.g. run('download', ['--workers', '4'])."""
+    module_name, fixed_args, _ = COMMANDS[command]
+    load_env()
+    started = time.monotonic()
+    module = importlib.import_module(module_name)
+    logging.debug(f"Imported {module_name} in {time.monotonic() - started:.2f}s")
+    return module.main([*fixed_args, *argv])
+
+
+def parse_args(argv=None):
+    width = max(len(name) for name in COMMANDS)
+    commands = '\n'.join(f"  {name.ljust(width)}  {help_text}" for name, (_, _, help_text) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog='maert',
+        description="Texas MAERT scraping pipeline",
+        epilog=f"commands:\n{commands}\n\nRun 'maert <command> --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', help="Log debug messages")
+    parser.add_argument('command', choices=COMMANDS, metavar='command')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    # argparse names programs after argv[0], so a command's usage reads "maert <command> ..."
+    # (commands that fill in a subcommand of their module get it from the module's own parser)
+    sys.argv[0] = 'maert' if COMMANDS[args.command][1] else f"maert {args.command}"
+    return run(args.command, args.args)
+
+
+# Main entry
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+import os
+import re
+import sys
+import sqlite3
+import logging
+import argparse
+
+from normalize import canonical_pollutant, normalize_pollutants, parse_rates
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
+INDEX_DB_PATH = os.getenv("MAERT_INDEX_DB", os.path.join(DATA_DIR, 'maert_index.sqlite'))
+FINAL_CSV_PATH = os.path.join(DATA_DIR, 'final.csv.zip')
+ENTITIES_CSV_PATH = os.path.join(DATA_DIR, 'combined_entities.csv')
+CHUNK_ROWS = 250_000
+RATE_COLUMNS = {'lbs_hr': 'Emission Rate lbs/hr', 'tons_year': 'Emission Rate tons/year'}
+ZIP_RE = re.compile(r'\b(\d{5})(?:-\d{4})?\b')
+
+SCHEMA = """
+DROP TABLE IF EXISTS maerts;
+DROP TABLE IF EXISTS entities;
+DROP TABLE IF EXISTS current_permits;
+CREATE TABLE maerts (
+    rn_number TEXT,
+    permit_number TEXT,
+    publish_date TEXT,
+    publish_year INTEGER,
+    emission_source TEXT,
+    source_name TEXT,
+    pollutant TEXT,
+    pollutant_name TEXT,
+    lbs_hr REAL,
+    tons_year REAL,
+    file_location TEXT
+);
+CREATE TABLE entities (
+    rn_number TEXT PRIMARY KEY,
+    regulated_entity_name TEXT,
+    county TEXT,
+    zipcode TEXT,
+    location TEXT
+);
+"""
+INDEXES = """
+CREATE INDEX maerts_rn ON maerts (rn_number, pollutant);
+CREATE INDEX maerts_permit ON maerts (permit_number, publish_date);
+CREATE INDEX maerts_pollutant ON maerts (pollutant, rn_number);
+CREATE INDEX entities_county ON entities (county);
+CREATE INDEX entities_zipcode ON entities (zipcode);
+-- Each permit is reissued with a full new MAERT, so totals only count its latest version
+CREATE TABLE current_permits AS
+    SELECT rn_number, permit_number, MAX(publish_date) AS publish_date FROM maerts GROUP BY rn_number, permit_number;
+CREATE UNIQUE INDEX current_permits_key ON current_permits (rn_number, permit_number, publish_date);
+CREATE VIEW current_maerts AS
+    SELECT m.* FROM maerts m
+    JOIN current_permits c USING (rn_number, permit_number, publish_date);
+ANALYZE;
+"""
+RATE_SQL_COLUMNS = {'lbs_hr', 'tons_year'}
+
+
+class IndexMissingError(Exception):
+    """The query index has not been built yet."""
+
+
+def connect(db_path=INDEX_DB_PATH):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def open_index(db_path=INDEX_DB_PATH):
+    """Open a built index read-only; unlike connect(), never creates an empty database."""
+    if not os.path.exists(db_path):
+        raise IndexMissingError(f"No query index at {db_path}. Run 'maert.py query build' first.")
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'current_maerts'").fetchone() is None:
+        conn.close()
+        raise IndexMissingError(f"{db_path} is not a complete query index. Run 'maert.py query build' first.")
+    return conn
+
+
+def build_index(final_csv=FINAL_CSV_PATH, entities_csv=ENTITIES_CSV_PATH, db_path=INDEX_DB_PATH):
+    """Load final.csv.zip and combined_entities.csv into an indexed SQLite database."""
+    import pandas as pd
+
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = connect(tmp_path)
+    conn.executescript(SCHEMA)
+
+    total = 0
+    for chunk in pd.read_csv(final_csv, dtype=str, chunksize=CHUNK_ROWS):
+        publish_date = pd.to_datetime(chunk['publish_date'], format='%m-%d-%Y', errors='coerce')
+        rows = pd.DataFrame({
+            'rn_number': chunk['rn_number'],
+            'permit_number': chunk['permit_number'],
+            'publish_date': publish_date.dt.strftime('%Y-%m-%d'),
+            'publish_year': publish_date.dt.year.astype('Int64'),
+            'emission_source': chunk['Emission Source'],
+            'source_name': chunk['Source Name'],
+            'pollutant': normalize_pollutants(chunk['Air Contaminant Name']),
+            'pollutant_name': chunk['Air Contaminant Name'],
+            'lbs_hr': parse_rates(chunk[RATE_COLUMNS['lbs_hr']]),
+            'tons_year': parse_rates(chunk[RATE_COLUMNS['tons_year']]),
+            'file_location': chunk['file_location'],
+        })
+        rows.to_sql('maerts', conn, if_exists='append', index=False)
+        total += len(rows)
+        logging.info(f"Loaded {total} MAERT rows")
+
+    if os.path.exists(entities_csv):
+        entities = pd.read_csv(entities_csv, dtype=str)
+        entities = entities.drop_duplicates('rn_number')
+        entities['county'] = entities['county'].str.strip().str.upper()
+        entities['zipcode'] = entities['location'].fillna('').str.findall(ZIP_RE).str[-1]
+        entities[['rn_number', 'regulated_entity_name', 'county', 'zipcode', 'location']].to_sql(
+            'entities', conn, if_exists='append', index=False)
+        logging.info(f"Loaded {len(entities)} regulated entities")
+    else:
+        logging.warning(f"{entities_csv} not found, county and ZIP totals will be empty")
+
+    conn.executescript(INDEXES)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, db_path)
+    logging.info(f"Wrote {db_path}")
+
+
+def _rate_column(rate):
+    if rate not in RATE_SQL_COLUMNS:
+        raise ValueError(f"rate must be one of {sorted(RATE_SQL_COLUMNS)}")
+    return rate
+
+
+def top_emitters(conn, pollutant, n=10, rate='tons_year', county=None):
+    """RNs with the highest current permitted total for a pollutant."""
+    rate = _rate_column(rate)
+    pollutant = canonical_pollutant(pollutant)
+    sql = f"""
+        SELECT m.rn_number, e.regulated_entity_name, e.county, SUM(m.{rate}) AS total
+        FROM current_maerts m LEFT JOIN entities e USING (rn_number)
+        WHERE m.pollutant = ?"""
+    params = [pollutant]
+    if county:
+        sql += " AND e.county = ?"
+        params.append(county.upper())
+    sql += " GROUP BY m.rn_number ORDER BY total DESC LIMIT ?"
+    params.append(n)
+    return [dict(row) for row in conn.execute(sql, params)]
+
+
+def rn_time_series(conn, rn_number, pollutant=None, rate='tons_year'):
+    """Permitted totals per permit version over time for one RN."""
+    rate = _rate_column(rate)
+    sql = f"""
+        SELECT publish_date, permit_number, pollutant, SUM({rate}) AS total
+        FROM maerts WHERE rn_number = ?"""
+    params = [rn_number]
+    if pollutant:
+        sql += " AND pollutant = ?"
+        params.append(canonical_pollutant(pollutant))
+    sql += " GROUP BY publish_date, permit_number, pollutant ORDER BY publish_date, permit_number, pollutant"
+    return [dict(row) for row in conn.execute(sql, params)]
+
+
+def totals_by_area(conn, area, pollutant=None, rate='tons_year', county=None):
+    """Current permitted totals grouped by county or zipcode."""
+    rate = _rate_column(rate)
+    if area not in ('county', 'zipcode'):
+        raise ValueError("area must be 'county' or 'zipcode'")
+    sql = f"""
+        SELECT e.{area} AS {area}, m.pollutant, SUM(m.{rate}) AS total, COUNT(DISTINCT m.rn_number) AS rn_count
+        FROM current_maerts m JOIN entities e USING (rn_number)
+        WHERE 1 = 1"""
+    params = []
+    if pollutant:
+        sql += " AND m.pollutant = ?"
+        params.append(canonical_pollutant(pollutant))
+    if county:
+        sql += " AND e.county = ?"
+        params.append(county.upper())
+    sql += f" GROUP BY e.{area}, m.pollutant ORDER BY total DESC"
+    return [dict(row) for row in conn.execute(sql, params)]
+
+
+def totals_by_county(conn, pollutant=None, rate='tons_year'):
+    return totals_by_area(conn, 'county', pollutant, rate)
+
+
+def totals_by_zip(conn, pollutant=None, rate='tons_year', county=None):
+    return totals_by_area(conn, 'zipcode', pollutant, rate, county)
+
+
+def print_rows(rows):
+    if not rows:
+        print("No results.")
+        return
+    columns = list(rows[0])
+    widths = [max(len(col), *(len(f"{row[col]}") for row in rows)) for col in columns]
+    print('  '.join(col.ljust(w) for col, w in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(f"{row[col]}".ljust(w) for col, w in zip(columns, widths)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query permitted emissions from the extracted MAERTs")
+    parser.add_argument('--db', default=INDEX_DB_PATH)
+    parser.add_argument('--rate', choices=sorted(RATE_SQL_COLUMNS), default='tons_year')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="(Re)build the query index from final.csv.zip and combined_entities.csv")
+    build.add_argument('--final-csv', default=FINAL_CSV_PATH)
+    build.add_argument('--entities-csv', default=ENTITIES_CSV_PATH)
+
+    top = sub.add_parser('top', help="Top emitters of a pollutant")
+    top.add_argument('pollutant')
+    top.add_argument('-n', type=int, default=10)
+    top.add_argument('--county')
+
+    series = sub.add_parser('series', help="Permitted emissions of one RN over time")
+    series.add_argument('rn_number')
+    series.add_argument('--pollutant')
+
+    county = sub.add_parser('county', help="Totals by county")
+    county.add_argument('--pollutant')
+
+    zipcode = sub.add_parser('zip', help="Totals by ZIP code")
+    zipcode.add_argument('--pollutant')
+    zipcode.add_argument('--county')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'build':
+        build_index(args.final_csv, args.entities_csv, args.db)
+    else:
+        try:
+            conn = open_index(args.db)
+        except IndexMissingError as e:
+            sys.exit(str(e))
+        if args.command == 'top':
+            print_rows(top_emitters(conn, args.pollutant, args.n, args.rate, args.county))
+        elif args.command == 'series':
+            print_rows(rn_time_series(conn, args.rn_number, args.pollutant, args.rate))
+        elif args.command == 'county':
+            print_rows(totals_by_county(conn, args.pollutant, args.rate))
+        elif args.command == 'zip':
+            print_rows(totals_by_zip(conn, args.pollutant, args.rate, args.county))
+
+
+# Main entry
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_PATH = os.getenv("MAERT_METRICS_DIR", os.path.join(BASE_DIR, '..', 'data', 'metrics'))
+QUANTILES = (0.5, 0.95)
+# Counters reported per hour of run time next to the raw totals
+RATE_COUNTERS = ('rns processed', 'documents saved')
+
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile; sorted_values must be non-empty
+    index = max(0, min(len(sorted_values) - 1, round(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def _metric_name(name):
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+class Metrics:
+    """Timing spans and counters for one run, shared by all threads.
+
+    Use `with METRICS.span('pdf download'):` around a stage and
+    `METRICS.count('bytes downloaded', n)` for totals. summary() gives
+    p50/p95 per span and throughput; export() writes it as JSON and as a
+    Prometheus textfile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.monotonic()
+            self.started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+            self._spans = {}
+            self._failures = {}
+            self._counters = {}
+
+    def observe(self, name, seconds, ok=True):
+        with self._lock:
+            self._spans.setdefault(name, []).append(seconds)
+            if not ok:
+                self._failures[name] = self._failures.get(name, 0) + 1
+
+    @contextmanager
+    def span(self, name):
+        # A span that exits with an exception is recorded as a failure
+        start = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(name, time.monotonic() - start, ok)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def summary(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            spans = {}
+            for name, values in sorted(self._spans.items()):
+                ordered = sorted(values)
+                spans[name] = {
+                    'count': len(ordered),
+                    'failures': self._failures.get(name, 0),
+                    'total': sum(ordered),
+                    'mean': sum(ordered) / len(ordered),
+                    **{f"p{int(q * 100)}": percentile(ordered, q) for q in QUANTILES},
+                    'max': ordered[-1],
+                }
+            counters = dict(sorted(self._counters.items()))
+        hours = elapsed / 3600 or 1
+        throughput = {f"{name} per hour": counters.get(name, 0) / hours for name in RATE_COUNTERS}
+        throughput['bytes per second'] = counters.get('bytes downloaded', 0) / (elapsed or 1)
+        return {
+            'started_at': self.started_at,
+            'elapsed_seconds': elapsed,
+            'spans': spans,
+            'counters': counters,
+            'throughput': throughput,
+        }
+
+    def log_summary(self):
+        summary = self.summary()
+        for name, span in summary['spans'].items():
+            logging.info(f"{name}: {span['count']} x, p50 {span['p50']:.2f}s, p95 {span['p95']:.2f}s, "
+                         f"max {span['max']:.2f}s, {span['failures']} failed")
+        for name, value in summary['counters'].items():
+            logging.info(f"{name}: {value:g}")
+        for name, value in summary['throughput'].items():
+            logging.info(f"{name}: {value:.1f}")
+
+    def prometheus_text(self, job, summary=None):
+        summary = summary or self.summary()
+        label = f'job="{job}"'
+        lines = [
+            '# HELP maert_span_seconds Duration of each pipeline stage.',
+            '# TYPE maert_span_seconds summary',
+        ]
+        for name, span in summary['spans'].items():
+            labels = f'{label},span="{name}"'
+            for q in QUANTILES:
+                lines.append(f'maert_span_seconds{{{labels},quantile="{q}"}} {span[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'maert_span_seconds_sum{{{labels}}} {span["total"]:.6f}')
+            lines.append(f'maert_span_seconds_count{{{labels}}} {span["count"]}')
+        lines += ['# HELP maert_span_failures_total Stage runs that ended in an error or timeout.',
+                  '# TYPE maert_span_failures_total counter']
+        for name, span in summary['spans'].items():
+            lines.append(f'maert_span_failures_total{{{label},span="{name}"}} {span["failures"]}')
+        for name, value in summary['counters'].items():
+            metric = f"maert_{_metric_name(name)}_total"
+            lines += [f'# TYPE {metric} counter', f'{metric}{{{label}}} {value:g}']
+        for name, value in summary['throughput'].items():
+            metric = f"maert_{_metric_name(name)}"
+            lines += [f'# TYPE {metric} gauge', f'{metric}{{{label}}} {value:.6f}']
+        lines += ['# TYPE maert_run_elapsed_seconds gauge',
+                  f'maert_run_elapsed_seconds{{{label}}} {summary["elapsed_seconds"]:.3f}']
+        return '\n'.join(lines) + '\n'
+
+    def export(self, job, json_path=None, prom_path=None):
+        """Write the run summary as JSON and/or a Prometheus textfile (node_exporter textfile collector)."""
+        summary = self.summary()
+        summary['job'] = job
+        for path, text in ((json_path, lambda: json.dumps(summary, indent=2)),
+                           (prom_path, lambda: self.prometheus_text(job, summary))):
+            if not path:
+                continue
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # The textfile collector may read at any time, so never leave a half-written file
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text())
+            os.replace(tmp_path, path)
+            logging.info(f"Wrote run metrics to {path}")
+        return summary
+
+
+METRICS = Metrics()
+
+
+def default_json_path(job):
+    return os.path.join(METRICS_PATH, f"{job}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
@@ -0,0 +1,93 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# Constants
+# Canonical pollutant code: spellings seen in MAERTs, compared after alias_key() folding
+POLLUTANT_ALIASES = {
+    'NOx': ['NOx', 'NO x', 'Nitrogen Oxides', 'Oxides of Nitrogen', 'Total Oxides of Nitrogen', 'NOx (as NO2)'],
+    'CO': ['CO', 'Carbon Monoxide'],
+    'SO2': ['SO2', 'Sulfur Dioxide', 'Sulphur Dioxide'],
+    'PM': ['PM', 'Particulate Matter', 'Total Particulate Matter', 'TSP'],
+    'PM10': ['PM10', 'PM-10', 'Particulate Matter (PM10)'],
+    'PM2.5': ['PM2.5', 'PM25', 'PM-2.5', 'Particulate Matter (PM2.5)'],
+    'VOC': ['VOC', 'VOCs', 'Volatile Organic Compounds', 'Volatile Organic Compound'],
+    'H2S': ['H2S', 'Hydrogen Sulfide', 'Hydrogen Sulphide'],
+    'NH3': ['NH3', 'Ammonia'],
+    'HCl': ['HCl', 'Hydrogen Chloride', 'Hydrochloric Acid'],
+    'Pb': ['Pb', 'Lead'],
+    'CO2': ['CO2', 'Carbon Dioxide'],
+    'CH4': ['CH4', 'Methane'],
+    'HAPs': ['HAP', 'HAPs', 'Hazardous Air Pollutants', 'Total HAPs'],
+}
+TAG_RE = re.compile(r'<[^>]+>')
+# Footnote marks: superscripts, "(4)", "(12)", "(a)", "*" or "**" trailing the name; "(CO)" is a code, not a mark
+FOOTNOTE_RE = re.compile(r'<sup>.*?</sup>|(?:\s*\((?:\d+|[a-z])\)|\s*\*+)+\s*$', re.IGNORECASE)
+# "Carbon Monoxide (CO)": a name followed by its code
+NAME_CODE_RE = re.compile(r'^(.*?)\s*\(([^()]+)\)$')
+NON_KEY_RE = re.compile(r'[^a-z0-9.]+|(?<!\d)\.|\.(?!\d)')
+# Footnote marks in a rate cell, before or after the number: "(4) 0.5", "1,234.5 (a)". Longer ones such as
+# "(10)" are left in, so the cell holds two numbers and is not guessed at
+RATE_FOOTNOTE_RE = r'\([0-9a-zA-Z]\)'
+# A number with thousands separators in groups of three, or a plain or scientific one
+RATE_NUMBER_RE = r'\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d*\.?\d+(?:[eE][+-]?\d+)?'
+
+
+def clean_name(name):
+    """Display form of a pollutant name: tags and footnote marks dropped, whitespace collapsed."""
+    name = FOOTNOTE_RE.sub('', unicodedata.normalize('NFKC', str(name)))
+    return ' '.join(TAG_RE.sub('', name).split())
+
+
+def alias_key(name):
+    # NFKC turns subscript digits into plain ones, so "SO₂", "SO<sub>2</sub>" and "so 2" meet at "so2"
+    return NON_KEY_RE.sub('', clean_name(name).lower())
+
+
+ALIAS_INDEX = {alias_key(alias): code for code, aliases in POLLUTANT_ALIASES.items() for alias in [code, *aliases]}
+
+
+@lru_cache(maxsize=None)
+def canonical_pollutant(name):
+    """Canonical code for a pollutant name, e.g. 'NO<sub>x</sub>' -> 'NOx'.
+
+    A name followed by its code in parentheses, e.g. 'Lead (Pb)', is looked
+    up by the code and then by the name. Names with no known alias come back
+    in their cleaned display form. Results are cached, so each distinct
+    spelling is only worked out once.
+    """
+    if name is None or name != name:
+        return None
+    code = ALIAS_INDEX.get(alias_key(name))
+    if code is None and (match := NAME_CODE_RE.match(clean_name(name))):
+        code = ALIAS_INDEX.get(alias_key(match.group(2))) or ALIAS_INDEX.get(alias_key(match.group(1)))
+    return code or clean_name(name) or None
+
+
+def normalize_pollutants(values):
+    """Canonical codes for a Series of pollutant names, resolving each distinct name once."""
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    canonical = pd.array([canonical_pollutant(name) for name in uniques] + [None], dtype='string')
+    # factorize marks missing values as -1, which picks the trailing None
+    return pd.Series(canonical.take(codes), index=values.index, dtype='string')
+
+
+def parse_rates(values):
+    """Emission rates as floats from a Series of MAERT text.
+
+    Footnote marks such as "(4)" are dropped and the one number left is
+    taken, so "<0.01" is 0.01 and "1,234.5 (a)" is 1234.5. Cells with no
+    number ("-", "N/A") or with more than one ("1.2/3.4", "1,2") become NaN
+    rather than a guess; the text as written is kept next to the rates.
+    Each distinct value is only parsed once.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    numbers = pd.Series(uniques, dtype='string').str.replace(RATE_FOOTNOTE_RE, '', regex=True).str.findall(RATE_NUMBER_RE)
+    single = numbers.str[0].where(numbers.str.len() == 1).astype('string').str.replace(',', '', regex=False)
+    parsed = pd.to_numeric(single, errors='coerce').astype('float64').tolist() + [float('nan')]
+    return pd.Series(np.take(parsed, codes), index=values.index, dtype='float64')
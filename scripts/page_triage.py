@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import logging
+import argparse
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.getenv("MAERT_EXTRACT_CACHE", os.path.join(BASE_DIR, '..', 'data', 'extract_cache'))
+# Bump whenever scoring or classification changes so stored triage results are recomputed
+TRIAGE_VERSION = '2'
+
+EASY = 'easy'
+TRICKY = 'tricky'
+UNKNOWN = 'unknown'
+
+TITLE_RE = re.compile(r'maximum\s+allowable\s+emission\s+rates?', re.I)
+HEADER_RES = [
+    re.compile(r'emission\s+point\s+no', re.I),
+    re.compile(r'source\s+name', re.I),
+    re.compile(r'air\s+contaminant\s+name', re.I),
+    re.compile(r'lbs?\s*/\s*(?:hour|hr)', re.I),
+    re.compile(r'tons?\s*/\s*(?:year|yr)|\btpy\b', re.I),
+]
+# A table row ends in two emission rates, e.g. "NOx 1.50 6.57" or "VOC <0.01 0.02"
+RATE_LINE_RE = re.compile(r'(?:<\s*)?\d[\d,]*\.?\d*\s+(?:<\s*)?\d[\d,]*\.?\d*\s*$', re.M)
+# Fewer characters than this on every page means there is no usable text layer
+MIN_TEXT_CHARS = 50
+# Title plus one header, or two headers and a few rate rows, make a page a candidate
+CANDIDATE_SCORE = 4
+
+
+def triage_file(sha256, cache_path=CACHE_PATH):
+    return os.path.join(cache_path, f"triage_v{TRIAGE_VERSION}", sha256[:2], f"{sha256}.json")
+
+
+def score_page(text):
+    """Score one page's text: title and column headers weigh most, rate-like lines add a little."""
+    header_hits = sum(1 for pattern in HEADER_RES if pattern.search(text))
+    rate_lines = len(RATE_LINE_RE.findall(text))
+    score = header_hits * 2 + (3 if TITLE_RE.search(text) else 0) + min(rate_lines, 10) * 0.2
+    return score, header_hits, rate_lines
+
+
+def triage_pdf(pdf_path):
+    """Rank the pages of a PDF by how likely they hold the MAERT and classify the document.
+
+    easy: a page has most of the column headers in its text layer
+    tricky: some MAERT signals, but no page with a clean header row
+    unknown: no text layer (scanned) or nothing that looks like a MAERT
+    """
+    from PyPDF2 import PdfReader
+
+    with open(pdf_path, 'rb') as f:
+        reader = PdfReader(f)
+        texts = []
+        for page in reader.pages:
+            try:
+                texts.append(page.extract_text() or '')
+            except Exception:
+                texts.append('')
+
+    pages = []
+    for number, text in enumerate(texts, 1):
+        score, header_hits, rate_lines = score_page(text)
+        pages.append({'page': number, 'score': score, 'header_hits': header_hits, 'rate_lines': rate_lines})
+
+    has_text = any(len(text.strip()) >= MIN_TEXT_CHARS for text in texts)
+    best_headers = max((p['header_hits'] for p in pages), default=0)
+    if not has_text:
+        classification = UNKNOWN
+    elif best_headers >= 4:
+        classification = EASY
+    elif best_headers >= 2 or any(TITLE_RE.search(text) for text in texts):
+        classification = TRICKY
+    else:
+        classification = UNKNOWN
+
+    candidates = []
+    if classification != UNKNOWN:
+        for p in pages:
+            if p['score'] >= CANDIDATE_SCORE:
+                candidates.append(p['page'])
+            # Tables carry over onto following pages that only repeat rate rows
+            elif candidates and candidates[-1] == p['page'] - 1 and p['rate_lines']:
+                candidates.append(p['page'])
+
+    return {
+        'version': TRIAGE_VERSION,
+        'classification': classification,
+        'has_text': has_text,
+        'page_count': len(pages),
+        'candidate_pages': candidates,
+        'ranked_pages': [p['page'] for p in sorted(pages, key=lambda p: -p['score']) if p['score'] > 0],
+    }
+
+
+def load_or_triage(pdf_path, sha256, cache_path=CACHE_PATH):
+    """Triage a document once; later calls read the stored result."""
+    path = triage_file(sha256, cache_path)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    result = triage_pdf(pdf_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank PDF pages by how likely they contain a MAERT table")
+    parser.add_argument('pdfs', nargs='+')
+    args = parser.parse_args(argv)
+    for pdf_path in args.pdfs:
+        result = triage_pdf(pdf_path)
+        print(f"{pdf_path}: {result['classification']}, candidate pages {result['candidate_pages']} of {result['page_count']}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
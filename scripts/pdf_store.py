@@ -0,0 +1,117 @@
+import os
+import glob
+import hashlib
+import logging
+import argparse
+
+from state_store import open_store
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PDF_PATH = os.path.join(BASE_DIR, '..', 'data', 'pdfs')
+OBJECTS_PATH = os.path.join(BASE_DIR, '..', 'data', 'pdf_objects')
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def object_path(sha256, objects_path=OBJECTS_PATH):
+    return os.path.join(objects_path, sha256[:2], f"{sha256}.pdf")
+
+
+def link_to_object(obj_path, named_path):
+    # Hard links keep data/pdfs browsable at no extra disk cost; fall back to a
+    # relative symlink where hard links are not possible (e.g. across devices)
+    tmp_path = named_path + '.link'
+    try:
+        os.link(obj_path, tmp_path)
+    except OSError:
+        os.symlink(os.path.relpath(obj_path, os.path.dirname(named_path)), tmp_path)
+    os.replace(tmp_path, named_path)
+
+
+class PdfStore:
+    """Content-addressed PDF storage keyed by SHA-256.
+
+    Each distinct PDF is kept once under data/pdf_objects/<aa>/<sha256>.pdf.
+    The usual `{rn}_{permit}_{date}_{id}.pdf` names in data/pdfs are links to
+    those objects, and the state store's documents table maps each
+    (rn, permit_number, publish_date) to its hash.
+    """
+
+    def __init__(self, state_store, objects_path=OBJECTS_PATH):
+        self.state_store = state_store
+        self.objects_path = objects_path
+
+    def add(self, named_path, sha256=None):
+        """Move a freshly saved PDF into the object store and leave a link at `named_path`.
+
+        Returns (sha256, is_duplicate).
+        """
+        sha256 = sha256 or file_sha256(named_path)
+        obj_path = object_path(sha256, self.objects_path)
+        size = os.path.getsize(named_path)
+        if os.path.exists(obj_path):
+            # A named path that already points at the object was stored before
+            is_duplicate = not os.path.samefile(obj_path, named_path)
+            if is_duplicate:
+                link_to_object(obj_path, named_path)
+        else:
+            os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+            os.replace(named_path, obj_path)
+            link_to_object(obj_path, named_path)
+            is_duplicate = False
+        self.state_store.add_blob(sha256, size)
+        return sha256, is_duplicate
+
+    def path_for(self, sha256):
+        return object_path(sha256, self.objects_path)
+
+
+def migrate(pdf_path=PDF_PATH, objects_path=OBJECTS_PATH, state_store=None):
+    """Move an existing data/pdfs directory into the object store, linking duplicates."""
+    state_store = state_store or open_store()
+    pdf_store = PdfStore(state_store, objects_path)
+    files = sorted(glob.glob(os.path.join(pdf_path, '*.pdf')))
+    logging.info(f"Migrating {len(files)} PDFs from {pdf_path}")
+
+    duplicates = 0
+    saved_bytes = 0
+    for i, path in enumerate(files, 1):
+        file_name = os.path.basename(path)
+        size = os.path.getsize(path)
+        sha256, is_duplicate = pdf_store.add(path)
+        if is_duplicate:
+            duplicates += 1
+            saved_bytes += size
+        try:
+            state_store.record_file(file_name, sha256)
+        except ValueError:
+            logging.warning(f"Stored {file_name} without a manifest entry: name does not follow the RN_permit_date_id pattern")
+        if i % 1000 == 0:
+            logging.info(f"[{i}/{len(files)}] {duplicates} duplicates so far")
+
+    logging.info(f"Done: {len(files)} PDFs stored, {duplicates} duplicates linked, {saved_bytes / 1e6:.1f} MB reclaimed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Content-addressed storage for MAERT PDFs")
+    sub = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = sub.add_parser('migrate', help="Hash and deduplicate an existing data/pdfs directory")
+    migrate_parser.add_argument('--pdf-dir', default=PDF_PATH)
+    migrate_parser.add_argument('--objects-dir', default=OBJECTS_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        migrate(args.pdf_dir, args.objects_dir)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
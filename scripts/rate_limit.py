@@ -0,0 +1,42 @@
+import time
+import asyncio
+import threading
+
+from resilience import BREAKER
+
+
+class RateLimiter:
+    """Spaces out requests so that all workers together stay under `rate` per second.
+
+    Requests also hold while `breaker` is open, so every worker backs off together.
+    Threads call wait(); coroutines call wait_async() and share the same slots.
+    """
+
+    def __init__(self, rate, breaker=BREAKER):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+        self.breaker = breaker
+
+    def reserve(self):
+        """Claim the next request slot. Returns the seconds to wait for it."""
+        if not self.interval:
+            return 0.0
+        with self.lock:
+            slot = max(self.next_slot, time.monotonic())
+            self.next_slot = slot + self.interval
+        return slot - time.monotonic()
+
+    def wait(self):
+        if self.breaker is not None:
+            self.breaker.wait()
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        if self.breaker is not None:
+            await self.breaker.wait_async()
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
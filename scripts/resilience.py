@@ -0,0 +1,252 @@
+import time
+import queue
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+
+from metrics import METRICS
+
+# Constants
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+# Status codes that mean the site wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+# Circuit breaker: open when this share of the last BREAKER_WINDOW site calls failed
+BREAKER_THRESHOLD = 0.5
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 5
+BREAKER_COOLDOWN = 30.0
+BREAKER_MAX_COOLDOWN = 600.0
+
+
+class ScrapeError(Exception):
+    """Base of the error classes every scraper reports failures as.
+
+    `retryable` and `max_attempts` decide whether and how often an item is
+    tried again; `site_failure` marks errors that say the site is in trouble
+    and count towards the circuit breaker.
+    """
+    label = 'error'
+    retryable = True
+    max_attempts = 3
+    site_failure = False
+
+
+class TransientError(ScrapeError):
+    """Network blips, timeouts, 5xx responses and browser crashes; usually fine on a later try."""
+    label = 'transient'
+    max_attempts = 4
+    site_failure = True
+
+
+class ThrottledError(ScrapeError):
+    """The site is rate limiting or overloaded (429/503); back off harder than for transient errors."""
+    label = 'throttled'
+    max_attempts = 6
+    site_failure = True
+
+
+class LayoutError(ScrapeError):
+    """An expected element or table is missing. Tried once more in case the page was half loaded."""
+    label = 'layout'
+    max_attempts = 2
+
+
+def classify(exc):
+    """Map any exception to the ScrapeError class it should be handled as."""
+    if isinstance(exc, ScrapeError):
+        return type(exc)
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+    if httpx is not None:
+        if isinstance(exc, httpx.HTTPStatusError):
+            status = exc.response.status_code
+            if status in THROTTLE_STATUSES:
+                return ThrottledError
+            # A 4xx other than throttling means a link or form the scraper relies on has changed
+            return TransientError if status >= 500 else LayoutError
+        if isinstance(exc, httpx.TransportError):
+            return TransientError
+    try:
+        from selenium.common import exceptions as selenium_errors
+    except ImportError:
+        selenium_errors = None
+    if selenium_errors is not None:
+        if isinstance(exc, (selenium_errors.NoSuchElementException, selenium_errors.UnexpectedTagNameException)):
+            return LayoutError
+        if isinstance(exc, selenium_errors.WebDriverException):
+            return TransientError
+    if isinstance(exc, (TimeoutError, ConnectionError, OSError, asyncio.TimeoutError)):
+        return TransientError
+    if isinstance(exc, (ValueError, KeyError, IndexError)):
+        # Parsing something that is not shaped as expected
+        return LayoutError
+    return TransientError
+
+
+def backoff_delay(attempt, error_class=TransientError, base=BASE_DELAY, cap=MAX_DELAY):
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    if error_class is ThrottledError:
+        base *= 4
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Pauses every worker at once when most recent calls to the site fail.
+
+    Workers report each site call with record(); wait() blocks while the
+    breaker is open. Each time it opens again without a success in between,
+    the pause doubles, up to BREAKER_MAX_COOLDOWN. Throttling responses count
+    double; layout errors are answers from a working site and are ignored.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 cooldown=BREAKER_COOLDOWN, max_cooldown=BREAKER_MAX_COOLDOWN):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, error_class=None):
+        """Report one site call: None for a success, else the classified error."""
+        with self._lock:
+            now = time.monotonic()
+            if error_class is None:
+                self._outcomes.append(False)
+                if now >= self.open_until:
+                    self.cooldown = self.base_cooldown
+                return
+            if not error_class.site_failure:
+                return
+            # The site asking us to slow down weighs as two failures
+            for _ in range(2 if error_class is ThrottledError else 1):
+                self._outcomes.append(True)
+            failures = sum(self._outcomes)
+            tripped = len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.threshold
+            if tripped and now >= self.open_until:
+                self.open_until = now + self.cooldown
+                logging.warning(f"Circuit open after {failures} failures in the last {len(self._outcomes)} calls "
+                                f"({error_class.label}), pausing all workers for {self.cooldown:.0f}s")
+                METRICS.count('circuit opens')
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self._outcomes.clear()
+
+    def delay(self):
+        return max(0.0, self.open_until - time.monotonic())
+
+    def wait(self):
+        while (delay := self.delay()) > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        while (delay := self.delay()) > 0:
+            await asyncio.sleep(delay)
+
+
+BREAKER = CircuitBreaker()
+
+
+def _retry_or_raise(name, attempt, error_class, error, breaker):
+    breaker.record(error_class)
+    METRICS.count(f"{error_class.label} errors")
+    if not error_class.retryable or attempt + 1 >= error_class.max_attempts:
+        return None
+    delay = backoff_delay(attempt, error_class)
+    METRICS.count('retries')
+    logging.warning(f"{name} failed ({error_class.label}), retry {attempt + 1} of "
+                    f"{error_class.max_attempts - 1} in {delay:.1f}s: {error}")
+    return delay
+
+
+def retry_call(fn, name, breaker=BREAKER, deferred=()):
+    """Call fn() until it succeeds or its error class runs out of attempts, backing off in between.
+
+    The last error is re-raised as is; classify() it to decide what to do next.
+    Errors of a class in `deferred` are raised on the first failure without
+    being recorded, for the caller's RetryQueue.requeue() to back off and
+    record them, so they are not retried at two levels.
+    """
+    attempt = 0
+    while True:
+        breaker.wait()
+        try:
+            result = fn()
+        except Exception as e:
+            error_class = classify(e)
+            if issubclass(error_class, deferred):
+                raise
+            delay = _retry_or_raise(name, attempt, error_class, e, breaker)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+        else:
+            breaker.record(None)
+            return result
+
+
+async def retry_async(fn, name, breaker=BREAKER):
+    """Async counterpart of retry_call; fn() must return a new awaitable on each call."""
+    attempt = 0
+    while True:
+        await breaker.wait_async()
+        try:
+            result = await fn()
+        except Exception as e:
+            delay = _retry_or_raise(name, attempt, classify(e), e, breaker)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+        else:
+            breaker.record(None)
+            return result
+
+
+class RetryQueue(queue.Queue):
+    """Work queue for worker threads that puts failed items back with a backoff delay.
+
+    Entries are (item, attempt, not before). take() returns (item, attempt)
+    or None for the stop marker; requeue() must be called before the failed
+    entry's task_done() so that join() keeps waiting for the retry.
+    """
+
+    def add(self, item):
+        self.put((item, 0, 0.0))
+
+    def take(self):
+        entry = self.get()
+        if entry is None:
+            return None
+        item, attempt, not_before = entry
+        # Retries go to the back of the queue, so this is usually already past
+        delay = not_before - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return item, attempt
+
+    def requeue(self, item, attempt, error, breaker=BREAKER):
+        """Put `item` back if its error allows another attempt. Returns whether it was requeued."""
+        error_class = classify(error)
+        breaker.record(error_class)
+        METRICS.count(f"{error_class.label} errors")
+        if not error_class.retryable or attempt + 1 >= error_class.max_attempts:
+            return False
+        delay = backoff_delay(attempt, error_class)
+        self.put((item, attempt + 1, time.monotonic() + delay))
+        METRICS.count('requeued')
+        logging.info(f"Requeued {item} after a {error_class.label} error (attempt {attempt + 2} of "
+                     f"{error_class.max_attempts}, in {delay:.1f}s)")
+        return True
+
+    def stop(self, workers):
+        for _ in range(workers):
+            self.put(None)
@@ -0,0 +1,87 @@
+import os
+import csv
+
+from lxml import html as lxml_html
+
+# Constants
+# The entity search results are the first table on the page, as pd.read_html(...)[0] used to pick
+RESULTS_TABLE_XPATH = '(//table)[1]'
+
+
+def _cell_text(cell):
+    return ' '.join(cell.text_content().split())
+
+
+def parse_table(table_html):
+    """Return (columns, rows) of one HTML table, with cell text whitespace-normalized.
+
+    Column names come from the <th> row, or the first row when there is none.
+    """
+    table = lxml_html.fragment_fromstring(table_html, create_parent=False)
+    if table.tag != 'table':
+        table = table.xpath('.//table')[0]
+    trs = table.xpath('./tr|./thead/tr|./tbody/tr|./tfoot/tr')
+    header = next((tr for tr in trs if tr.xpath('./th')), None)
+    if header is None and trs:
+        header = trs[0]
+    columns = [_cell_text(c) for c in header.xpath('./th|./td')] if header is not None else []
+    rows = [
+        [_cell_text(c) for c in tr.xpath('./td')]
+        for tr in trs if tr is not header and tr.xpath('./td')
+    ]
+    return columns, rows
+
+
+def results_table_html(driver):
+    # Only the table's markup crosses the driver connection, not the whole page source
+    from selenium.webdriver.common.by import By
+
+    return driver.find_element(By.XPATH, RESULTS_TABLE_XPATH).get_attribute('outerHTML')
+
+
+class ResultsWriter:
+    """Append the rows of each results page to a CSV as the page arrives.
+
+    Rows go to `path`.tmp and the file is moved into place on a clean exit,
+    so an interrupted scrape never leaves a partial CSV behind. `extra` adds
+    constant columns (such as the searched ZIP code) to every row.
+    """
+
+    def __init__(self, path, extra=None):
+        self.path = path
+        self.extra = extra or {}
+        self.columns = None
+        self.rows = 0
+        self.pages = 0
+        self._tmp_path = f"{path}.tmp"
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        self._file = open(self._tmp_path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is None and self.columns is not None:
+            os.replace(self._tmp_path, self.path)
+        else:
+            os.remove(self._tmp_path)
+        return False
+
+    def write_rows(self, columns, rows):
+        if self.columns is None:
+            self.columns = columns
+            self._writer.writerow(columns + list(self.extra))
+        width = len(self.columns)
+        extra = list(self.extra.values())
+        for row in rows:
+            self._writer.writerow((row + [''] * width)[:width] + extra)
+        self.rows += len(rows)
+        self.pages += 1
+        return len(rows)
+
+    def write_page(self, table_html):
+        """Parse one page's results table and append its rows. Returns the number of rows added."""
+        return self.write_rows(*parse_table(table_html))
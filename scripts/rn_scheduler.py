@@ -0,0 +1,67 @@
+import random
+import logging
+
+from state_store import DONE
+
+# Share of due known-empty RNs searched on each refresh; the rest wait for a later refresh
+DEFAULT_EMPTY_SAMPLE = 0.25
+
+
+def prior_hit_rate(history):
+    """Laplace-smoothed share of finished RNs that had at least one MAERT."""
+    checked = [entry for entry in history.values() if entry['status'] == DONE]
+    hits = sum(1 for entry in checked if entry['document_count'])
+    return (hits + 1) / (len(checked) + 2)
+
+
+def is_known_empty(entry):
+    # Searched to completion at least once and never turned up a document
+    return entry is not None and entry['status'] == DONE and not entry['document_count'] and not entry['change_count']
+
+
+def expected_yield(entry, prior):
+    """Rough chance that searching this RN now saves a new document.
+
+    RNs that had a MAERT score above `prior`, known-empty ones below it, each
+    scaled by how often their past checks found something new.
+    """
+    if entry is None:
+        return prior
+    if entry['status'] != DONE:
+        # Interrupted or failed RNs that already saved documents have more waiting
+        return 1.0 if entry['document_count'] else prior
+    change_rate = (entry['change_count'] + 1) / (entry['check_count'] + 2)
+    if entry['document_count']:
+        return prior + (1 - prior) * change_rate
+    return prior * change_rate
+
+
+def schedule(rn_numbers, store, empty_sample=DEFAULT_EMPTY_SAMPLE, seed=None):
+    """Order RNs by expected yield, highest first, and sample the known-empty ones.
+
+    RNs with documents still waiting come first, then finished RNs that had
+    a MAERT, then RNs never searched (at the overall hit rate), then the
+    known-empty ones; finished RNs rank by how often past checks found
+    something new. Only `empty_sample` of the RNs that never had a
+    document are kept, so a refresh spends little time on them while still
+    noticing when one gets its first permit. Ties keep the input order.
+    """
+    history = store.rn_history()
+    prior = prior_hit_rate(history)
+    rng = random.Random(seed)
+    scored = []
+    deferred = 0
+    for i, rn in enumerate(rn_numbers):
+        entry = history.get(rn)
+        if is_known_empty(entry) and rng.random() >= empty_sample:
+            deferred += 1
+            continue
+        scored.append((-expected_yield(entry, prior), i, rn))
+    scored.sort()
+
+    resumed = sum(1 for score, _, _ in scored if score == -1.0)
+    first_visits = sum(1 for _, _, rn in scored if rn not in history)
+    logging.info(f"Scheduled {len(scored)} RNs by expected yield: {resumed} with documents waiting, "
+                 f"{first_visits} never searched (prior hit rate {prior:.1%}), "
+                 f"{len(scored) - resumed - first_visits} revisits; {deferred} known-empty RNs deferred")
+    return [rn for _, _, rn in scored]
@@ -0,0 +1,457 @@
+import os
+import csv
+import sqlite3
+import logging
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from datetime import datetime, timedelta, timezone
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DB_PATH = os.getenv("MAERT_STATE_DB", os.path.join(BASE_DIR, 'maert_state.sqlite'))
+LEGACY_DOWNLOAD_LOGS_PATH = os.path.join(BASE_DIR, 'download_logs.csv')
+LEGACY_DOWNLOAD_COUNTS_PATH = os.path.join(BASE_DIR, 'download_counts.csv')
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+FAILED = 'failed'
+STATUSES = (PENDING, IN_PROGRESS, DONE, FAILED)
+
+# Refresh scheduling: an RN whose searches always turn up new documents is
+# revisited every MIN_REVISIT_DAYS, one that never changes backs off to MAX_REVISIT_DAYS
+MIN_REVISIT_DAYS = 7
+MAX_REVISIT_DAYS = 180
+# Query parameters that name a document in the records system, whichever page or engine linked to it
+DOC_ID_PARAMS = ('dID', 'dDocName')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rns (
+    rn_number TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    document_count INTEGER,
+    error TEXT,
+    started_at TEXT,
+    updated_at TEXT,
+    last_checked_at TEXT,
+    check_count INTEGER NOT NULL DEFAULT 0,
+    change_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS rns_status ON rns (status);
+
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    rn_number TEXT NOT NULL,
+    permit_number TEXT NOT NULL,
+    publish_date TEXT NOT NULL,
+    doc_ref TEXT NOT NULL,
+    file_name TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    UNIQUE (rn_number, permit_number, publish_date, doc_ref)
+);
+CREATE INDEX IF NOT EXISTS documents_status ON documents (status);
+
+CREATE TABLE IF NOT EXISTS queries (
+    kind TEXT NOT NULL,
+    query TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    record_count INTEGER,
+    expected_count INTEGER,
+    error TEXT,
+    started_at TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (kind, query)
+);
+CREATE INDEX IF NOT EXISTS queries_status ON queries (kind, status);
+
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at TEXT
+);
+"""
+
+# Columns added after the first release of the schema, applied to older databases on open
+ADDED_COLUMNS = {
+    'rns': [
+        ('last_checked_at', 'TEXT'),
+        ('check_count', 'INTEGER NOT NULL DEFAULT 0'),
+        ('change_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ],
+    'documents': [
+        ('sha256', 'TEXT'),
+    ],
+    'queries': [
+        ('expected_count', 'INTEGER'),
+    ],
+}
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS documents_sha256 ON documents (sha256)',
+    # record_file() looks documents up by name once per PDF when migrating data/pdfs
+    'CREATE INDEX IF NOT EXISTS documents_file_name ON documents (file_name)',
+]
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def parse_pdf_name(file_name):
+    """Split `{rn}_{permit}_{date}_{unique_id}.pdf` into (rn, permit_number, publish_date).
+
+    Permit numbers may contain underscores, so the date and id are split off the right.
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    rn, _, rest = stem.partition('_')
+    parts = rest.rsplit('_', 2)
+    if not rn.startswith('RN') or len(parts) != 3 or not all(parts):
+        raise ValueError(f"Unrecognized PDF name: {file_name}")
+    return rn, parts[0], parts[1]
+
+
+def document_ref(url, link_text=''):
+    """The doc_ref a search result is stored under, the same for the HTTP and Selenium engines.
+
+    This is the document id from the download URL when it has one, else the
+    URL without its scheme and host, and only without a URL the link text.
+    """
+    if not url:
+        return link_text
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    for name in DOC_ID_PARAMS:
+        if query.get(name):
+            return f"{name}={query[name][0]}"
+    return parts.path + (f"?{parts.query}" if parts.query else '')
+
+
+def revisit_interval(check_count, change_count):
+    # Smoothed share of past checks that found new documents
+    change_rate = (change_count + 1) / (check_count + 2)
+    days = min(MAX_REVISIT_DAYS, max(MIN_REVISIT_DAYS, MIN_REVISIT_DAYS / change_rate))
+    return timedelta(days=days)
+
+
+class StateStore:
+    """Job state for the scrapers, kept in one WAL-mode SQLite database.
+
+    `rns` and `documents` track MAERT downloads per RN and per document,
+    `queries` tracks county/ZIP searches of the entity scrapers. Every
+    thread gets its own connection, so one store can be shared by workers.
+    """
+
+    def __init__(self, path=STATE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+                for name, definition in columns:
+                    if name not in existing:
+                        conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+            for statement in INDEXES:
+                conn.execute(statement)
+            # Documents found by the HTTP engine used to be keyed by their full URL
+            for row in conn.execute("SELECT id, doc_ref FROM documents WHERE doc_ref LIKE 'http%'").fetchall():
+                conn.execute('UPDATE OR IGNORE documents SET doc_ref = ? WHERE id = ?', (document_ref(row['doc_ref']), row['id']))
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # RNs
+
+    def start_rn(self, rn):
+        now = utc_now()
+        with self.connection() as conn:
+            conn.execute(
+                """INSERT INTO rns (rn_number, status, attempts, started_at, updated_at)
+                   VALUES (?, ?, 1, ?, ?)
+                   ON CONFLICT (rn_number) DO UPDATE SET
+                       status = excluded.status, attempts = attempts + 1, error = NULL,
+                       started_at = excluded.started_at, updated_at = excluded.updated_at""",
+                (rn, IN_PROGRESS, now, now),
+            )
+
+    def finish_rn(self, rn, status=DONE, error=None, new_documents=None):
+        """Close out an RN. `new_documents` is how many documents this visit saved.
+
+        document_count is recomputed from the documents table. A done RN also
+        counts as a completed check for refresh scheduling.
+        """
+        now = utc_now()
+        with self.connection() as conn:
+            conn.execute(
+                """UPDATE rns SET status = ?, error = ?, updated_at = ?,
+                       document_count = (SELECT COUNT(*) FROM documents
+                                         WHERE documents.rn_number = rns.rn_number AND documents.status = 'done')
+                   WHERE rn_number = ?""",
+                (status, error, now, rn),
+            )
+            if status == DONE:
+                conn.execute(
+                    """UPDATE rns SET last_checked_at = ?, check_count = check_count + 1, change_count = change_count + ?
+                       WHERE rn_number = ?""",
+                    (now, 1 if new_documents else 0, rn),
+                )
+
+    def rn_status(self, rn):
+        row = self.connection().execute('SELECT status FROM rns WHERE rn_number = ?', (rn,)).fetchone()
+        return row['status'] if row else None
+
+    def rns_with_status(self, *statuses):
+        placeholders = ', '.join('?' for _ in statuses)
+        rows = self.connection().execute(f'SELECT rn_number FROM rns WHERE status IN ({placeholders})', statuses)
+        return {row['rn_number'] for row in rows}
+
+    def rns_not_due(self, now=None):
+        """Done RNs whose next refresh, based on how often they changed before, is still ahead."""
+        now = now or datetime.now(timezone.utc)
+        rows = self.connection().execute(
+            """SELECT rn_number, COALESCE(last_checked_at, updated_at) AS checked_at, check_count, change_count
+               FROM rns WHERE status = 'done'"""
+        )
+        not_due = set()
+        for row in rows:
+            if not row['checked_at']:
+                continue
+            checked_at = datetime.fromisoformat(row['checked_at'])
+            if checked_at + revisit_interval(row['check_count'], row['change_count']) > now:
+                not_due.add(row['rn_number'])
+        return not_due
+
+    def rn_history(self):
+        """Past outcome of every known RN: status, documents saved so far and check/change counts."""
+        rows = self.connection().execute(
+            # Counts imported from download_counts.csv may have no documents behind them
+            """SELECT rn_number, status, check_count, change_count,
+                      MAX(COALESCE(document_count, 0),
+                          (SELECT COUNT(*) FROM documents
+                           WHERE documents.rn_number = rns.rn_number AND documents.status = 'done')) AS document_count
+               FROM rns"""
+        )
+        return {row['rn_number']: dict(row) for row in rows}
+
+    # Documents
+
+    def start_document(self, rn, permit_number, publish_date, doc_ref):
+        """Mark a document in progress. Returns its id, or None if it is already done.
+
+        Rows imported from download_logs.csv have an empty doc_ref and stand in
+        for any document with the same RN, permit number and publish date.
+        """
+        now = utc_now()
+        with self.connection() as conn:
+            legacy = conn.execute(
+                """SELECT 1 FROM documents
+                   WHERE rn_number = ? AND permit_number = ? AND publish_date = ? AND doc_ref = '' AND status = 'done'""",
+                (rn, permit_number, publish_date),
+            ).fetchone()
+            if legacy:
+                return None
+            row = conn.execute(
+                """INSERT INTO documents (rn_number, permit_number, publish_date, doc_ref, status, attempts, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+                   ON CONFLICT (rn_number, permit_number, publish_date, doc_ref) DO UPDATE SET
+                       status = excluded.status, attempts = attempts + 1, error = NULL, updated_at = excluded.updated_at
+                   WHERE documents.status != 'done'
+                   RETURNING id""",
+                (rn, permit_number, publish_date, doc_ref, IN_PROGRESS, now, now),
+            ).fetchone()
+        return row['id'] if row else None
+
+    def finish_document(self, doc_id, status=DONE, file_name=None, error=None, sha256=None):
+        with self.connection() as conn:
+            conn.execute(
+                """UPDATE documents SET status = ?, file_name = COALESCE(?, file_name), error = ?,
+                       sha256 = COALESCE(?, sha256), updated_at = ?
+                   WHERE id = ?""",
+                (status, file_name, error, sha256, utc_now(), doc_id),
+            )
+
+    def record_file(self, file_name, sha256):
+        """Attach a hash to the document saved as `file_name`, adding a done row if none exists."""
+        rn, permit_number, publish_date = parse_pdf_name(file_name)
+        now = utc_now()
+        with self.connection() as conn:
+            updated = conn.execute(
+                'UPDATE documents SET sha256 = ?, updated_at = ? WHERE file_name = ?', (sha256, now, file_name)
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    """INSERT OR IGNORE INTO documents
+                       (rn_number, permit_number, publish_date, doc_ref, file_name, sha256, status, attempts, created_at, updated_at)
+                       VALUES (?, ?, ?, '', ?, ?, ?, 1, ?, ?)""",
+                    (rn, permit_number, publish_date, file_name, sha256, DONE, now, now),
+                )
+
+    def add_blob(self, sha256, size):
+        """Register a stored PDF. Returns False if the hash was already known."""
+        with self.connection() as conn:
+            return conn.execute(
+                'INSERT OR IGNORE INTO blobs (sha256, size, created_at) VALUES (?, ?, ?)', (sha256, size, utc_now())
+            ).rowcount == 1
+
+    def has_blob(self, sha256):
+        return self.connection().execute('SELECT 1 FROM blobs WHERE sha256 = ?', (sha256,)).fetchone() is not None
+
+    def documents_for_rn(self, rn):
+        return self.connection().execute(
+            'SELECT * FROM documents WHERE rn_number = ? ORDER BY id', (rn,)
+        ).fetchall()
+
+    def done_documents(self):
+        return self.connection().execute(
+            "SELECT rn_number, permit_number, publish_date, file_name, sha256 FROM documents WHERE status = 'done' ORDER BY id"
+        )
+
+    # Entity search queries
+
+    def start_query(self, kind, query):
+        now = utc_now()
+        with self.connection() as conn:
+            conn.execute(
+                """INSERT INTO queries (kind, query, status, attempts, started_at, updated_at)
+                   VALUES (?, ?, ?, 1, ?, ?)
+                   ON CONFLICT (kind, query) DO UPDATE SET
+                       status = excluded.status, attempts = attempts + 1, error = NULL,
+                       started_at = excluded.started_at, updated_at = excluded.updated_at""",
+                (kind, query, IN_PROGRESS, now, now),
+            )
+
+    def finish_query(self, kind, query, status=DONE, record_count=None, error=None, expected_count=None):
+        # record_count is what was saved, expected_count what the site reported for the search
+        with self.connection() as conn:
+            conn.execute(
+                """UPDATE queries SET status = ?, record_count = COALESCE(?, record_count),
+                       expected_count = COALESCE(?, expected_count), error = ?, updated_at = ?
+                   WHERE kind = ? AND query = ?""",
+                (status, record_count, expected_count, error, utc_now(), kind, query),
+            )
+
+    def queries_with_status(self, kind, *statuses):
+        placeholders = ', '.join('?' for _ in statuses)
+        rows = self.connection().execute(
+            f'SELECT query FROM queries WHERE kind = ? AND status IN ({placeholders})', (kind, *statuses)
+        )
+        return {row['query'] for row in rows}
+
+    def query_counts(self, kind):
+        """Status, saved and reported record counts of every recorded search of one kind."""
+        rows = self.connection().execute(
+            'SELECT query, status, record_count, expected_count FROM queries WHERE kind = ?', (kind,)
+        )
+        return {row['query']: dict(row) for row in rows}
+
+    # Reporting and migration
+
+    def status_counts(self):
+        counts = {}
+        for table in ('rns', 'documents', 'queries'):
+            rows = self.connection().execute(f'SELECT status, COUNT(*) AS n FROM {table} GROUP BY status')
+            counts[table] = {row['status']: row['n'] for row in rows}
+        return counts
+
+    def export_download_logs(self, path):
+        """Write the old download_logs.csv layout for tools that still read it."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['RN Number', 'File Name'])
+            for row in self.done_documents():
+                writer.writerow([row['rn_number'], row['file_name']])
+
+    def import_legacy_csvs(self, logs_path=LEGACY_DOWNLOAD_LOGS_PATH, counts_path=LEGACY_DOWNLOAD_COUNTS_PATH):
+        """Load download_logs.csv/download_counts.csv from before the store existed.
+
+        Logged files become done documents. Their RNs are marked done only when
+        download_counts.csv confirms the RN finished, since the old log cannot
+        tell a complete RN from one that crashed halfway.
+        """
+        now = utc_now()
+        imported = 0
+        with self.connection() as conn:
+            if os.path.exists(logs_path):
+                with open(logs_path, newline='') as f:
+                    for row in csv.DictReader(f):
+                        rn, file_name = row['RN Number'], row['File Name']
+                        _, permit_number, publish_date = parse_pdf_name(file_name)
+                        conn.execute(
+                            """INSERT OR IGNORE INTO documents
+                               (rn_number, permit_number, publish_date, doc_ref, file_name, status, attempts, created_at, updated_at)
+                               VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)""",
+                            (rn, permit_number, publish_date, '', file_name, DONE, now, now),
+                        )
+                        conn.execute(
+                            "INSERT OR IGNORE INTO rns (rn_number, status, updated_at) VALUES (?, ?, ?)",
+                            (rn, IN_PROGRESS, now),
+                        )
+                        imported += 1
+            if os.path.exists(counts_path):
+                with open(counts_path, newline='') as f:
+                    for row in csv.DictReader(f):
+                        conn.execute(
+                            """INSERT INTO rns (rn_number, status, document_count, updated_at, last_checked_at, check_count)
+                               VALUES (?, ?, ?, ?, ?, 1)
+                               ON CONFLICT (rn_number) DO UPDATE SET
+                                   status = excluded.status, document_count = excluded.document_count,
+                                   last_checked_at = excluded.last_checked_at, check_count = 1""",
+                            (row['rn_number'], DONE, int(float(row['download_counts'])), now, now),
+                        )
+        logging.info(f"Imported {imported} logged downloads into {self.path}")
+        return imported
+
+
+def open_store(path=STATE_DB_PATH):
+    # First use next to old CSV logs picks them up so resume keeps working
+    is_new = not os.path.exists(path)
+    store = StateStore(path)
+    if is_new and (os.path.exists(LEGACY_DOWNLOAD_LOGS_PATH) or os.path.exists(LEGACY_DOWNLOAD_COUNTS_PATH)):
+        store.import_legacy_csvs()
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or export the scraper state store")
+    parser.add_argument('--db', default=STATE_DB_PATH)
+    # --db is also accepted after the command, as in `maert status --db PATH`
+    db_option = argparse.ArgumentParser(add_help=False)
+    db_option.add_argument('--db', default=argparse.SUPPRESS)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', parents=[db_option], help="Print job counts by status")
+    export = sub.add_parser('export-logs', parents=[db_option], help="Write completed downloads as download_logs.csv")
+    export.add_argument('path', nargs='?', default=LEGACY_DOWNLOAD_LOGS_PATH)
+    args = parser.parse_args(argv)
+
+    store = open_store(args.db)
+    if args.command == 'status':
+        for table, counts in store.status_counts().items():
+            summary = ', '.join(f"{status}: {n}" for status, n in sorted(counts.items())) or 'empty'
+            print(f"{table}: {summary}")
+    elif args.command == 'export-logs':
+        store.export_download_logs(args.path)
+        print(f"Wrote {args.path}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,366 @@
+import time
+import random
+import logging
+import argparse
+import threading
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+import zipcodes
+
+# Constants
+RECORDS_PATH = '/cs/idcplg'
+CR_PATH = '/crpub/index.cfm'
+PDF_PATH = '/pdfs/'
+RECORDS_PAGE_SIZE = 10
+CR_PAGE_SIZE = 20
+RESULT_COLUMNS = 17
+DOCUMENT_TYPES = ['MAERT', 'PERMIT', 'CORRESPONDENCE', 'APPLICATION', 'TECHNICAL REVIEW']
+POLLUTANTS = ['NOx', 'CO', 'VOC', 'SO2', 'PM10', 'PM2.5', 'H2S', 'NH3']
+SOURCES = ['Boiler No.', 'Flare', 'Storage Tank', 'Cooling Tower', 'Heater', 'Engine', 'Loading Rack']
+
+
+def _pdf_text(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages):
+    """A minimal text-only PDF with one Helvetica text block per page; `pages` is a list of line lists."""
+    bodies = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    number = 4
+    for lines in pages:
+        stream = ("BT /F1 9 Tf 12 TL 40 750 Td " + ' '.join(f"({_pdf_text(line)}) Tj T*" for line in lines) + " ET").encode('latin-1')
+        bodies[number] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                          f"/Resources << /Font << /F1 3 0 R >> >> /Contents {number + 1} 0 R >>").encode()
+        bodies[number + 1] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        kids.append(number)
+        number += 2
+    bodies[2] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for i in range(1, number):
+        offsets[i] = len(out)
+        out += f"{i} 0 obj\n".encode() + bodies[i] + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {number}\n0000000000 65535 f \n".encode()
+    for i in range(1, number):
+        out += f"{offsets[i]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {number} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def maert_pdf(rng, permit_number, rn):
+    """A permit with a cover letter page and a MAERT table that may run onto a second page."""
+    rows = []
+    for epn in range(1, rng.randint(2, 12) + 1):
+        name = f"{rng.choice(SOURCES)} {epn}"
+        for pollutant in rng.sample(POLLUTANTS, rng.randint(1, 4)):
+            rows.append(f"EPN-{epn} {name} {pollutant} {rng.uniform(0.01, 50):.2f} {rng.uniform(0.01, 200):.2f}")
+    cover = [
+        'Texas Commission on Environmental Quality',
+        f'Air Quality Permit Number {permit_number}',
+        f'Regulated Entity Number {rn}',
+        'This permit is issued subject to the special conditions attached.',
+    ]
+    header = [
+        'Maximum Allowable Emission Rates',
+        f'Permit Number {permit_number}',
+        'Emission Point No. (1) Source Name (2) Air Contaminant Name (3) lbs/hour tons/year',
+    ]
+    pages = [cover, header + rows[:45]]
+    if rows[45:]:
+        pages.append(rows[45:])
+    return make_pdf(pages)
+
+
+class Fixtures:
+    """Deterministic synthetic TCEQ data: records search results with MAERT PDFs and Central Registry entities.
+
+    About `hit_rate` of the RNs have MAERTs, mixed in with other document types
+    so that some result lists run over several pages; a few PDFs are shared
+    by two RNs. `capped_counties` small counties hold more entities than one
+    county search returns (`result_cap`), so they have to be covered by ZIP code.
+    """
+
+    def __init__(self, rns=200, hit_rate=0.3, entities_per_county=(0, 12), capped_counties=2, result_cap=25, seed=0):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.result_cap = result_cap
+        self.rn_numbers = [f"RN1{i:08d}" for i in range(rns)]
+        self.records = {}
+        self.pdfs = {}
+        pdf_ids = []
+        for rn in self.rn_numbers:
+            rows = []
+            if rng.random() < hit_rate:
+                for _ in range(rng.randint(1, 3)):
+                    permit_number = str(rng.randint(1000, 199999))
+                    for _ in range(rng.randint(1, 2)):
+                        if pdf_ids and rng.random() < 0.05:
+                            pdf_id = rng.choice(pdf_ids)
+                        else:
+                            pdf_id = f"{len(pdf_ids):06d}"
+                            pdf_ids.append(pdf_id)
+                            self.pdfs[pdf_id] = (permit_number, rn)
+                        rows.append(('MAERT', permit_number, pdf_id))
+            for _ in range(rng.randint(0, 25)):
+                rows.append((rng.choice(DOCUMENT_TYPES[1:]), str(rng.randint(1000, 199999)), None))
+            rng.shuffle(rows)
+            self.records[rn] = [
+                (f"{rn}-{n}", doc_type, permit_number, pdf_id,
+                 f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(1992, 2024)}")
+                for n, (doc_type, permit_number, pdf_id) in enumerate(rows)
+            ]
+        self._pdf_cache = {}
+        self._pdf_lock = threading.Lock()
+
+        zips_by_county = {}
+        for z in zipcodes.filter_by(state="TX"):
+            county = (z.get('county') or '').upper().replace(' COUNTY', '').strip()
+            if county:
+                zips_by_county.setdefault(county, []).append(z['zip_code'])
+        self.counties = sorted(zips_by_county)
+        capped = sorted((c for c in self.counties if len(zips_by_county[c]) >= 2),
+                        key=lambda c: (len(zips_by_county[c]), c))[:capped_counties]
+        self.county_entities = {}
+        self.zip_entities = {}
+        known = iter(self.rn_numbers)
+        synthetic = 0
+        for county in self.counties:
+            count = result_cap + 10 if county in capped else rng.randint(*entities_per_county)
+            entities = []
+            for _ in range(count):
+                rn = next(known, None)
+                if rn is None:
+                    rn = f"RN2{synthetic:08d}"
+                    synthetic += 1
+                zip_code = rng.choice(zips_by_county[county])
+                entity = (rn, f"{rng.choice(['ACME', 'LONE STAR', 'GULF', 'PERMIAN'])} {rng.choice(['PLANT', 'TERMINAL', 'FACILITY'])} {rn[-4:]}",
+                          f"{rng.randint(1, 9999)} MAIN ST, {county}, TX {zip_code}")
+                entities.append(entity)
+                self.zip_entities.setdefault(zip_code, []).append(entity)
+            self.county_entities[county] = entities
+
+    def pdf(self, pdf_id):
+        with self._pdf_lock:
+            if pdf_id not in self._pdf_cache:
+                permit_number, rn = self.pdfs[pdf_id]
+                self._pdf_cache[pdf_id] = maert_pdf(random.Random(f"{self.seed}-{pdf_id}"), permit_number, rn)
+            return self._pdf_cache[pdf_id]
+
+
+# Records search pages, nested the way the Selenium scraper's absolute XPaths expect
+
+def _records_frame(inner):
+    filler = '<tr><td></td></tr>' * 4
+    return (f'<html><head><title>TCEQ Records Online</title></head><body><table><tbody>{filler}'
+            f'<tr><td><table><tbody><tr><td><div>{inner}</div></td></tr></tbody></table></td></tr>'
+            '</tbody></table></body></html>')
+
+
+def records_search_page():
+    blank_rows = '<tr><td></td></tr>' * 3
+    form = (
+        f'<form action="{RECORDS_PATH}" method="get">'
+        '<input type="hidden" name="IdcService" value="TCEQ_SEARCH_RESULTS">'
+        '<table><tbody>'
+        '<tr><td><select id="xRecordSeries" name="xRecordSeries"><option value=""></option><option value="1081">Air</option></select></td></tr>'
+        '<tr><td><select id="xInsightDocumentType" name="xInsightDocumentType"><option value=""></option><option value="27">New Source Review Permit</option></select></td></tr>'
+        '<tr><td></td></tr>'
+        '<tr><td><table><tbody>'
+        '<tr><td><select name="field1"><option value="">Choose</option><option value="xRefNumTxt">RN</option></select></td>'
+        '<td><input type="text" name="value1"></td></tr>'
+        f'{blank_rows}'
+        '<tr><td></td><td></td><td><div><button type="submit" name="search" value="Search">Search</button></div></td></tr>'
+        '</tbody></table></td></tr>'
+        '</tbody></table></form>'
+    )
+    return _records_frame(form)
+
+
+def records_results_page(fixtures, rn, page):
+    rows = fixtures.records.get(rn, [])
+    if not rows:
+        return _records_frame('<table></table><table></table><span>Found 0 potential items</span>')
+    pages = (len(rows) + RECORDS_PAGE_SIZE - 1) // RECORDS_PAGE_SIZE
+    header = ''.join(f'<th>Column {i}</th>' for i in range(RESULT_COLUMNS))
+    body = []
+    for link_text, doc_type, permit_number, pdf_id, date in rows[(page - 1) * RECORDS_PAGE_SIZE:page * RECORDS_PAGE_SIZE]:
+        cells = [''] * RESULT_COLUMNS
+        href = f"{PDF_PATH}{pdf_id}.pdf" if pdf_id else f"{PDF_PATH}missing.pdf"
+        cells[2] = f'<a href="{href}">{escape(link_text)}</a>'
+        cells[6] = permit_number
+        cells[12] = doc_type
+        cells[16] = f"{date} 12:00 AM"
+        body.append('<tr>' + ''.join(f'<td>{c}</td>' for c in cells) + '</tr>')
+    selector = ''
+    if pages > 1:
+        options = ''.join(
+            f'<option value="{RECORDS_PATH}?{urlencode({"IdcService": "TCEQ_SEARCH_RESULTS", "value1": rn, "page": n})}"'
+            f'{" selected" if n == page else ""}>{n}</option>'
+            for n in range(1, pages + 1)
+        )
+        selector = f'<select name="pageSelectList" onchange="window.location.href=this.value">{options}</select>'
+    results = f'<table><thead><tr>{header}</tr></thead><tbody>{"".join(body)}</tbody></table>'
+    return _records_frame(
+        f'<table><tbody><tr><td>Found {len(rows)} potential items</td></tr></tbody></table>'
+        f'<table><tbody><tr><td>{selector}</td></tr></tbody></table>'
+        f'<table><tbody><tr><td></td><td>{results}</td></tr></tbody></table>'
+    )
+
+
+# Central Registry regulated entity search pages
+
+def cr_search_page(fixtures):
+    counties = ''.join(f'<option value="{escape(c)}">{escape(c)}</option>' for c in fixtures.counties)
+    return (
+        '<html><body><div><form method="get" action="' + CR_PATH + '">'
+        '<input type="hidden" name="fuseaction" value="regent.RNSearch">'
+        '<select name="pgm_area"><option value=""></option><option value="AIRNSR    ">AIRNSR</option></select>'
+        f'<select name="cnty_name"><option value=""></option>{counties}</select>'
+        '<input type="text" id="zip_cd" name="zip_cd">'
+        '<input type="submit" name="_fuseaction=regent.validateRE" value="Search">'
+        '</form></div></body></html>'
+    )
+
+
+def cr_results_page(fixtures, params, page):
+    county = params.get('cnty_name', '').strip()
+    zip_code = params.get('zip_cd', '').strip()
+    if zip_code:
+        entities = fixtures.zip_entities.get(zip_code, [])
+        served = entities
+    else:
+        entities = fixtures.county_entities.get(county, [])
+        # Large counties report their full count but only return the first result_cap rows
+        served = entities[:fixtures.result_cap]
+    if not entities:
+        return '<html><body><div class="error">No results were found for the criteria you entered.</div></body></html>'
+    if zip_code and len(entities) == 1:
+        rn, name, location = entities[0]
+        return (f'<html><body><div id="reinfo"><p><span class="lbl">RN:</span> {rn}</p>'
+                f'<p><span class="lbl">Name:</span> {escape(name)}</p></div>'
+                f'<div id="street_addr"><span class="lbl">Street Address:</span> {escape(location)}</div></body></html>')
+    rows = served[(page - 1) * CR_PAGE_SIZE:page * CR_PAGE_SIZE]
+    body = ''.join(f'<tr><td>{rn}</td><td>{escape(name)}</td><td>{escape(location)}</td></tr>' for rn, name, location in rows)
+    next_link = ''
+    if page * CR_PAGE_SIZE < len(served):
+        next_link = f'<a href="{CR_PATH}?{urlencode({**params, "page": page + 1})}">&gt;</a>'
+    return (
+        '<html><body><div><div>Regulated Entity Search</div>'
+        f'<div><div>Results</div><div><span>{len(entities)}</span> records found</div></div>'
+        '<table><thead><tr><th>RN</th><th>Regulated Entity Name</th><th>Location</th></tr></thead>'
+        f'<tbody>{body}</tbody></table>{next_link}</div></body></html>'
+    )
+
+
+class StubServer:
+    """Serves Fixtures over HTTP on localhost, adding `latency` seconds to every response.
+
+    `error_rate` of the requests get a 503 instead, to exercise retries and the circuit breaker.
+
+    Use as a context manager; records_url and cr_url are what TCEQ_RECORDS_URL
+    and TCEQ_CR_URL should be set to.
+    """
+
+    def __init__(self, fixtures, latency=0.0, host='127.0.0.1', port=0, error_rate=0.0, seed=0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    failed = stub._rng.random() < stub.error_rate
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if failed:
+                    status, content_type, body = 503, 'text/plain', b'service unavailable'
+                else:
+                    status, content_type, body = stub.route(self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                if content_type == 'application/pdf':
+                    self.send_header('Content-Disposition', 'attachment')
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.records_url = self.base_url + RECORDS_PATH
+        self.cr_url = f"{self.base_url}{CR_PATH}?fuseaction=regent.RNSearch"
+        self._thread = None
+
+    def route(self, path):
+        url = urlsplit(path)
+        params = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        page = int(params.pop('page', 1) or 1)
+        if url.path.startswith(PDF_PATH):
+            pdf_id = url.path[len(PDF_PATH):].removesuffix('.pdf')
+            if pdf_id not in self.fixtures.pdfs:
+                return 404, 'text/plain', b'not found'
+            return 200, 'application/pdf', self.fixtures.pdf(pdf_id)
+        if url.path == RECORDS_PATH:
+            if params.get('IdcService') == 'TCEQ_SEARCH_RESULTS':
+                return 200, 'text/html', records_results_page(self.fixtures, params.get('value1', '').strip(), page).encode()
+            return 200, 'text/html', records_search_page().encode()
+        if url.path == CR_PATH:
+            if 'pgm_area' in params:
+                return 200, 'text/html', cr_results_page(self.fixtures, params, page).encode()
+            return 200, 'text/html', cr_search_page(self.fixtures).encode()
+        return 404, 'text/plain', b'not found'
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='stub_tceq', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic TCEQ records and Central Registry pages for offline runs")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rns', type=int, default=200, help="Number of RNs in the records search (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every response (default: %(default)s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with a 503")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with StubServer(Fixtures(rns=args.rns, seed=args.seed), args.latency, port=args.port,
+                    error_rate=args.error_rate, seed=args.seed) as server:
+        logging.info(f"TCEQ_RECORDS_URL={server.records_url}")
+        logging.info(f"TCEQ_CR_URL={server.cr_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+# Main entry
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
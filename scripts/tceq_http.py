@@ -0,0 +1,224 @@
+import os
+import re
+import logging
+import threading
+from urllib.parse import urljoin
+
+import httpx
+from lxml import html as lxml_html
+
+from resilience import LayoutError
+
+# Constants
+# Point TCEQ_RECORDS_URL at a local stub server to run against recorded pages
+RECORDS_URL = os.getenv("TCEQ_RECORDS_URL", "https://records.tceq.texas.gov/cs/idcplg")
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120 Safari/537.36'
+RECORD_SERIES = '1081'
+DOCUMENT_TYPE = '27'
+SEARCH_FIELD = 'xRefNumTxt'
+NO_RESULTS_TEXT = 'Found 0 potential items'
+
+# Result table columns, same positions the Selenium scraper reads
+LINK_COLUMN = 2
+PERMIT_COLUMN = 6
+DOCUMENT_TYPE_COLUMN = 12
+DATE_COLUMN = 16
+
+_JS_URL_RE = re.compile(r"""['"]([^'"]*(?:idcplg|IdcService)[^'"]*)['"]""")
+
+
+class LayoutChangedError(LayoutError):
+    """The search page no longer looks the way the parser expects."""
+
+
+class SearchForm:
+    """The TCEQ_SEARCH form, reduced to what is needed to submit it without a browser."""
+
+    def __init__(self, action, method, fields, value_field):
+        self.action = action
+        self.method = method
+        self.fields = fields
+        self.value_field = value_field
+
+    def params_for(self, rn):
+        params = list(self.fields)
+        params.append((self.value_field, rn))
+        return params
+
+
+def parse_search_form(page_html, base_url):
+    doc = lxml_html.fromstring(page_html)
+    form = next((f for f in doc.forms if f.xpath('.//select[@id="xRecordSeries"]')), None)
+    if form is None:
+        raise LayoutChangedError("Search form with xRecordSeries not found")
+
+    field_selects = form.xpath(f'.//select[option[@value="{SEARCH_FIELD}"]]')
+    if not field_selects:
+        raise LayoutChangedError(f"No search field select offering {SEARCH_FIELD}")
+    field_select = field_selects[0]
+    # The value box sits in the cell next to the field dropdown
+    value_inputs = field_select.xpath('ancestor::td[1]/following-sibling::td[1]//input[@name]')
+    if not value_inputs:
+        raise LayoutChangedError("Search value input not found")
+    value_field = value_inputs[0].get('name')
+
+    overrides = {
+        'xRecordSeries': RECORD_SERIES,
+        'xInsightDocumentType': DOCUMENT_TYPE,
+    }
+    fields = []
+    for name, value in form.form_values():
+        if name == value_field:
+            continue
+        for select in form.xpath(f'.//select[@name="{name}"]'):
+            if select.get('id') in overrides:
+                value = overrides[select.get('id')]
+            elif select is field_select:
+                value = SEARCH_FIELD
+        fields.append((name, value))
+    # form_values() leaves selects without a preselected option out entirely
+    present = {name for name, _ in fields}
+    for select_id, value in overrides.items():
+        for select in form.xpath(f'.//select[@id="{select_id}"]'):
+            if select.get('name') and select.get('name') not in present:
+                fields.append((select.get('name'), value))
+    if field_select.get('name') and field_select.get('name') not in present:
+        fields.append((field_select.get('name'), SEARCH_FIELD))
+
+    # The search button is the first button in the form; send it if it is named
+    buttons = form.xpath('.//button[@name]')
+    if buttons:
+        fields.append((buttons[0].get('name'), buttons[0].get('value', '')))
+
+    action = urljoin(base_url, form.get('action') or base_url)
+    method = (form.get('method') or 'get').upper()
+    return SearchForm(action, method, fields, value_field)
+
+
+def _cell_text(cell):
+    return ' '.join(cell.text_content().split())
+
+
+def find_results_table(doc):
+    # Innermost table wide enough to hold the date column
+    for table in doc.xpath('//table[not(.//table)]'):
+        if any(len(row.xpath('./td|./th')) > DATE_COLUMN for row in table.xpath('.//tr')):
+            return table
+    return None
+
+
+def parse_results(page_html, page_url):
+    """Return (rows, page_urls) for one page of search results.
+
+    Each row is a dict with the link text and URL from the document column,
+    the permit number, document type and publish date.
+    """
+    if NO_RESULTS_TEXT in page_html:
+        return [], []
+    doc = lxml_html.fromstring(page_html)
+    table = find_results_table(doc)
+    if table is None:
+        raise LayoutChangedError("Results table not found")
+
+    rows = []
+    body_rows = [r for r in table.xpath('.//tr') if not r.xpath('./th')]
+    if len(body_rows) == len(table.xpath('.//tr')):
+        # No <th> header row, the first row holds the column names
+        body_rows = body_rows[1:]
+    for row in body_rows:
+        cells = row.xpath('./td')
+        if len(cells) <= DATE_COLUMN:
+            continue
+        links = cells[LINK_COLUMN].xpath('.//a[@href]')
+        rows.append({
+            'link_text': _cell_text(cells[LINK_COLUMN]),
+            'url': urljoin(page_url, links[0].get('href')) if links else None,
+            'permit_number': _cell_text(cells[PERMIT_COLUMN]),
+            'document_type': _cell_text(cells[DOCUMENT_TYPE_COLUMN]),
+            'publish_date': _cell_text(cells[DATE_COLUMN]),
+        })
+
+    page_urls = []
+    for option in doc.xpath("//select[contains(@name, 'pageSelectList')]/option"):
+        value = option.get('value') or ''
+        match = _JS_URL_RE.search(value)
+        if match:
+            value = match.group(1)
+        page_urls.append(urljoin(page_url, value) if value else None)
+    return rows, page_urls
+
+
+class TceqRecordsClient:
+    """MAERT discovery and download over one pooled keep-alive HTTP session.
+
+    httpx.Client is thread safe, so a single instance is shared by all workers.
+    """
+
+    def __init__(self, base_url=RECORDS_URL, limiter=None, timeout=30, max_connections=10):
+        self.base_url = base_url
+        self.limiter = limiter
+        self.client = httpx.Client(
+            timeout=timeout,
+            follow_redirects=True,
+            headers={'User-Agent': USER_AGENT},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._form = None
+        self._form_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.client.close()
+
+    def _request(self, method, url, **kwargs):
+        if self.limiter:
+            self.limiter.wait()
+        response = self.client.request(method, url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def search_form(self):
+        with self._form_lock:
+            if self._form is None:
+                response = self._request('GET', self.base_url, params={'IdcService': 'TCEQ_SEARCH'})
+                self._form = parse_search_form(response.text, str(response.url))
+            return self._form
+
+    def search(self, rn):
+        """Yield every result row for an RN, following the page selector."""
+        form = self.search_form()
+        params = form.params_for(rn)
+        if form.method == 'POST':
+            response = self._request('POST', form.action, data=params)
+        else:
+            response = self._request('GET', form.action, params=params)
+        rows, page_urls = parse_results(response.text, str(response.url))
+        yield from rows
+        # The first option is the page just fetched
+        for page_number, page_url in enumerate(page_urls[1:], start=2):
+            if not page_url:
+                logging.warning(f"RN {rn}: no URL for results page {page_number}")
+                break
+            response = self._request('GET', page_url)
+            rows, _ = parse_results(response.text, str(response.url))
+            yield from rows
+
+    def find_maerts(self, rn):
+        maerts = [row for row in self.search(rn) if row['document_type'] == 'MAERT']
+        logging.info(f"RN {rn}: found {len(maerts)} MAERT entries.")
+        return maerts
+
+    def download(self, url, dest_path, chunk_size=64 * 1024):
+        if self.limiter:
+            self.limiter.wait()
+        with self.client.stream('GET', url) as response:
+            response.raise_for_status()
+            with open(dest_path, 'wb') as f:
+                for chunk in response.iter_bytes(chunk_size):
+                    f.write(chunk)
+        return dest_path
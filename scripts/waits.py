@@ -0,0 +1,196 @@
+import os
+import glob
+import json
+import time
+import logging
+
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException, StaleElementReferenceException
+
+from metrics import METRICS
+
+# Constants
+DEFAULT_TIMEOUT = 10
+# Conditions are re-checked this often; WebDriverWait's default of 0.5s adds up over thousands of pages
+POLL_INTERVAL = 0.1
+# No request in flight for this long counts as network idle
+NETWORK_IDLE_TIME = 0.5
+PARTIAL_DOWNLOAD_SUFFIXES = ('.crdownload', '.tmp')
+
+
+def driver_alive(driver):
+    """Whether the browser behind `driver` still answers; a crashed one needs a new driver."""
+    try:
+        driver.execute_script('return 1')
+        return True
+    except WebDriverException:
+        return False
+
+
+def enable_browser_events(options):
+    """Have Chrome log network and page DevTools events, which network_idle() and download() listen to."""
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': True})
+    return options
+
+
+class Waits:
+    """Event-driven waits for one driver, each timed as a "wait ..." span in METRICS.
+
+    Every wait returns as soon as its condition holds instead of sleeping a
+    fixed time. network_idle() and download() read the DevTools events
+    enabled by enable_browser_events(); without them (`events=False`) they
+    fall back to ready-state and file checks at the same short interval.
+    """
+
+    def __init__(self, driver, timeout=DEFAULT_TIMEOUT, stats=METRICS, events=True):
+        self.driver = driver
+        self.timeout = timeout
+        self.stats = stats
+        self._in_flight = set()
+        self._events_available = events
+
+    def _timed(self, name, fn):
+        start = time.monotonic()
+        ok = False
+        try:
+            result = fn()
+            ok = True
+            return result
+        finally:
+            self.stats.observe(f"wait {name}", time.monotonic() - start, ok)
+
+    def until(self, name, condition, timeout=None):
+        """Wait for an expected condition; raises TimeoutException like WebDriverWait."""
+        wait = WebDriverWait(self.driver, timeout or self.timeout, poll_frequency=POLL_INTERVAL,
+                             ignored_exceptions=(StaleElementReferenceException,))
+        return self._timed(name, lambda: wait.until(condition))
+
+    def first_of(self, name, conditions, timeout=None):
+        """Wait until one of several named conditions holds. Returns its name, or None on timeout."""
+        def any_met(driver):
+            for key, condition in conditions.items():
+                try:
+                    if condition(driver):
+                        return key
+                except (WebDriverException, StaleElementReferenceException):
+                    pass
+            return False
+
+        try:
+            return self.until(name, any_met, timeout)
+        except TimeoutException:
+            return None
+
+    def clickable(self, name, locator, timeout=None):
+        return self.until(name, EC.element_to_be_clickable(locator), timeout)
+
+    def replaced(self, name, element, locator, timeout=None):
+        """Wait for `element` to leave the page and a new `locator` match to load. Returns the new element.
+
+        Use after an action that reloads the page or re-renders a part of it,
+        in place of a fixed sleep.
+        """
+        try:
+            self.until(f"{name} (unload)", EC.staleness_of(element), timeout)
+        except TimeoutException:
+            # Updated in place without replacing the element; settle on the network instead
+            self.network_idle(name)
+        return self.until(name, EC.presence_of_element_located(locator), timeout)
+
+    def _drain_events(self):
+        if not self._events_available:
+            return []
+        try:
+            entries = self.driver.get_log('performance')
+        except WebDriverException:
+            self._events_available = False
+            return []
+        events = []
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            method = message.get('method', '')
+            params = message.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                self._in_flight.add(params.get('requestId'))
+            elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+                self._in_flight.discard(params.get('requestId'))
+            events.append((method, params))
+        return events
+
+    def drain_events(self):
+        """Read and drop the events logged so far, keeping track of the requests still in flight."""
+        self._drain_events()
+
+    def network_idle(self, name='network idle', idle_time=NETWORK_IDLE_TIME, timeout=None):
+        """Wait until the page is loaded and no request has been in flight for `idle_time`."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+
+        def idle():
+            quiet_since = None
+            while time.monotonic() < deadline:
+                self._drain_events()
+                try:
+                    ready = self.driver.execute_script('return document.readyState') == 'complete'
+                except WebDriverException:
+                    ready = False
+                if ready and not self._in_flight:
+                    quiet_since = quiet_since or time.monotonic()
+                    if time.monotonic() - quiet_since >= idle_time:
+                        return True
+                else:
+                    quiet_since = None
+                time.sleep(POLL_INTERVAL)
+            # Requests that never report back (long polls, beacons) must not hold the next wait
+            self._in_flight.clear()
+            raise TimeoutException(f"Network not idle after {timeout or self.timeout}s")
+
+        try:
+            return self._timed(name, idle)
+        except TimeoutException:
+            return False
+
+    def download(self, directory, timeout=30, name='download'):
+        """Wait for a finished download in `directory`. Returns its path, or None on timeout or cancel.
+
+        Chrome's download progress events end the wait the moment a
+        download completes, with the file the event names when it is in
+        `directory`, or is canceled. The directory is checked on every poll
+        as well, so the wait also works without them.
+        """
+        deadline = time.monotonic() + timeout
+
+        def finished_file():
+            files = [f for f in glob.glob(os.path.join(directory, '*')) if not f.endswith(PARTIAL_DOWNLOAD_SUFFIXES)]
+            return max(files, key=os.path.getctime) if files else None
+
+        def completed_file(params):
+            path = params.get('filePath')
+            if path and os.path.dirname(os.path.abspath(path)) == os.path.abspath(directory) and os.path.exists(path):
+                return path
+            return finished_file()
+
+        def wait():
+            while time.monotonic() < deadline:
+                for method, params in self._drain_events():
+                    if not method.endswith('.downloadProgress'):
+                        continue
+                    if params.get('state') == 'canceled':
+                        raise TimeoutException("Download canceled")
+                    if params.get('state') == 'completed' and (path := completed_file(params)):
+                        return path
+                path = finished_file()
+                if path:
+                    return path
+                time.sleep(POLL_INTERVAL)
+            raise TimeoutException(f"No download finished after {timeout}s")
+
+        try:
+            return self._timed(name, wait)
+        except TimeoutException as e:
+            logging.warning(f"{e.msg} in {directory}")
+            return None
@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import resilience  # noqa: E402
+from state_store import StateStore  # noqa: E402
+
+TCEQ_DIR = os.path.join(FIXTURES_DIR, 'tceq')
+RECORDS_PATH = '/cs/idcplg'
+# RN searched -> results page served for it; RN100000001 has a second page at StartRow=21
+RESULT_PAGES = {
+    'RN100000001': 'results_page1.html',
+    'RN100000002': 'no_results.html',
+    'RN100000003': 'layout_changed.html',
+}
+THROTTLED_RN = 'RN100000004'
+
+
+def fixture_bytes(name):
+    with open(os.path.join(TCEQ_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class RecordsServer:
+    """Serves the pages under fixtures/tceq the way the records search answers them.
+
+    `throttled` is how many more searches for THROTTLED_RN get a 429 before it
+    is answered like RN100000002. Every request path is kept in `requests`.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.throttled = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append(self.path)
+                status, content_type, body = server.route(self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.records_url = f"http://127.0.0.1:{self.httpd.server_address[1]}{RECORDS_PATH}"
+
+    def route(self, path):
+        url = urlsplit(path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path != RECORDS_PATH:
+            return 404, 'text/plain', b'not found'
+        service = params.get('IdcService')
+        if service == 'TCEQ_SEARCH':
+            return 200, 'text/html', fixture_bytes('search_form.html')
+        if service == 'TCEQ_EXTERNAL_SEARCH_GET_FILE':
+            return 200, 'application/pdf', fixture_bytes('maert.pdf')
+        if service == 'TCEQ_SEARCH_RESULTS':
+            rn = params.get('searchValue1', '')
+            if rn == THROTTLED_RN:
+                if self.throttled > 0:
+                    self.throttled -= 1
+                    return 429, 'text/plain', b'too many requests'
+                rn = 'RN100000002'
+            if rn == 'RN100000001' and params.get('StartRow') == '21':
+                return 200, 'text/html', fixture_bytes('results_page2.html')
+            return 200, 'text/html', fixture_bytes(RESULT_PAGES.get(rn, 'no_results.html'))
+        return 404, 'text/plain', b'not found'
+
+    def searches(self):
+        return [p for p in self.requests if 'TCEQ_SEARCH_RESULTS' in p]
+
+
+@pytest.fixture
+def records_server():
+    server = RecordsServer()
+    thread = threading.Thread(target=server.httpd.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / 'state.sqlite'))
+    yield store
+    store.close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # Retries happen at once, and every test starts with a closed circuit breaker that does not pause when it opens
+    monkeypatch.setattr(resilience, 'backoff_delay', lambda *args, **kwargs: 0.0)
+    resilience.BREAKER.__init__(cooldown=0.0)
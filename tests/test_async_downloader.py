@@ -0,0 +1,40 @@
+import time
+import asyncio
+
+from async_downloader import AsyncPdfDownloader
+from rate_limit import RateLimiter
+
+
+class CountingLimiter(RateLimiter):
+    def __init__(self, rate):
+        super().__init__(rate, breaker=None)
+        self.calls = 0
+
+    async def wait_async(self):
+        self.calls += 1
+        await super().wait_async()
+
+
+def test_downloads_share_the_run_rate_limit(records_server, tmp_path):
+    limiter = CountingLimiter(20)
+    url = records_server.records_url + '?IdcService=TCEQ_EXTERNAL_SEARCH_GET_FILE&dID={}&Rendition=Web'
+
+    async def fetch_all():
+        async with AsyncPdfDownloader(4, 0, limiter=limiter) as downloader:
+            return await asyncio.gather(*(downloader.fetch(url.format(i), str(tmp_path / f"{i}.pdf")) for i in range(5)))
+
+    started = time.monotonic()
+    hashes = asyncio.run(fetch_all())
+    assert limiter.calls == 5
+    assert len(set(hashes)) == 1 and hashes[0]
+    # Five requests at 20 per second need at least four intervals
+    assert time.monotonic() - started >= 0.2
+
+
+def test_threads_and_coroutines_take_turns():
+    limiter = RateLimiter(10, breaker=None)
+    limiter.wait()
+    started = time.monotonic()
+    asyncio.run(limiter.wait_async())
+    limiter.wait()
+    assert time.monotonic() - started >= 0.19
@@ -0,0 +1,107 @@
+import json
+import time
+
+import pytest
+
+import browser
+from browser import BrowserSession
+from waits import Waits
+
+
+class FakeChrome:
+    """Stands in for webdriver.Chrome: keeps the options it was started with and serves a performance log."""
+
+    started = []
+
+    def __init__(self, service=None, options=None):
+        self.options = options
+        self.log = []
+        self.quit_called = False
+        FakeChrome.started.append(self)
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {}
+
+    def execute_script(self, script):
+        return 1
+
+    def get_log(self, log_type):
+        if 'goog:loggingPrefs' not in self.options.to_capabilities():
+            raise browser.WebDriverException("log type 'performance' not found")
+        entries, self.log = self.log, []
+        return entries
+
+    def quit(self):
+        self.quit_called = True
+
+
+def log_entry(method, request_id):
+    return {'message': json.dumps({'message': {'method': method, 'params': {'requestId': request_id}}})}
+
+
+@pytest.fixture
+def chrome(monkeypatch):
+    FakeChrome.started = []
+    monkeypatch.setattr(browser.webdriver, 'Chrome', FakeChrome)
+    monkeypatch.setattr(browser, 'Service', lambda: None)
+    return FakeChrome.started
+
+
+def test_performance_log_is_off_by_default(chrome):
+    with BrowserSession() as session:
+        session.driver()
+    assert 'goog:loggingPrefs' not in chrome[0].options.to_capabilities()
+    assert session.waits is None
+
+
+def test_performance_log_is_drained_on_every_use(chrome):
+    with BrowserSession(browser_events=True) as session:
+        driver = session.driver()
+        assert 'goog:loggingPrefs' in driver.options.to_capabilities()
+        driver.log = [log_entry('Network.requestWillBeSent', 'a'), log_entry('Network.requestWillBeSent', 'b'),
+                      log_entry('Network.loadingFinished', 'a')]
+        waits = session.waits
+        session.driver()
+        assert driver.log == []
+        assert waits._in_flight == {'b'}
+
+
+def test_recycled_browser_starts_with_an_empty_log(chrome):
+    with BrowserSession(browser_events=True, max_uses=1) as session:
+        first = session.driver()
+        first.log = [log_entry('Network.requestWillBeSent', 'a')]
+        second = session.driver()
+    assert first.quit_called and second is not first
+    assert session.waits is None
+
+
+def progress_entry(state, file_path=None):
+    params = {'guid': 'g1', 'state': state, **({'filePath': file_path} if file_path else {})}
+    return {'message': json.dumps({'message': {'method': 'Browser.downloadProgress', 'params': params}})}
+
+
+class LoggingDriver:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def get_log(self, log_type):
+        entries, self.entries = self.entries, []
+        return entries
+
+
+def test_download_ends_on_the_completed_event(tmp_path):
+    done = tmp_path / 'maert.pdf'
+    done.write_bytes(b'%PDF')
+    time.sleep(0.05)
+    # Written after the download finished, e.g. by another download into the same directory
+    (tmp_path / 'other.pdf').write_bytes(b'%PDF')
+    waits = Waits(LoggingDriver([progress_entry('inProgress'), progress_entry('completed', str(done))]))
+    # The event names the file, so the newest file in the directory is not guessed at
+    assert waits.download(str(tmp_path), timeout=1) == str(done)
+
+
+def test_canceled_download_returns_none(tmp_path):
+    waits = Waits(LoggingDriver([progress_entry('canceled')]))
+    started = time.monotonic()
+    assert waits.download(str(tmp_path), timeout=5) is None
+    assert time.monotonic() - started < 1
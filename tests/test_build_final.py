@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from build_final import build_final
+
+
+def failing_documents():
+    raise RuntimeError("state store went away")
+    yield
+
+
+@pytest.mark.parametrize('parquet', [False, True])
+def test_failed_build_leaves_no_partial_files(tmp_path, parquet):
+    out_path = tmp_path / 'final.csv.zip'
+    out_path.write_bytes(b'previous build')
+    parquet_dir = tmp_path / 'parquet' if parquet else None
+    with pytest.raises(RuntimeError):
+        build_final(failing_documents(), str(out_path), str(parquet_dir) if parquet else None,
+                    lookup_path=str(tmp_path / 'lookup.csv'), pdf_path=str(tmp_path), cache_path=str(tmp_path))
+    assert out_path.read_bytes() == b'previous build'
+    assert sorted(os.listdir(tmp_path)) == ['final.csv.zip']
+
+
+def test_empty_build(tmp_path):
+    out_path = tmp_path / 'final.csv.zip'
+    stats = build_final([], str(out_path), lookup_path=str(tmp_path / 'lookup.csv'))
+    assert stats['rows'] == 0
+    assert sorted(os.listdir(tmp_path)) == ['final.csv.zip']
@@ -0,0 +1,21 @@
+from discovery_plan import rns_in_file, discovered_rns
+from get_all_rns import read_entities
+
+
+def test_rn_column_is_picked_like_the_merge(tmp_path):
+    path = tmp_path / 'HARRIS.csv'
+    path.write_text(
+        'GOVERNMENT TYPE,RN Number,Regulated Entity Name\n'
+        'STATE, rn 100209287,PLANT A\n'
+        'COUNTY,100000002,PLANT B\n'
+        'CITY,not an rn,PLANT C\n'
+    )
+    entities, invalid = read_entities(str(path), 'county:HARRIS')
+    assert rns_in_file(str(path)) == set(entities['rn_number']) == {'RN100209287', 'RN100000002'}
+    assert invalid == 1
+
+
+def test_file_without_an_rn_column(tmp_path):
+    (tmp_path / 'notes.csv').write_text('CORNER,Name\n1,2\n')
+    assert rns_in_file(str(tmp_path / 'notes.csv')) == set()
+    assert discovered_rns([str(tmp_path)]) == set()
@@ -0,0 +1,72 @@
+import extract_regulated_entities_by_county as by_county
+
+PAGE_ROWS = 2
+
+
+class FakeWaits:
+    def __init__(self, driver, *args, **kwargs):
+        self.driver = driver
+
+    def until(self, *args, **kwargs):
+        return None
+
+    def first_of(self, name, conditions, timeout=None):
+        return 'list'
+
+    def replaced(self, *args, **kwargs):
+        return None
+
+
+class FakeSelect:
+    def __init__(self, element):
+        pass
+
+    def select_by_value(self, value):
+        pass
+
+    def select_by_visible_text(self, text):
+        pass
+
+
+class FakeElement:
+    def __init__(self, driver, value):
+        self.driver = driver
+        self.value = value
+        self.text = str(driver.records)
+
+    def click(self):
+        if self.value == '>':
+            self.driver.page += 1
+
+    def is_enabled(self):
+        return True
+
+    def get_attribute(self, name):
+        # Every page has a full table and a next button, as on the live site
+        first = self.driver.page * PAGE_ROWS
+        rows = ''.join(f"<tr><td>RN{first + i:09d}</td><td>Site {first + i}</td></tr>" for i in range(PAGE_ROWS))
+        return f"<table><tr><th>RN</th><th>Name</th></tr>{rows}</table>"
+
+
+class FakeDriver:
+    def __init__(self, records):
+        self.records = records
+        self.page = 0
+
+    def get(self, url):
+        pass
+
+    def find_element(self, by, value):
+        return FakeElement(self, value)
+
+
+def test_county_pages_stop_at_the_record_count(tmp_path, monkeypatch):
+    monkeypatch.setattr(by_county, 'DATA_PATH', str(tmp_path))
+    monkeypatch.setattr(by_county, 'Waits', FakeWaits)
+    monkeypatch.setattr(by_county, 'Select', FakeSelect)
+    driver = FakeDriver(records=5)
+    saved, expected = by_county.scrape_county(driver, 'HARRIS')
+    # Three pages of two rows cover five records; turning pages until the record count would take five
+    assert (saved, expected) == (6, 5)
+    assert driver.page == 3
+    assert (tmp_path / 'HARRIS.csv').read_text().count('\n') == 7
@@ -0,0 +1,43 @@
+import os
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+from export_parquet import export_final, FINAL_DATASET
+
+COLUMNS = ['Emission Source', 'Source Name', 'Air Contaminant Name', 'Emission Rate lbs/hr', 'Emission Rate tons/year',
+           'rn_number', 'permit_number', 'publish_date', 'file_location']
+
+
+def write_final(path, dates):
+    rows = [['EPN-1', 'Heater 1', 'NO<sub>x</sub>', '<0.01', '1,234.5', 'RN100000001', '12345', date, 'data/pdfs/a.pdf']
+            for date in dates]
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, index=False)
+
+
+def partitions(parquet_dir):
+    return sorted(os.listdir(os.path.join(parquet_dir, FINAL_DATASET)))
+
+
+def test_export_replaces_the_whole_dataset(tmp_path):
+    csv_path = str(tmp_path / 'final.csv')
+    parquet_dir = str(tmp_path / 'parquet')
+    write_final(csv_path, ['3-14-2019', '1-5-2023'])
+    export_final(csv_path, parquet_dir)
+    assert partitions(parquet_dir) == ['publish_year=2019', 'publish_year=2023']
+
+    write_final(csv_path, ['1-5-2023'])
+    export_final(csv_path, parquet_dir)
+    assert partitions(parquet_dir) == ['publish_year=2023']
+    assert sorted(os.listdir(parquet_dir)) == [FINAL_DATASET]
+
+
+def test_rates_and_pollutants_are_typed(tmp_path):
+    csv_path = str(tmp_path / 'final.csv')
+    write_final(csv_path, ['3-14-2019'])
+    export_final(csv_path, str(tmp_path / 'parquet'))
+    table = ds.dataset(str(tmp_path / 'parquet' / FINAL_DATASET), partitioning='hive').to_table().to_pylist()[0]
+    assert table['pollutant'] == 'NOx'
+    assert table['Air Contaminant Name'] == 'NO<sub>x</sub>'
+    assert (table['Emission Rate lbs/hr'], table['Emission Rate tons/year']) == (0.01, 1234.5)
+    assert table['Emission Rate tons/year raw'] == '1,234.5'
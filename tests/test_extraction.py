@@ -0,0 +1,83 @@
+import os
+import random
+
+import pytest
+
+from conftest import TCEQ_DIR
+from extract_maerts import extract_document, read_rows, read_skip, run_extraction, cache_file
+from page_triage import triage_pdf, EASY, TRICKY, UNKNOWN
+from stub_tceq import make_pdf, maert_pdf
+
+RATE_ROWS = [f"EPN-{i} Heater {i} NOx {i}.50 {i}.75" for i in range(1, 6)]
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    def write(name, content):
+        path = tmp_path / name
+        path.write_bytes(content)
+        return str(path)
+    return write
+
+
+def test_easy_document(pdf, tmp_path):
+    path = pdf('easy.pdf', maert_pdf(random.Random(1), '12345', 'RN100000001'))
+    triage = triage_pdf(path)
+    assert triage['classification'] == EASY
+    assert triage['candidate_pages'][0] == 2
+
+    sha256, count = extract_document(path, cache_path=str(tmp_path / 'cache'))
+    assert count > 0
+    assert read_skip(sha256, str(tmp_path / 'cache')) is None
+    assert all(row[-1] == EASY for row in read_rows(sha256, str(tmp_path / 'cache')))
+
+
+def test_title_only_document_falls_back_to_ranked_pages(pdf, tmp_path):
+    # The title is on the cover and the table page has a single header: no page scores as a candidate
+    cover = ['Maximum Allowable Emission Rates', 'Permit Number 12345']
+    path = pdf('tricky.pdf', make_pdf([cover, ['Air Contaminant Name', *RATE_ROWS]]))
+    triage = triage_pdf(path)
+    assert triage['classification'] == TRICKY
+    assert triage['candidate_pages'] == []
+
+    sha256, count = extract_document(path, cache_path=str(tmp_path / 'cache'))
+    assert count == len(RATE_ROWS)
+    assert [row[2] for row in read_rows(sha256, str(tmp_path / 'cache'))] == ['NOx'] * len(RATE_ROWS)
+
+
+def test_empty_documents_record_why(pdf, tmp_path):
+    cache = str(tmp_path / 'cache')
+    scanned = os.path.join(TCEQ_DIR, 'maert.pdf')
+    letter = pdf('letter.pdf', make_pdf([['Dear permit holder,', 'Your application has been received and is under review.']]))
+    assert triage_pdf(scanned)['has_text'] is False
+    assert triage_pdf(letter)['classification'] == UNKNOWN
+
+    sha256, count = extract_document(scanned, cache_path=cache)
+    assert count == 0 and read_skip(sha256, cache) == 'no text layer'
+    sha256, count = extract_document(letter, cache_path=cache)
+    assert count == 0 and read_skip(sha256, cache) == 'no MAERT signals'
+
+
+def test_retry_skipped_parses_every_page(pdf, tmp_path):
+    cache = str(tmp_path / 'cache')
+    path = pdf('letter.pdf', make_pdf([['Dear permit holder,', 'Your application has been received and is under review.']]))
+    sha256, _ = extract_document(path, cache_path=cache)
+    documents = [(os.path.basename(path), sha256)]
+
+    assert run_extraction(documents, str(tmp_path), 1, cache) == (0, 1, 0)
+    assert run_extraction(documents, str(tmp_path), 1, cache, retry_skipped=True) == (1, 0, 0)
+    assert read_skip(sha256, cache) == 'no rows found on all pages'
+    assert os.path.exists(cache_file(sha256, cache))
+
+
+def test_manifest_documents_are_cached_and_deduplicated(pdf, tmp_path):
+    cache = str(tmp_path / 'cache')
+    content = make_pdf([['Dear permit holder,', 'Your application has been received and is under review.']])
+    pdf('a.pdf', content)
+    pdf('b.pdf', content)
+    # A download_logs.csv manifest names files but carries no hashes
+    documents = [('a.pdf', None), ('b.pdf', None)]
+
+    assert run_extraction(documents, str(tmp_path), 1, cache) == (1, 0, 0)
+    assert run_extraction(documents, str(tmp_path), 1, cache) == (0, 1, 0)
+    assert run_extraction(documents, str(tmp_path), 1, cache, retry_skipped=True) == (1, 0, 0)
@@ -0,0 +1,40 @@
+import logging
+
+import pandas as pd
+
+from get_all_rns import merge
+
+
+def write_inputs(tmp_path):
+    county_dir = tmp_path / 'county'
+    zip_dir = tmp_path / 'zip'
+    county_dir.mkdir()
+    zip_dir.mkdir()
+    (county_dir / 'HARRIS.csv').write_text('RN,Name\nRN100000001,PLANT A\nnot an rn,PLANT B\n')
+    (zip_dir / '77001.csv').write_text('RN Number,Regulated Entity Name,zipcode\n100000001,PLANT A,77001\n,PLANT C,77001\n')
+    return county_dir, zip_dir
+
+
+def run_merge(tmp_path, county_dir, zip_dir, **kwargs):
+    return merge(str(county_dir), str(zip_dir), str(tmp_path / 'entities.csv'), str(tmp_path / 'rns.csv'),
+                 str(tmp_path / 'cache'), workers=2, **kwargs)
+
+
+def test_merge_combines_searches(tmp_path):
+    county_dir, zip_dir = write_inputs(tmp_path)
+    assert run_merge(tmp_path, county_dir, zip_dir)
+    entities = pd.read_csv(tmp_path / 'entities.csv', dtype=str)
+    assert entities['rn_number'].tolist() == ['RN100000001']
+    assert entities['county'].tolist() == ['HARRIS']
+    assert entities['found_in'].tolist() == ['county:HARRIS;zip:77001']
+
+
+def test_cached_files_still_report_dropped_rows(tmp_path, caplog):
+    county_dir, zip_dir = write_inputs(tmp_path)
+    with caplog.at_level(logging.WARNING):
+        run_merge(tmp_path, county_dir, zip_dir)
+        assert 'Dropped 2 rows' in caplog.text
+        caplog.clear()
+        # Nothing changed, so every file comes from the cache
+        assert not run_merge(tmp_path, county_dir, zip_dir)
+        assert 'Dropped 2 rows' in caplog.text
@@ -0,0 +1,16 @@
+import sys
+import subprocess
+
+import pytest
+
+from conftest import SCRIPTS_DIR
+
+HEAVY = ('pandas', 'selenium', 'PyPDF2', 'zipcodes', 'bs4')
+
+
+@pytest.mark.parametrize('module', ['download_maert_pdfs', 'discover_entities', 'page_triage', 'discovery_plan'])
+def test_import_loads_no_heavy_dependencies(module):
+    # A fresh interpreter, since this one has them all loaded by other tests
+    code = f"import sys; import {module}; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    loaded = subprocess.run([sys.executable, '-c', code], cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True)
+    assert loaded.stdout.split() == []
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+import maert_query
+
+
+def test_queries_before_build_exit_with_a_hint(tmp_path, capsys):
+    db_path = str(tmp_path / 'index.sqlite')
+    with pytest.raises(SystemExit) as excinfo:
+        maert_query.main(['--db', db_path, 'top', 'NOx'])
+    assert "Run 'maert.py query build' first" in str(excinfo.value.code)
+    assert not os.path.exists(db_path)
+
+
+def test_empty_database_is_not_an_index(tmp_path):
+    db_path = tmp_path / 'index.sqlite'
+    db_path.touch()
+    with pytest.raises(maert_query.IndexMissingError):
+        maert_query.open_index(str(db_path))
+
+
+def test_totals_only_count_the_latest_permit_version(tmp_path):
+    final_csv = tmp_path / 'final.csv'
+    final_csv.write_text(
+        'Emission Source,Source Name,Air Contaminant Name,Emission Rate lbs/hr,Emission Rate tons/year,'
+        'rn_number,permit_number,publish_date,file_location\n'
+        'EPN-1,Heater,NOx,1.0,10.0,RN100000001,12345,3-14-2019,a.pdf\n'
+        'EPN-1,Heater,NOx,1.0,4.0,RN100000001,12345,1-5-2023,b.pdf\n'
+        'EPN-2,Flare,NOx,1.0,6.0,RN100000001,12345,1-5-2023,b.pdf\n'
+        'EPN-1,Boiler,NOx,1.0,8.0,RN100000002,777,11-2-2021,c.pdf\n'
+    )
+    entities_csv = tmp_path / 'entities.csv'
+    entities_csv.write_text(
+        'rn_number,regulated_entity_name,county,location\n'
+        'RN100000001,PLANT A,harris,"1 Main St, Houston, TX 77001"\n'
+        'RN100000002,PLANT B,Harris,"2 Main St, Houston, TX 77002"\n'
+    )
+    db_path = str(tmp_path / 'index.sqlite')
+    maert_query.build_index(str(final_csv), str(entities_csv), db_path)
+    conn = maert_query.open_index(db_path)
+
+    assert [(row['rn_number'], row['total']) for row in maert_query.top_emitters(conn, 'NOx')] == [
+        ('RN100000001', 10.0), ('RN100000002', 8.0)]
+    assert maert_query.totals_by_county(conn)[0]['total'] == 18.0
+    assert {row['zipcode'] for row in maert_query.totals_by_zip(conn)} == {'77001', '77002'}
+    assert [row['total'] for row in maert_query.rn_time_series(conn, 'RN100000001')] == [10.0, 10.0]
@@ -0,0 +1,59 @@
+import math
+
+import pandas as pd
+import pytest
+
+from normalize import canonical_pollutant, normalize_pollutants, parse_rates
+
+
+@pytest.mark.parametrize('name, code', [
+    ('NOx', 'NOx'),
+    ('NO<sub>x</sub>', 'NOx'),
+    ('Nitrogen Oxides (4)', 'NOx'),
+    ('Oxides of Nitrogen', 'NOx'),
+    ('SO₂', 'SO2'),
+    ('PM<sub>2.5</sub>', 'PM2.5'),
+    ('carbon  monoxide*', 'CO'),
+    ('Ethylene  (a)', 'Ethylene'),
+    ('Toluene (12)', 'Toluene'),
+    ('Carbon Monoxide (CO)', 'CO'),
+    ('Lead (Pb)', 'Pb'),
+    ('Sulfur Dioxide (SO2)', 'SO2'),
+    ('Nitrogen Oxides (NOx)', 'NOx'),
+    ('Volatile Organic Compounds (VOC)', 'VOC'),
+    ('Ethylene Oxide (EtO)', 'Ethylene Oxide (EtO)'),
+])
+def test_canonical_pollutant(name, code):
+    assert canonical_pollutant(name) == code
+
+
+def test_normalize_pollutants_keeps_missing_names():
+    codes = normalize_pollutants(pd.Series(['VOCs', None, 'Volatile Organic Compounds']))
+    assert codes.tolist() == ['VOC', pd.NA, 'VOC']
+
+
+@pytest.mark.parametrize('text, rate', [
+    ('0.5', 0.5),
+    ('<0.01', 0.01),
+    ('1,234.5', 1234.5),
+    ('12,345,678', 12345678.0),
+    ('1,234.5 (a)', 1234.5),
+    ('(4) 0.5', 0.5),
+    ('0.25*', 0.25),
+    ('0.5 (A)', 0.5),
+    ('1.2E-03', 0.0012),
+    ('.75', 0.75),
+])
+def test_parse_rates(text, rate):
+    assert parse_rates(pd.Series([text])).tolist() == [pytest.approx(rate)]
+
+
+@pytest.mark.parametrize('text', ['-', 'N/A', '', None, '1,2', '1,234,5', '1.2/3.4', '0.5 - 1.5', '(10) 0.5'])
+def test_unreadable_rates_are_nan(text):
+    assert math.isnan(parse_rates(pd.Series([text], dtype=object))[0])
+
+
+def test_parse_rates_maps_each_distinct_value_back():
+    rates = parse_rates(pd.Series(['1', '2', '1', None], index=[10, 11, 12, 13]))
+    assert rates.index.tolist() == [10, 11, 12, 13]
+    assert rates.tolist()[:3] == [1.0, 2.0, 1.0] and math.isnan(rates[13])
@@ -0,0 +1,49 @@
+import os
+
+from pdf_store import PdfStore, migrate, object_path, file_sha256
+from state_store import DONE
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_duplicates_are_stored_once(store, tmp_path):
+    objects = tmp_path / 'objects'
+    pdfs = tmp_path / 'pdfs'
+    pdfs.mkdir()
+    pdf_store = PdfStore(store, str(objects))
+    first = write(pdfs / 'RN100000001_12345_3-14-2019_1.pdf', b'%PDF-1.4 same %%EOF')
+    second = write(pdfs / 'RN100000002_12345_3-14-2019_2.pdf', b'%PDF-1.4 same %%EOF')
+
+    sha256, is_duplicate = pdf_store.add(first)
+    assert not is_duplicate
+    assert pdf_store.add(second) == (sha256, True)
+    assert os.path.samefile(first, object_path(sha256, str(objects)))
+    assert os.path.samefile(second, object_path(sha256, str(objects)))
+    assert store.has_blob(sha256)
+    # Adding a name that already links to the object is not a new duplicate
+    assert pdf_store.add(first, sha256) == (sha256, False)
+
+
+def test_migrate_records_hashes(store, tmp_path):
+    pdfs = tmp_path / 'pdfs'
+    pdfs.mkdir()
+    doc_id = store.start_document('RN100000001', '12345', '3-14-2019', 'dID=1')
+    store.finish_document(doc_id, DONE, file_name='RN100000001_12345_3-14-2019_1.pdf')
+    write(pdfs / 'RN100000001_12345_3-14-2019_1.pdf', b'%PDF-1.4 a %%EOF')
+    unlogged = write(pdfs / 'RN100000002_777_1-5-2023_2.pdf', b'%PDF-1.4 b %%EOF')
+    write(pdfs / 'notes.pdf', b'%PDF-1.4 c %%EOF')
+
+    migrate(str(pdfs), str(tmp_path / 'objects'), store)
+    rows = {row['file_name']: row for row in store.done_documents()}
+    assert set(rows) == {'RN100000001_12345_3-14-2019_1.pdf', 'RN100000002_777_1-5-2023_2.pdf'}
+    assert rows['RN100000002_777_1-5-2023_2.pdf']['sha256'] == file_sha256(unlogged)
+    assert all(row['sha256'] for row in rows.values())
+
+
+def test_file_name_lookups_use_an_index(store):
+    plan = store.connection().execute(
+        'EXPLAIN QUERY PLAN UPDATE documents SET sha256 = ? WHERE file_name = ?', ('x', 'y')).fetchall()
+    assert any('documents_file_name' in row['detail'] for row in plan)
@@ -0,0 +1,95 @@
+import httpx
+import pytest
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from resilience import CircuitBreaker, RetryQueue, TransientError, ThrottledError, LayoutError, classify, retry_call
+
+
+def status_error(status):
+    request = httpx.Request('GET', 'https://records.tceq.texas.gov/cs/idcplg')
+    return httpx.HTTPStatusError('status', request=request, response=httpx.Response(status, request=request))
+
+
+@pytest.mark.parametrize('error, expected', [
+    (status_error(429), ThrottledError),
+    (status_error(503), ThrottledError),
+    (status_error(500), TransientError),
+    (status_error(404), LayoutError),
+    (httpx.ConnectError('refused'), TransientError),
+    (NoSuchElementException('table'), LayoutError),
+    (WebDriverException('chrome not reachable'), TransientError),
+    (TimeoutError(), TransientError),
+    (KeyError('Permit Number'), LayoutError),
+    (ThrottledError(), ThrottledError),
+])
+def test_classify(error, expected):
+    assert classify(error) is expected
+
+
+def test_breaker_opens_on_site_failures_only():
+    breaker = CircuitBreaker(min_calls=4, cooldown=30.0)
+    for _ in range(5):
+        breaker.record(LayoutError)
+    assert breaker.delay() == 0
+    breaker.record(None)
+    breaker.record(TransientError)
+    breaker.record(ThrottledError)
+    # One success against three failures, throttling counting twice
+    assert 29 < breaker.delay() <= 30
+
+
+def test_breaker_pause_doubles_until_a_success():
+    breaker = CircuitBreaker(min_calls=2, cooldown=10.0, max_cooldown=15.0)
+    breaker.record(ThrottledError)
+    assert breaker.cooldown == 15.0
+    breaker.open_until = 0.0
+    breaker.record(None)
+    assert breaker.cooldown == 10.0
+
+
+def test_retry_call_stops_after_the_error_class_attempts():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        raise LayoutError('no table')
+
+    with pytest.raises(LayoutError):
+        retry_call(flaky, 'search', breaker=CircuitBreaker())
+    assert len(calls) == LayoutError.max_attempts
+
+
+def test_retry_queue_requeues_until_attempts_run_out():
+    work = RetryQueue()
+    work.add('RN100000001')
+    attempts = []
+    while (entry := work.take()) is not None:
+        rn, attempt = entry
+        attempts.append(attempt)
+        if not work.requeue(rn, attempt, ThrottledError('429'), breaker=CircuitBreaker()):
+            work.stop(1)
+        work.task_done()
+    assert attempts == list(range(ThrottledError.max_attempts))
+
+
+def test_retry_queue_gives_layout_errors_one_more_try():
+    work = RetryQueue()
+    assert work.requeue('RN100000003', 0, LayoutError('no table'), breaker=CircuitBreaker())
+    assert not work.requeue('RN100000003', 1, LayoutError('no table'), breaker=CircuitBreaker())
+
+
+def test_deferred_errors_are_left_to_the_queue():
+    breaker = CircuitBreaker(min_calls=1)
+    calls = []
+
+    def throttled():
+        calls.append(1)
+        raise ThrottledError('429')
+
+    with pytest.raises(ThrottledError):
+        retry_call(throttled, 'search', breaker=breaker, deferred=(ThrottledError,))
+    assert len(calls) == 1
+    # Not recorded here; requeue() records it, so each failure counts once
+    assert breaker.delay() == 0
+    RetryQueue().requeue('RN100000004', 0, ThrottledError('429'), breaker=breaker)
+    assert breaker.delay() > 0
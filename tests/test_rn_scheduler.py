@@ -0,0 +1,45 @@
+from rn_scheduler import schedule
+from state_store import DONE
+
+
+def finish(store, rn, documents=0, checks=1):
+    for check in range(checks):
+        store.start_rn(rn)
+        saved = 0
+        if check == 0:
+            for i in range(documents):
+                doc_id = store.start_document(rn, f"{rn[-4:]}{i}", '2020-01-01', f"dID={rn}{i}")
+                store.finish_document(doc_id, DONE, file_name=f"{rn}_{i}.pdf")
+                saved += 1
+        store.finish_rn(rn, DONE, new_documents=saved)
+
+
+def test_known_empty_rns_come_after_new_ones(store):
+    # Mostly empty RNs in the history, so the prior hit rate is low
+    for i in range(10):
+        finish(store, f"RN0000000{i:02d}")
+    finish(store, 'RN000000095', documents=1)
+    order = schedule(['RN000000000', 'RN999999999', 'RN000000095'], store, empty_sample=1.0)
+    assert order == ['RN000000095', 'RN999999999', 'RN000000000']
+
+
+def test_hits_checked_without_news_stay_ahead_of_new_rns(store):
+    finish(store, 'RN000000001')
+    finish(store, 'RN000000002', documents=1, checks=5)
+    assert schedule(['RN999999999', 'RN000000001', 'RN000000002'], store, empty_sample=1.0) == [
+        'RN000000002', 'RN999999999', 'RN000000001']
+
+
+def test_imported_counts_count_as_hits(store, tmp_path):
+    counts = tmp_path / 'download_counts.csv'
+    counts.write_text('rn_number,download_counts\nRN000000001,0\nRN000000002,3.0\n')
+    store.import_legacy_csvs(str(tmp_path / 'missing_logs.csv'), str(counts))
+    assert schedule(['RN999999999', 'RN000000001', 'RN000000002'], store, empty_sample=1.0) == [
+        'RN000000002', 'RN999999999', 'RN000000001']
+
+
+def test_known_empty_rns_are_sampled(store):
+    for i in range(20):
+        finish(store, f"RN0000000{i:02d}")
+    order = schedule([f"RN0000000{i:02d}" for i in range(20)], store, empty_sample=0.0)
+    assert order == []
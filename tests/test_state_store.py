@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import fixture_bytes
+from download_maert_pdfs import maert_rows
+from state_store import StateStore, document_ref, parse_pdf_name, DONE, FAILED, IN_PROGRESS
+
+GET_FILE_URL = 'https://records.tceq.texas.gov/cs/idcplg?IdcService=TCEQ_EXTERNAL_SEARCH_GET_FILE&dID=5512301&Rendition=Web'
+
+
+def test_rn_lifecycle(store):
+    store.start_rn('RN100000001')
+    assert store.rn_status('RN100000001') == IN_PROGRESS
+    store.finish_rn('RN100000001', FAILED, error='transient: timeout')
+    assert store.rns_with_status(FAILED) == {'RN100000001'}
+    store.start_rn('RN100000001')
+    store.finish_rn('RN100000001', DONE, new_documents=0)
+    row = store.rn_history()['RN100000001']
+    assert row['status'] == DONE
+    assert (row['check_count'], row['change_count']) == (1, 0)
+
+
+def test_finished_document_is_not_started_again(store):
+    doc_id = store.start_document('RN100000001', '12345', '3-14-2019', 'dID=5512301')
+    assert store.start_document('RN100000001', '12345', '3-14-2019', 'dID=5512301') == doc_id
+    store.finish_document(doc_id, DONE, file_name='RN100000001_12345_3-14-2019_1.pdf', sha256='ab' * 32)
+    assert store.start_document('RN100000001', '12345', '3-14-2019', 'dID=5512301') is None
+    assert [row['file_name'] for row in store.done_documents()] == ['RN100000001_12345_3-14-2019_1.pdf']
+
+
+def test_legacy_row_stands_in_for_any_ref(store, tmp_path):
+    logs = tmp_path / 'download_logs.csv'
+    logs.write_text('RN Number,File Name\nRN100000001,RN100000001_12345_3-14-2019_1.pdf\n')
+    assert store.import_legacy_csvs(str(logs), str(tmp_path / 'missing.csv')) == 1
+    assert store.start_document('RN100000001', '12345', '3-14-2019', 'dID=5512301') is None
+    # Without download_counts.csv the RN is not known to have finished
+    assert store.rn_status('RN100000001') == IN_PROGRESS
+
+
+def test_document_ref_is_the_same_for_both_engines():
+    http_rows = maert_rows(fixture_bytes('results_page2.html').decode(), 'https://records.tceq.texas.gov/cs/idcplg')
+    # The Selenium engine parses the results table element on its own, relative to the current page
+    page = fixture_bytes('results_page2.html').decode()
+    table = page[page.index('<table class="resultsTable"'):page.index('</table>', page.index('resultsTable')) + len('</table>')]
+    selenium_rows = maert_rows(table, 'https://records.tceq.texas.gov/cs/idcplg?IdcService=TCEQ_SEARCH_RESULTS')
+    assert selenium_rows == http_rows
+    assert selenium_rows[0]['permit_number'] == '0012345'
+    assert document_ref(http_rows[0]['url']) == document_ref(selenium_rows[0]['url'], selenium_rows[0]['link_text']) == 'dID=5512305'
+
+
+def test_document_ref_fallbacks():
+    assert document_ref(GET_FILE_URL) == 'dID=5512301'
+    assert document_ref('http://127.0.0.1:8000/pdfs/abc.pdf') == '/pdfs/abc.pdf'
+    assert document_ref(None, '5512301') == '5512301'
+
+
+def test_url_refs_are_rewritten_on_open(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    StateStore(path).start_document('RN100000001', '12345', '3-14-2019', GET_FILE_URL)
+    store = StateStore(path)
+    assert [row['doc_ref'] for row in store.documents_for_rn('RN100000001')] == ['dID=5512301']
+
+
+def test_rns_not_due_backs_off_unchanged_rns(store):
+    for rn, new_documents in (('RN100000001', 1), ('RN100000002', 0)):
+        store.start_rn(rn)
+        store.finish_rn(rn, DONE, new_documents=new_documents)
+    soon = datetime.now(timezone.utc) + timedelta(days=10)
+    # One check that found something: revisited after 10.5 days; one that found nothing: after 21
+    assert store.rns_not_due(soon) == {'RN100000001', 'RN100000002'}
+    assert store.rns_not_due(soon + timedelta(days=8)) == {'RN100000002'}
+
+
+def test_queries(store):
+    store.start_query('county', 'HARRIS')
+    store.finish_query('county', 'HARRIS', DONE, record_count=25, expected_count=40)
+    assert store.queries_with_status('county', DONE) == {'HARRIS'}
+    assert store.query_counts('county')['HARRIS']['expected_count'] == 40
+
+
+def test_parse_pdf_name():
+    assert parse_pdf_name('data/pdfs/RN100000001_PSD_TX_1234_3-14-2019_1700000000.pdf') == ('RN100000001', 'PSD_TX_1234', '3-14-2019')
+    with pytest.raises(ValueError):
+        parse_pdf_name('notes.pdf')
+
+
+def test_store_is_in_wal_mode(store):
+    assert store.connection().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+import download_maert_pdfs
+from conftest import fixture_bytes, THROTTLED_RN
+from rate_limit import RateLimiter
+from resilience import classify, LayoutError, ThrottledError
+from state_store import DONE, FAILED
+from tceq_http import TceqRecordsClient, LayoutChangedError, parse_search_form, parse_results
+
+FORM_URL = 'https://records.tceq.texas.gov/cs/idcplg?IdcService=TCEQ_SEARCH'
+RESULTS_URL = 'https://records.tceq.texas.gov/cs/idcplg'
+
+
+def read_fixture(name):
+    return fixture_bytes(name).decode('utf-8')
+
+
+def test_search_form_fields():
+    form = parse_search_form(read_fixture('search_form.html'), FORM_URL)
+    fields = dict(form.fields)
+    assert form.action == 'https://records.tceq.texas.gov/cs/idcplg'
+    assert form.method == 'GET'
+    assert form.value_field == 'searchValue1'
+    assert fields['IdcService'] == 'TCEQ_SEARCH_RESULTS'
+    # Selects with no preselected option are filled in with the MAERT search criteria
+    assert fields['xRecordSeries'] == '1081'
+    assert fields['xInsightDocumentType'] == '27'
+    assert fields['searchField1'] == 'xRefNumTxt'
+    assert fields['searchButton'] == 'Search'
+    assert form.params_for('RN100000001')[-1] == ('searchValue1', 'RN100000001')
+
+
+def test_search_form_without_record_series_is_a_layout_change():
+    page = read_fixture('search_form.html').replace('xRecordSeries', 'xSeries')
+    with pytest.raises(LayoutChangedError):
+        parse_search_form(page, FORM_URL)
+
+
+def test_results_rows_and_pages():
+    rows, page_urls = parse_results(read_fixture('results_page1.html'), RESULTS_URL)
+    assert [row['document_type'] for row in rows] == ['MAERT', 'PERMIT', 'TECHNICAL REVIEW', 'MAERT']
+    assert rows[0] == {
+        'link_text': '5512301',
+        'url': 'https://records.tceq.texas.gov/cs/idcplg?IdcService=TCEQ_EXTERNAL_SEARCH_GET_FILE&dID=5512301&Rendition=Web',
+        'permit_number': '12345',
+        'document_type': 'MAERT',
+        'publish_date': '3/14/2019 12:00:00 AM',
+    }
+    assert len(page_urls) == 2
+    assert page_urls[1].endswith('StartRow=21')
+
+
+def test_results_keep_permit_numbers_as_text():
+    rows, _ = parse_results(read_fixture('results_page2.html'), RESULTS_URL)
+    assert rows[0]['permit_number'] == '0012345'
+
+
+def test_no_results():
+    assert parse_results(read_fixture('no_results.html'), RESULTS_URL) == ([], [])
+
+
+def test_changed_results_page_is_a_layout_error():
+    with pytest.raises(LayoutChangedError) as excinfo:
+        parse_results(read_fixture('layout_changed.html'), RESULTS_URL)
+    assert issubclass(classify(excinfo.value), LayoutError)
+
+
+def test_client_follows_result_pages(records_server):
+    with TceqRecordsClient(records_server.records_url) as client:
+        maerts = client.find_maerts('RN100000001')
+    assert [(doc['permit_number'], doc['publish_date']) for doc in maerts] == [
+        ('12345', '3/14/2019 12:00:00 AM'),
+        ('PSDTX1234', '11/2/2021 12:00:00 AM'),
+        ('0012345', '1/5/2023 12:00:00 AM'),
+    ]
+    assert len(records_server.searches()) == 2
+
+
+def test_layout_change_falls_back_to_selenium(records_server, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_maert_pdfs, 'DATA_PATH', str(tmp_path))
+    rns = ['RN100000002', 'RN100000003']
+    fallback = asyncio.run(download_maert_pdfs.run_http_pipeline(
+        rns, 2, RateLimiter(0), store, 2, 0, False, base_url=records_server.records_url))
+    assert fallback == ['RN100000003']
+    assert store.rn_status('RN100000002') == DONE
+    # The changed page is retried once in case it was half loaded, then handed over
+    assert sum('RN100000003' in path for path in records_server.searches()) == 2
+
+
+def test_throttled_search_is_requeued(records_server, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_maert_pdfs, 'DATA_PATH', str(tmp_path))
+    # Gets through on its last attempt, after going back on the queue each time
+    records_server.throttled = ThrottledError.max_attempts - 1
+    fallback = asyncio.run(download_maert_pdfs.run_http_pipeline(
+        [THROTTLED_RN, 'RN100000002'], 2, RateLimiter(0), store, 2, 0, False, base_url=records_server.records_url))
+    assert fallback == []
+    assert store.rn_status(THROTTLED_RN) == DONE
+    assert records_server.throttled == 0
+
+
+def test_throttled_search_fails_once_requeues_run_out(records_server, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_maert_pdfs, 'DATA_PATH', str(tmp_path))
+    records_server.throttled = 1000
+    fallback = asyncio.run(download_maert_pdfs.run_http_pipeline(
+        [THROTTLED_RN], 1, RateLimiter(0), store, 2, 0, False, base_url=records_server.records_url))
+    # Throttling is never handed to a browser, which would only add to the load
+    assert fallback == []
+    assert store.rn_status(THROTTLED_RN) == FAILED
+    # Retried by the queue alone, not again inside each attempt
+    assert len(records_server.searches()) == ThrottledError.max_attempts